@@ -5,14 +5,40 @@ from abc import ABC, abstractmethod
 from typing import List, Tuple, Optional, Dict
 from piece import Piece
 
+
+class _SquarePiece(Piece):
+    """
+    A piece that is a view of a square of a board: reading or setting its
+    player reads or sets the square, as with the pieces that boards used to
+    hold.
+    """
+    def __init__(self, cells: bytearray, index: int):
+        self._cells = cells
+        self._index = index
+        super().__init__(cells[index])
+
+    @property
+    def player(self):
+        return self._cells[self._index]
+
+    @player.setter
+    def player(self, new_player):
+        self._cells[self._index] = new_player
+
+
 class Board:
     """
     Class to represent a game board.
 
+    The squares are stored row by row in a single bytearray, holding 0 for an
+    empty square and the player number otherwise, so that whole boards can be
+    copied, counted and serialised without visiting each square in Python.
+
     Attributes:
         rows (int): number of rows
         cols (int): number of columns
-        board (list): the game board
+        cells (bytearray): the squares of the board, row by row
+        board (list): the game board, as pieces
         location_of_pieces (dictionary): the location of each piece on the board
 
     Methods:
@@ -20,14 +46,16 @@ class Board:
     """
     _rows: int
     _cols: int
-    _board: List[List[Optional[Piece]]]
-    _location_of_pieces: Dict[int, List[Tuple[int, int]]]
+    _cells: bytearray
+    _locations: Tuple[bytes, Dict[int, List[Tuple[int, int]]]]
+    _board: Tuple[bytes, List[List[Optional[Piece]]]]
 
     def __init__(self, rows: int, cols: int):
         self._rows = rows
         self._cols = cols
-        self._board = [[None] * cols for _ in range(rows)]
-        self._location_of_pieces = {}
+        self._cells = bytearray(rows * cols)
+        self._locations = (b"", {})
+        self._board = (b"", [])
 
     @property
     def num_rows(self) -> int:
@@ -43,19 +71,42 @@ class Board:
         """
         return self._cols
 
+    @property
+    def cells(self) -> bytearray:
+        """
+        Returns the squares of the board, row by row (0 for an empty square
+        and the player number otherwise)
+        """
+        return self._cells
+
     @property
     def locations(self) -> Dict[int, List[Tuple[int, int]]]:
         """
-        Returns all of the locations of the pieces
+        Returns all of the locations of the pieces (built again only once
+        the squares have changed)
         """
-        return self._location_of_pieces
+        key, locations = self._locations
+        if key != self._cells:
+            locations = {}
+            for index, player in enumerate(self._cells):
+                if player:
+                    locations.setdefault(player, []).append(
+                        divmod(index, self._cols))
+            self._locations = (bytes(self._cells), locations)
+        return locations
 
     @property
     def board(self) -> List[List[Optional[Piece]]]:
         """
-        Returns the board
+        Returns the board (setting the player of one of its pieces changes
+        the board, and it is built again only once the squares have changed)
         """
-        return self._board
+        key, board = self._board
+        if key != self._cells:
+            board = [[self.get_piece((row, col)) for col in range(self._cols)]
+                     for row in range(self._rows)]
+            self._board = (bytes(self._cells), board)
+        return board
 
 
     def add_piece(self, player: int, location: Tuple[int, int]) -> bool:
@@ -70,32 +121,37 @@ class Board:
         Returns (bool): True if the piece was added successfully,
             False otherwise
         """
-        player_locations = self._location_of_pieces.get(player, [])
-
         row, col = location
-        new_piece = Piece(player)
+        index = row * self._cols + col
 
-        if self._board[row][col] is None:
-            self._board[row][col] = new_piece
-            player_locations.append(location)
-            self._location_of_pieces[player] = player_locations
+        if self._cells[index] == 0:
+            self._cells[index] = player
             return True
         return False
 
+    def load_cells(self, cells: bytes) -> None:
+        """
+        Replaces every square of the board at once.
+
+        Inputs:
+            cells (bytes): the new squares, row by row (as in cells)
+
+        Returns: None
+        """
+        if len(cells) != len(self._cells):
+            raise ValueError("The number of cells does not match the board")
+        self._cells[:] = cells
+
     @property
     def is_full(self) -> bool:
         """
         Checks if a board is full/has a piece on every spot.
 
         Returns (bool): True if the board is full/has every spot filled.
-            False otherwise. 
-        
+            False otherwise.
+
         """
-        for row in range(self._rows):
-            for col in range(self._cols):
-                if self._board[row][col] is None:
-                    return False
-        return True
+        return 0 not in self._cells
 
 
     def num_player_pieces(self, player: int) -> int:
@@ -104,16 +160,10 @@ class Board:
 
         Inputs:
             player (str): the identity of the player
-        
+
         Returns: the number of pieces belonging to player on the board (int)
         """
-        count = 0
-        for row in self._board:
-            for piece in row:
-                if piece is not None and piece.get_player() == player:
-                    count += 1
-
-        return count
+        return self._cells.count(player)
 
 
     def out_of_bounds(self, pos: Tuple[int, int]) -> bool:
@@ -129,14 +179,14 @@ class Board:
         if row < 0 or row >= self._rows:
             return True
         if col < 0 or col >= self._cols:
-            return True   
+            return True
         return False
 
 
     def __str__(self) -> str:
         """ Returns string representation of a board"""
         rows = []
-        for row in self._board:
+        for row in self.board:
             rows.append(str(row))
         return '\n'.join(rows)
 
@@ -152,9 +202,15 @@ class Board:
 
         Returns: None
         """
-        self._board = [[None for _ in range(self._cols)] for _ in \
-                      range(self._rows)]
-        self._location_of_pieces = {}  # Also clear the location of pieces
+        self._cells[:] = bytes(self._rows * self._cols)
+
+
+    def player_at(self, pos: Tuple[int, int]) -> int:
+        """
+        Returns the player with a piece at a position, or 0 if it is empty
+        """
+        x, y = pos
+        return self._cells[x * self._cols + y]
 
 
     def get_piece(self, pos: Tuple[int, int]) -> Optional[Piece]:
@@ -163,7 +219,8 @@ class Board:
         Returns a piece or None if their is no piece at that position.
         """
         x, y = pos
-        return self._board[x][y]
+        index = x * self._cols + y
+        return _SquarePiece(self._cells, index) if self._cells[index] else None
 
 
     def set_piece(self, pos: Tuple[int, int], player: int) -> None:
@@ -172,4 +229,4 @@ class Board:
         Returns None
         """
         x, y = pos
-        self._board[x][y] = Piece(player)
+        self._cells[x * self._cols + y] = player
@@ -1,23 +1,76 @@
 """
 Bot implementation for reversi
 """
+import contextlib
+import inspect
 import random
 import sys
+import time
 import click
 from reversi import Reversi
-from typing import Callable
+from records import RecordWriter
+from patterns import PatternEvaluator
+from typing import Callable, Dict, Iterable, Optional, Tuple
 
 
-def use_bot(game: Reversi, bot: Callable[[Reversi], None]) -> None:
+DEADLINE_MARGIN = 0.9
+"""
+Fraction of its time budget a strategy is told it may think for, leaving the
+rest for playing the chosen move and returning
+"""
+
+
+def accepts_deadline(bot: Callable[..., None]) -> bool:
+    """
+    Checks whether a strategy can be told when it must stop thinking.
+
+    Input:
+        bot (Callable): the strategy being used, as implemented in the bot.
+
+    Returns (bool): True if bot takes a deadline keyword argument, False
+        otherwise
+    """
+    try:
+        return "deadline" in inspect.signature(bot).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def out_of_time(deadline: Optional[float]) -> bool:
+    """
+    Checks whether a deadline (as given by time.perf_counter) has passed.
+
+    Input:
+        deadline (Optional[float]): the deadline, or None if there is none
+    """
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+def use_bot(game: Reversi, bot: Callable[..., None],
+            time_budget: Optional[float] = None) -> float:
     """
     Chooses a move in the game of reversi according to the strategy implemented
     in bot.
 
+    If a time budget is given and the strategy accepts a deadline, the
+    strategy is told when DEADLINE_MARGIN of the budget has passed so that it
+    can play the best move it has found so far within the budget. Strategies
+    that do not accept a deadline are called as usual; callers can compare
+    the returned time with the budget to account for overruns.
+
     Input: 
         game (Reversi): gameboard
         bot (Callable): the strategy being used, as implemented in the bot.
+        time_budget (Optional[float]): seconds the bot may spend on its move
+
+    Returns (float): the number of seconds the bot spent on its move
     """
-    bot(game)
+    start = time.perf_counter()
+    if time_budget is not None and accepts_deadline(bot):
+        bot(game, deadline=start + DEADLINE_MARGIN * time_budget)
+    else:
+        bot(game)
+    return time.perf_counter() - start
 
 
 def random_bot(game: Reversi) -> None:
@@ -34,14 +87,21 @@ def random_bot(game: Reversi) -> None:
     game.apply_move(pos)
 
 
-def greedy_bot(game: Reversi) -> None:
+def greedy_bot(game: Reversi, deadline: Optional[float] = None) -> None:
     """
     Implements a greedy game playing strategy. Bot chooses the position from the
     list of available positions which maximizes the number of pieces it has
-    immediately after playing that move.
+    immediately after playing that move. If the deadline passes, the best
+    position found so far is played.
+
+    This bot deliberately keeps counting pieces rather than using pattern
+    tables: it is the "smart" baseline that other bots are measured against.
+    The pattern-table strategy is pattern_bot.
 
     Input:
         game (Reversi): gameboard
+        deadline (Optional[float]): time.perf_counter value by which the bot
+            must have chosen a move
     """
 
     def num_pieces(game: Reversi, player: int) -> int:
@@ -67,6 +127,9 @@ def greedy_bot(game: Reversi) -> None:
     max_n = 0
 
     for move in avbl_moves:
+        if out_of_time(deadline):
+            break
+
         simulation = game.simulate_moves([move])
         n = num_pieces(simulation, player)
 
@@ -77,13 +140,23 @@ def greedy_bot(game: Reversi) -> None:
     game.apply_move(best_move)
 
 
-def two_move_search_bot(game: Reversi) -> None:
+def two_move_search_bot(game: Reversi,
+                        deadline: Optional[float] = None) -> None:
     """
     Implements a game-playing strategy which seeks to maximize the average 
     number of pieces that a player has on the board after the next player 
     plays a move, assuming each move occurs with an equal probability. Override
     if playing a given move results in the player winning the game: the bot
-    will choose the winning move instead.
+    will choose the winning move instead. If the deadline passes, the best
+    move found so far is played.
+
+    Like greedy_bot, it deliberately keeps counting pieces (see pattern_bot
+    for the pattern-table strategy).
+
+    Input:
+        game (Reversi): gameboard
+        deadline (Optional[float]): time.perf_counter value by which the bot
+            must have chosen a move
     """
     current_player = game.turn
     current_moves = game.available_moves
@@ -91,6 +164,9 @@ def two_move_search_bot(game: Reversi) -> None:
     best_score = 0.
 
     for pos_move in current_moves:
+        if out_of_time(deadline):
+            break
+
         depth1_simulation = game.simulate_moves([pos_move])
         next_moves = depth1_simulation.available_moves
 
@@ -100,54 +176,209 @@ def two_move_search_bot(game: Reversi) -> None:
 
         pieces = 0
         for move in next_moves:
+            if out_of_time(deadline):
+                break
             depth2_simulation = depth1_simulation.simulate_moves([move])
             pieces += depth2_simulation.num_pieces(current_player)
+        else:
+            avg_pieces = pieces / len(next_moves)
 
-        avg_pieces = pieces / len(next_moves)
+            if avg_pieces > best_score:
+                best_score = avg_pieces
+                best_move = pos_move
+            continue
 
-        if avg_pieces > best_score:
-            best_score = avg_pieces
-            best_move = pos_move
+        # Ran out of time part way through: only fully evaluated moves count
+        break
+
+    game.apply_move(best_move)
+
+
+def pattern_bot(game: Reversi, deadline: Optional[float] = None) -> None:
+    """
+    Implements a game-playing strategy which chooses the move that leads to
+    the best position according to a pattern-table evaluation (corners,
+    edges and diagonals) instead of the raw number of pieces. If the deadline
+    passes, the best move found so far is played.
+
+    Moves are not simulated: a single evaluator follows the placed and
+    flipped squares of each move and is then put back, so rating a move only
+    takes a few pattern index updates and table lookups.
+
+    Input:
+        game (Reversi): gameboard
+        deadline (Optional[float]): time.perf_counter value by which the bot
+            must have chosen a move
+    """
+    player = game.turn
+    evaluator = PatternEvaluator.for_game(game)
+
+    avbl_moves = game.available_moves
+    best_move = avbl_moves[0]
+    best_score = float("-inf")
+
+    for move in avbl_moves:
+        if out_of_time(deadline):
+            break
+
+        flipped = [(pos, game.piece_at(pos) or 0)
+                   for pos in game.flipped(move)]
+        evaluator.update(move, None, player)
+        for pos, old in flipped:
+            evaluator.update(pos, old, player)
+        score = evaluator.evaluate(player)
+        for pos, old in flipped:
+            evaluator.update(pos, player, old)
+        evaluator.update(move, player, 0)
+
+        if score > best_score:
+            best_score = score
+            best_move = move
 
     game.apply_move(best_move)
 
 
+BOTS = {"random": random_bot,
+        "smart": greedy_bot,
+        "very-smart": two_move_search_bot,
+        "pattern": pattern_bot}
+"""
+The bots that can be chosen by name from the command line
+"""
+
+
+def choose_move(game: Reversi, bot_name: str,
+                time_budget: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Finds the move a bot would play, without changing the game. Suitable for
+    running in a worker process, since both the game and the bot's name can
+    be sent to it.
+
+    Input:
+        game (Reversi): gameboard
+        bot_name (str): the name of the bot in BOTS
+        time_budget (Optional[float]): seconds the bot may spend on its move
+
+    Returns (Tuple[int, int]): the move chosen by the bot
+    """
+    simulation = game.simulate_moves([])
+    use_bot(simulation, BOTS[bot_name], time_budget)
+    return simulation.moves[-1]
+
+
+def parse_seats(bot: Optional[str], seats: Iterable[str],
+                num_players: int) -> Dict[int, str]:
+    """
+    Works out which players are played by which bots, for the interfaces.
+
+    Input:
+        bot (Optional[str]): the bot playing as player 2 (--bot), or None
+        seats (Iterable[str]): strings of the form "PLAYER=BOT" (--seat)
+        num_players (int): the number of players
+
+    Returns (Dict[int, str]): the name of the bot playing each bot player
+    """
+    bot_seats = {}
+    if bot is not None:
+        bot_seats[2] = bot
+    for seat in seats:
+        player, _, name = seat.partition("=")
+        if not player.isdigit() or not 1 <= int(player) <= num_players:
+            raise ValueError(f"Seat must be PLAYER=BOT with a player between 1 "
+                             f"and {num_players}, not {seat}")
+        bot_seats[int(player)] = name
+    for name in bot_seats.values():
+        if name not in BOTS:
+            raise ValueError(f"Bot must be one of {', '.join(BOTS)}")
+    return bot_seats
+
+
 @click.command()
 @click.option("-n", "--num-games", default = 100, help = "Number of games")
 @click.option("-1", "--player1", default = "random", help = "Bot of player 1")
 @click.option("-2", "--player2", default = "random", help = "Bot of player 2")
-def main(num_games, player1, player2) -> None:
+@click.option("-t", "--time-limit", default = None, type = float,
+              help = "Seconds each bot may think per move")
+@click.option("--overrun", default = "forfeit",
+              type = click.Choice(["forfeit", "ignore"]),
+              help = "What happens to a bot that exceeds the time limit")
+@click.option("--seed", default = None, type = int,
+              help = "Random seed of the first game (games use seed, seed+1..)")
+@click.option("--record", default = None,
+              help = "Append a record of every game to this .jsonl.gz file")
+@click.option("--flush-every", default = 64,
+              type = click.IntRange(min = 1),
+              help = "Games to buffer before writing them to the record "
+                     "(1 lets spectators see every game as it ends)")
+def main(num_games, player1, player2, time_limit, overrun, seed,
+         record, flush_every) -> None:
     NUM_GAMES = num_games # Tracks the number of games being played
     PLAYER_1 = player1
     PLAYER_2 = player2
 
-    bot = {"random": random_bot,\
-           "smart": greedy_bot,\
-           "very-smart": two_move_search_bot}
+    bot = BOTS
 
     p1_wins = 0 # Number of times player 1 wins
     p2_wins = 0 # Number of times player 2 wins
     ties = 0 # Number of ties
-
-    for _ in range(NUM_GAMES):
-        game = Reversi(side=8, players=2, othello=True)
-        while not game.done:
-            if game.turn == 1:
-                use_bot(game, bot[PLAYER_1])
+    overruns = {1: 0, 2: 0} # Number of moves each player took too long on
+    # Closed however the run ends, so that the file is always complete
+    with (RecordWriter(record, buffer_size=flush_every)
+          if record is not None else contextlib.nullcontext()) as writer:
+        for game_num in range(NUM_GAMES):
+            if seed is not None:
+                game_seed = seed + game_num
+            else:
+                game_seed = random.randrange(2 ** 32)
+            random.seed(game_seed)
+
+            game = Reversi(side=8, players=2, othello=True)
+            forfeited = None # Player who lost by running out of time
+            think_times = [] # Seconds spent on each move
+            while not game.done:
+                player = game.turn
+                if player == 1:
+                    think_time = use_bot(game, bot[PLAYER_1], time_limit)
+                else:
+                    think_time = use_bot(game, bot[PLAYER_2], time_limit)
+                think_times.append(round(think_time, 6))
+
+                if time_limit is not None and think_time > time_limit:
+                    overruns[player] += 1
+                    if overrun == "forfeit":
+                        forfeited = player
+                        break
+
+            if forfeited is not None:
+                outcome = [2] if forfeited == 1 else [1]
             else:
-                use_bot(game, bot[PLAYER_2])
-   
-        if game.outcome == [1, 2]:
-            ties += 1
-        if game.outcome == [1]:
-            p1_wins += 1
-        if game.outcome == [2]:
-            p2_wins += 1
+                outcome = game.outcome
+
+            if writer is not None:
+                writer.write({"side": game.size,
+                              "players": game.num_players,
+                              "othello": game.othello,
+                              "bots": [PLAYER_1, PLAYER_2],
+                              "seed": game_seed,
+                              "moves": [list(move) for move in game.moves],
+                              "think_times": think_times,
+                              "score": [game.num_pieces(p) for p in (1, 2)],
+                              "outcome": outcome})
+
+            if outcome == [1, 2]:
+                ties += 1
+            if outcome == [1]:
+                p1_wins += 1
+            if outcome == [2]:
+                p2_wins += 1
 
     ### Print number of wins for each player, and number of draws
     print(f"Player 1 wins: {p1_wins / NUM_GAMES * 100:.2f}%\n \
             Player 2 wins: {p2_wins / NUM_GAMES * 100:.2f}%\n \
             Ties: {ties / NUM_GAMES * 100:.2f}%")
+    if time_limit is not None:
+        print(f"Moves over the time limit: Player 1: {overruns[1]}, "
+              f"Player 2: {overruns[2]}")
 
 
 if __name__ == "__main__":
@@ -1,18 +1,81 @@
+import os
+import threading
+import time
 import pygame
-from pygame import mixer
+from multiprocessing import Pool
 import click
 from reversi import Reversi
 from sys import exit
 from gui_helpers import *
-from bot import use_bot, random_bot, greedy_bot, two_move_search_bot
+from bot import choose_move, parse_seats
+
+MUSIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "background.mp3")
+
+
+def start_music(path):
+    """
+    Starts looping the background music. The mixer is started on the calling
+    (main) thread, since SDL's audio setup is not safe to run beside the
+    thread that draws; only reading the file and starting it play happen in
+    a background thread, so the window does not wait for them. If there is
+    no audio device or the file cannot be played, the game stays silent.
+
+    Args:
+        path (str): The music file to play
+
+    Returns:
+        thread (threading.Thread): The thread loading the music (to be
+            joined before pygame.quit), or None if there is no audio
+
+    """
+    try:
+        pygame.mixer.init()
+    except pygame.error as error:
+        print(f"Background music disabled: {error}")
+        return None
+
+    def load_and_play():
+        try:
+            pygame.mixer.music.load(path) # loads the background music
+            pygame.mixer.music.play(-1)
+        except (pygame.error, OSError) as error:
+            print(f"Background music disabled: {error}")
+
+    thread = threading.Thread(target=load_and_play, daemon=True)
+    thread.start()
+    return thread
+
+
+def refresh_interval():
+    """
+    Returns the time between two refreshes of the monitor, in seconds (1/60
+    if the refresh rate is unknown)
+    """
+    try:
+        rates = pygame.display.get_desktop_refresh_rates()
+    except (AttributeError, pygame.error):
+        rates = []
+    rate = rates[0] if rates and rates[0] > 0 else 60
+    return 1 / rate
 
 
 @click.command()
 @click.option("-n", "--num-players", default = 2, help="Number of players")
 @click.option('-s', "--board-size", default = 8, help='Board size')
 @click.option('--othello/--non-othello', default=True, help='Othello mode')
-@click.option("--bot", default=None, help="Bot to play against")
-def main(num_players, board_size, othello, bot) -> None:
+@click.option("--bot", default=None, help="Bot to play against (player 2)")
+@click.option("--seat", "seats", multiple=True,
+              help="Bot for any player, as PLAYER=BOT (can be repeated)")
+@click.option("--fast", is_flag=True,
+              help="Let bots move as fast as they can")
+@click.option("--audio/--no-audio", default=True, help="Background music")
+@click.option("--stats/--no-stats", "show_stats", default=False,
+              help="Frame-time overlay (toggle with F3)")
+@click.option("--stats-csv", default=None,
+              help="CSV file to log the time of every frame to")
+def main(num_players, board_size, othello, bot, seats, fast, audio,
+         show_stats, stats_csv) -> None:
     """
     Runs the game
     """
@@ -20,69 +83,216 @@ def main(num_players, board_size, othello, bot) -> None:
     BOARD_SIZE = board_size
     NUM_PLAYERS = num_players
     ORTHELLO_STATE = othello
-    clock = pygame.time.Clock()
+    BOT_TIME_BUDGET = 2.0 # seconds the bot may think before it must move
 
-    bots = {"random": random_bot, \
-        "smart": greedy_bot, \
-        "very-smart": two_move_search_bot}
-    
-    pygame.init()
+    if NUM_PLAYERS < 2 or NUM_PLAYERS > 9:
+        raise ValueError("Number of players must be between 2 and 9")
+    if BOARD_SIZE < 4:
+        raise ValueError("Board size must be at least 4")
+    BOT_SEATS = parse_seats(bot, seats, NUM_PLAYERS) # player -> bot name
+
+    # Bots think in a separate process, so the window stays responsive. It is
+    # started before SDL, which would stop it from being terminated
+    worker = Pool(1) if BOT_SEATS else None
+
+    # Only the modules that are used; the mixer is started with the music
+    pygame.display.init()
+    pygame.font.init()
     screen = pygame.display.set_mode((800, 700))
-    screen.fill(BACKGROUND_GREEN)
     pygame.display.set_caption("Reversi")
-    clock = pygame.time.Clock()
 
-    mixer.music.load("src/background.mp3") # loads the background music
-    mixer.music.play(-1)
+    # Big boards are shown a part at a time, and can be panned and zoomed
+    view = Viewport(BOARD_SIZE)
+    PAN_KEYS = {pygame.K_LEFT: (-1, 0), pygame.K_RIGHT: (1, 0),
+                pygame.K_UP: (0, -1), pygame.K_DOWN: (0, 1)}
+    ZOOM_KEYS = {pygame.K_PLUS: 1.25, pygame.K_EQUALS: 1.25,
+                 pygame.K_KP_PLUS: 1.25, pygame.K_MINUS: 0.8,
+                 pygame.K_KP_MINUS: 0.8}
 
-    if NUM_PLAYERS < 2 or NUM_PLAYERS > 9:
-        raise ValueError("Number of players must be between 2 and 9")
-    if BOARD_SIZE < 4 or BOARD_SIZE > 20:
-        raise ValueError("Board size must be between 4 and 20")
-    
-    SQUARE_SIZE = 700 // BOARD_SIZE
+    # Where the time of each frame goes, for the overlay and the CSV file;
+    # only recorded while one of them is on
+    stats = FrameStats(stats_csv)
+
+    def update_collecting():
+        """
+        Records frame times only while the overlay or the CSV file needs them
+        """
+        stats.enabled = show_stats or stats_csv is not None
+        collect_stats(stats if stats.enabled else None)
+
+    update_collecting()
 
     logic = Reversi(BOARD_SIZE, NUM_PLAYERS, ORTHELLO_STATE)
-    delay = 1
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT: # if the user presses quit 
-                pygame.quit()
-                exit() 
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                for row in range(BOARD_SIZE):
-                    for col in range(BOARD_SIZE):
-                        if (grid[row][col].collidepoint(mouse_pos) and
-                            (row, col) in logic.available_moves):
-                            if not logic.done:
-                                logic.apply_move((row, col))
-
-        screen.fill(BACKGROUND_GREEN) #clear the screen
-
-        grid: list
-        grid = create_board(BOARD_SIZE, SQUARE_SIZE) # creates the board
-        for c_row in grid:
-            for rect in c_row:
-                pygame.draw.rect(screen, "Black", rect, 1)
-
-        if logic.turn == 2 and bot is not None and not logic.done:
-            if delay % 24 == 0: # delays the bot move
-                use_bot(logic, bots[bot])
-            delay += 1
-
-        draw_pieces(screen, logic, SQUARE_SIZE) # draws the pieces
-
-        draw_possible_move(screen, logic, SQUARE_SIZE) # draws the possible move
-
-        pygame.draw.rect(screen, "Black", (0, 0, 700, 700), 5) #draws the border
-
-        draw_player_turn(screen, logic) # draws the player turn
-
-        draw_winner(screen, logic) # draws the winner
-
-        pygame.display.update()
-        clock.tick(24)
+
+    def snap(moved=True):
+        """
+        Returns a snapshot of the game to draw; only the cells on the screen
+        are copied and looked for hints in. Whether the game is over is only
+        asked of the logic after a move, and kept from the last snapshot when
+        just the view changed
+        """
+        with stats.timed("engine"):
+            done = logic.done if moved else snapshot.done
+            return take_snapshot(logic, done, view)
+
+    snapshot = snap() # what gets drawn, retaken on every move
+
+    background = create_background(screen.get_size(), view, BACKGROUND_GREEN)
+    assets = AssetCache(view.square_size) # fonts and sprites, built on use
+    pygame.display.update(draw_all(screen, background, snapshot, assets, view))
+    stats.end_frame()
+    # After the first frame is on the screen
+    music = start_music(MUSIC_PATH) if audio else None
+    drawn = snapshot # the snapshot that is on the screen
+    last_draw = time.perf_counter() # when the screen was last updated
+
+    # Events posted by timers and by the bot's worker
+    BOT_TURN = pygame.event.custom_type() # the bot may start thinking
+    BOT_DONE = pygame.event.custom_type() # the bot's move is ready
+    ANIMATE = pygame.event.custom_type() # the thinking indicator moves on
+    REDRAW = pygame.event.custom_type() # the next frame may be drawn
+    BOT_DELAY = 1000 # milliseconds before the bot starts thinking
+    ANIMATION_INTERVAL = 300 # milliseconds between indicator updates
+    FRAME_INTERVAL = refresh_interval() # never draw faster than the monitor
+    pygame.event.set_blocked(pygame.MOUSEMOTION) # never needs a redraw
+
+    dragging = None # where the board was grabbed to pan it, if it was
+    scheduled = False # whether a BOT_TURN is on its way
+    thinking = False # whether a bot's move is being computed
+    redraw_scheduled = False # whether a REDRAW timer is running
+    indicator_changed = False # whether the thinking indicator needs drawing
+    full_redraw = show_stats # whether the whole window needs drawing
+    bot_started = 0.0 # when the bot was asked for its move
+    # However the loop ends (quitting, or an error in the bot's worker), the
+    # bot's move is abandoned, the CSV file completed and the window closed
+    try:
+        while True:
+            # Sleeps until something happens: input, a timer or the bot
+            for event in [pygame.event.wait()] + pygame.event.get():
+                if event.type == pygame.QUIT: # if the user presses quit 
+                    exit() # cleans up below
+                view_changed = False
+                if (event.type == pygame.MOUSEBUTTONDOWN and event.button == 1
+                    and snapshot.turn not in BOT_SEATS):
+                    cell = view.cell_at(pygame.mouse.get_pos())
+                    if cell in snapshot.moves and not snapshot.done:
+                        with stats.timed("engine"):
+                            logic.apply_move(cell)
+                        snapshot = snap()
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
+                    dragging = pygame.mouse.get_pos() # right drag pans
+                    pygame.event.set_allowed(pygame.MOUSEMOTION)
+                if event.type == pygame.MOUSEBUTTONUP and event.button == 3:
+                    dragging = None
+                    pygame.event.set_blocked(pygame.MOUSEMOTION)
+                if event.type == pygame.MOUSEMOTION and dragging is not None:
+                    # Pans by whole squares, keeping the rest of the drag
+                    mouse_pos = pygame.mouse.get_pos()
+                    # (rounded toward zero, so both ways need a whole square)
+                    drow = int((dragging[0] - mouse_pos[0]) / view.square_size)
+                    dcol = int((dragging[1] - mouse_pos[1]) / view.square_size)
+                    if drow or dcol:
+                        view_changed = view.pan(drow, dcol)
+                        dragging = (dragging[0] - drow * view.square_size,
+                                    dragging[1] - dcol * view.square_size)
+                if event.type == pygame.MOUSEWHEEL and event.y:
+                    view_changed = view.zoom(1.25 if event.y > 0 else 0.8,
+                                             pygame.mouse.get_pos())
+                if event.type == pygame.KEYDOWN and event.key in ZOOM_KEYS:
+                    view_changed = view.zoom(ZOOM_KEYS[event.key])
+                if event.type == pygame.KEYDOWN and event.key in PAN_KEYS:
+                    step = max(1, view.area.width // view.square_size // 4)
+                    drow, dcol = PAN_KEYS[event.key]
+                    view_changed = view.pan(drow * step, dcol * step)
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    show_stats = not show_stats
+                    update_collecting()
+                    full_redraw = True
+                if view_changed: # everything on the board moves
+                    background = create_background(screen.get_size(), view,
+                                                   BACKGROUND_GREEN)
+                    assets.resize(view.square_size)
+                    snapshot = snap(moved=False)
+                    full_redraw = True
+                # BOT_TURN is only ever posted when there are bots, and so a
+                # worker
+                if event.type == BOT_TURN and worker is not None:
+                    scheduled = False
+                    thinking = True
+                    indicator_changed = True
+                    bot_started = time.perf_counter()
+                    # The game is sent as a copy: it is pickled in the
+                    # background, while this thread may still be querying logic
+                    worker.apply_async(
+                        choose_move, (logic.simulate_moves([]),
+                                      BOT_SEATS[snapshot.turn],
+                                      BOT_TIME_BUDGET),
+                        callback=lambda move: pygame.event.post(
+                            pygame.event.Event(BOT_DONE, move=move)),
+                        error_callback=lambda error: pygame.event.post(
+                            pygame.event.Event(BOT_DONE, error=error)))
+                    if not fast:
+                        pygame.time.set_timer(ANIMATE, ANIMATION_INTERVAL)
+                if event.type == BOT_DONE:
+                    if "error" in event.dict:
+                        raise event.error
+                    thinking = False
+                    indicator_changed = True
+                    stats.bot_time = time.perf_counter() - bot_started
+                    pygame.time.set_timer(ANIMATE, 0)
+                    with stats.timed("engine"):
+                        logic.apply_move(event.move)
+                    snapshot = snap()
+                if event.type == ANIMATE:
+                    indicator_changed = True
+                if event.type == REDRAW:
+                    redraw_scheduled = False
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    full_redraw = True
+
+            if (snapshot.turn in BOT_SEATS and not snapshot.done
+                and not scheduled and not thinking):
+                if fast: # the bot starts straight away
+                    pygame.event.post(pygame.event.Event(BOT_TURN))
+                else: # delays the bot move
+                    pygame.time.set_timer(BOT_TURN, BOT_DELAY, 1)
+                scheduled = True
+
+            # Draws at most once per monitor refresh; moves made in between are
+            # skipped over, since only the latest snapshot is drawn
+            wait = FRAME_INTERVAL - (time.perf_counter() - last_draw)
+            needs_draw = (snapshot is not drawn or indicator_changed or
+                          full_redraw)
+            if needs_draw and wait > 0:
+                if not redraw_scheduled:
+                    pygame.time.set_timer(REDRAW, max(1, int(wait * 1000)), 1)
+                    redraw_scheduled = True
+            elif needs_draw:
+                rects = []
+                if full_redraw:
+                    rects += draw_all(screen, background, snapshot, assets,
+                                      view)
+                elif snapshot is not drawn: # only redraw what changed
+                    rects += draw_changes(screen, background, drawn, snapshot,
+                                          assets, view)
+                drawn = snapshot
+                if BOT_SEATS:
+                    rects.append(draw_thinking(screen, background,
+                                               thinking and not fast, assets))
+                if show_stats: # shows the previous frame, this one is not over
+                    rects.append(draw_stats(screen, background, stats, assets))
+                pygame.display.update(rects)
+                stats.end_frame()
+                indicator_changed = False
+                full_redraw = False
+                last_draw = time.perf_counter()
+    finally:
+        if worker is not None:
+            worker.terminate() # abandons the bot's move
+        stats.close()
+        if music is not None:
+            music.join() # SDL must not be loading the file as it shuts down
+        pygame.quit()
 
 
 if __name__ == "__main__":
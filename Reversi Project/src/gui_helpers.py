@@ -1,131 +1,781 @@
+import csv
+import functools
+import time
+from collections import deque
+from contextlib import contextmanager
 import pygame
+import pygame.gfxdraw
+from typing import FrozenSet, NamedTuple, Optional, Tuple
 
-def create_board(BOARD_SIZE, SQUARE_SIZE):
+PLAYER_COLORS = ["Black", "White", "Blue", "Red", "Green", "Purple", "Orange",
+                 "Pink", "Brown"]
+
+STAT_NAMES = ["draw_all", "draw_changes", "draw_pieces", "draw_possible_move",
+              "draw_player_turn", "draw_thinking", "draw_winner", "engine"]
+"""
+What the time of a frame is split into: the draw functions, and the time
+spent querying and updating the game logic
+"""
+
+_stats = None # the FrameStats that draw functions report to, if any
+
+
+class RenderSnapshot(NamedTuple):
+    """
+    Immutable copy of everything the draw functions need from the game logic,
+    taken once per state change instead of querying the logic every frame.
+
+    Attributes:
+        grid (tuple): the board, or the part of it on the screen, as a tuple
+            of rows (as in Reversi.grid)
+        turn (int): the player whose turn it is
+        moves (frozenset): the positions the current player can play
+        done (bool): whether the game is over
+        winners (tuple): the winners of the game (empty if not over)
+        origin (tuple): the (row, col) of the first cell of grid
+    """
+    grid: Tuple[Tuple[Optional[int], ...], ...]
+    turn: int
+    moves: FrozenSet[Tuple[int, int]]
+    done: bool
+    winners: Tuple[int, ...]
+    origin: Tuple[int, int] = (0, 0)
+
+    def piece_at(self, row, col):
+        """
+        Returns the piece in a cell of the board, which must be in grid
+        """
+        return self.grid[row - self.origin[0]][col - self.origin[1]]
+
+
+def take_snapshot(logic, done, view=None):
+    """
+    Takes a render snapshot of the game. With a view, only the cells on the
+    screen are copied and searched for possible moves, so the cost does not
+    grow with the size of the board.
+
+    Args:
+        logic (Reversilogic): The logic to take the snapshot of
+        done (bool): Whether the game is over; working it out searches the
+            whole board, so callers only ask the logic after a move and
+            otherwise reuse the previous snapshot's
+        view (Viewport): The part of the board on the screen (default: the
+            whole board)
+
+    Returns:
+        snapshot (RenderSnapshot): The state of the game to draw
+
+    """
+    if view is None:
+        origin = (0, 0)
+        grid = tuple(tuple(row) for row in logic.grid)
+        moves = frozenset() if done else frozenset(logic.available_moves)
+    else:
+        rows, cols = view.visible_range()
+        origin = (rows.start, cols.start)
+        grid = tuple(tuple(logic.piece_at((row, col)) for col in cols)
+                     for row in rows)
+        moves = frozenset() if done else frozenset(
+            (row, col) for row in rows for col in cols
+            if grid[row - rows.start][col - cols.start] is None and
+            logic.legal_move((row, col)))
+    return RenderSnapshot(grid=grid,
+                          turn=logic.turn,
+                          moves=moves,
+                          done=done,
+                          winners=tuple(logic.outcome) if done else (),
+                          origin=origin)
+
+
+class Viewport:
+    """
+    The part of the board that is shown in the board area of the window, for
+    boards too big to show whole. Squares are SQUARE_SIZE pixels wide, and
+    the board can be panned and zoomed.
+
+    As everywhere in the GUI, rows run from left to right and columns from
+    top to bottom.
+
+    Attributes:
+        board_size (int): The size of the board
+        square_size (int): The size of each square on the screen
+        first_row, first_col (int): The cell in the top left corner
+        area (pygame.Rect): The board area of the window
+        inner (pygame.Rect): The board area inside its border
+
+    Methods:
+        visible_range: the rows and columns (at least partly) on the screen
+        visible_cells: the cells (at least partly) on the screen
+        cell_rect: where a cell is on the screen
+        cell_at: which cell is at a point on the screen
+        pan: move the view
+        zoom: change the size of the squares
+    """
+    MIN_SQUARE_SIZE = 8
+    MAX_SQUARE_SIZE = 120
+
+    def __init__(self, BOARD_SIZE, area=pygame.Rect(0, 0, 700, 700)):
+        self._board_size = BOARD_SIZE
+        self._area = pygame.Rect(area)
+        self._square_size = max(self._area.width // BOARD_SIZE,
+                                self.MIN_SQUARE_SIZE)
+        self._first_row = 0
+        self._first_col = 0
+        # Starts in the middle, where the first pieces go
+        middle = (BOARD_SIZE - self._area.width // self._square_size) // 2
+        self.pan(middle, middle)
+
+    @property
+    def board_size(self):
+        """
+        Returns the size of the board
+        """
+        return self._board_size
+
+    @property
+    def square_size(self):
+        """
+        Returns the size of each square on the screen
+        """
+        return self._square_size
+
+    @property
+    def first_row(self):
+        """
+        Returns the row of the cells at the left of the screen
+        """
+        return self._first_row
+
+    @property
+    def first_col(self):
+        """
+        Returns the column of the cells at the top of the screen
+        """
+        return self._first_col
+
+    @property
+    def area(self):
+        """
+        Returns the board area of the window
+        """
+        return self._area
+
+    @property
+    def inner(self):
+        """
+        Returns the part of the board area inside its border, which pieces
+        are clipped to
+        """
+        return self._area.inflate(-10, -10)
+
+    def _cells_across(self):
+        """
+        Returns how many cells fit (at least partly) across the board area
+        """
+        return -(-self._area.width // self._square_size)
+
+    def visible_range(self):
+        """
+        Returns the ranges of rows and of columns on the screen
+        """
+        last_row = min(self._first_row + self._cells_across(),
+                       self._board_size)
+        last_col = min(self._first_col + self._cells_across(),
+                       self._board_size)
+        return (range(self._first_row, last_row),
+                range(self._first_col, last_col))
+
+    def visible_cells(self):
+        """
+        Returns the (row, col) positions of the cells on the screen
+        """
+        rows, cols = self.visible_range()
+        return [(row, col) for row in rows for col in cols]
+
+    def cell_rect(self, row, col):
+        """
+        Returns the rectangle a cell takes up on the screen (which may be
+        partly outside the board area)
+        """
+        return pygame.Rect(self._area.x + (row - self._first_row) *
+                           self._square_size,
+                           self._area.y + (col - self._first_col) *
+                           self._square_size,
+                           self._square_size, self._square_size)
+
+    def cell_at(self, pos):
+        """
+        Returns the (row, col) position of the cell at a point on the
+        screen, or None if there is no cell there
+        """
+        if not self._area.collidepoint(pos):
+            return None
+        row = self._first_row + (pos[0] - self._area.x) // self._square_size
+        col = self._first_col + (pos[1] - self._area.y) // self._square_size
+        if row < self._board_size and col < self._board_size:
+            return (row, col)
+        return None
+
+    def pan(self, drow, dcol):
+        """
+        Moves the view by a number of cells, staying on the board
+
+        Returns:
+            moved (bool): Whether the view changed
+
+        """
+        old = (self._first_row, self._first_col)
+        last = max(self._board_size - self._area.width // self._square_size,
+                   0)
+        self._first_row = min(max(self._first_row + drow, 0), last)
+        self._first_col = min(max(self._first_col + dcol, 0), last)
+        return (self._first_row, self._first_col) != old
+
+    def zoom(self, factor, pos=None):
+        """
+        Scales the squares by a factor, keeping the cell under pos (default,
+        and for points outside the board area: the middle of the board area)
+        in place
+
+        Returns:
+            zoomed (bool): Whether the view changed
+
+        """
+        if pos is None or not self._area.collidepoint(pos):
+            pos = self._area.center
+        anchor = self.cell_at(pos) or (self._first_row, self._first_col)
+        old = (self._square_size, self._first_row, self._first_col)
+        self._square_size = min(max(round(self._square_size * factor),
+                                    self.MIN_SQUARE_SIZE),
+                                self.MAX_SQUARE_SIZE)
+        # Keeps the anchor cell under the same point
+        self._first_row = anchor[0] - (pos[0] - self._area.x) // \
+            self._square_size
+        self._first_col = anchor[1] - (pos[1] - self._area.y) // \
+            self._square_size
+        self.pan(0, 0)
+        return (self._square_size, self._first_row, self._first_col) != old
+
+
+def create_background(size, view, color):
+    """
+    Draws everything that only changes when the view does (the visible board
+    squares and the border) onto a surface, so that it can be blitted instead
+    of redrawn
+
+    Args:
+        size (tuple): The size of the window
+        view (Viewport): The part of the board on the screen
+        color (tuple): The background colour
+
+    Returns:
+        background (pygame.Surface): The background surface
+
+    """
+    background = pygame.Surface(size)
+    background.fill(color)
+    background.set_clip(view.area)
+    for row, col in view.visible_cells():
+        pygame.draw.rect(background, "Black", view.cell_rect(row, col), 1)
+    background.set_clip(None)
+    pygame.draw.rect(background, "Black", view.area, 5) #the border
+    return background
+
+
+def changed_cells(old, new):
+    """
+    Finds the cells that look different in two snapshots: cells whose piece
+    changed (the placed and flipped pieces) and cells whose hint appeared or
+    disappeared
+
+    Args:
+        old (RenderSnapshot): The snapshot on the screen
+        new (RenderSnapshot): The snapshot to draw
+
+    Returns:
+        cells (set): The (row, col) positions of the changed cells
+
+    """
+    cells = set(old.moves ^ new.moves)
+    row_start, col_start = new.origin
+    if (old.origin != new.origin or len(old.grid) != len(new.grid) or
+        old.grid[:1] and len(old.grid[0]) != len(new.grid[0])):
+        # Different parts of the board: every cell of the new one changed
+        return cells | {(row_start + row, col_start + col)
+                        for row, new_row in enumerate(new.grid)
+                        for col in range(len(new_row))}
+    for row_index, (old_row, new_row) in enumerate(zip(old.grid, new.grid),
+                                                   start=row_start):
+        if old_row != new_row:
+            for col_index, (old_cell, new_cell) in enumerate(
+                    zip(old_row, new_row), start=col_start):
+                if old_cell != new_cell:
+                    cells.add((row_index, col_index))
+    return cells
+
+
+class AssetCache:
+    """
+    Builds the fonts, text and sprites the GUI draws once, so that drawing a
+    frame only takes blits.
+
+    Pieces and hints depend on the size of the squares and are rebuilt when
+    it changes (see resize). Fonts and text never need rebuilding.
+
+    Attributes:
+        square_size (int): The size of each square
+
+    Methods:
+        resize: change the size of the squares
+        font: a font
+        text: a rendered piece of text
+        disc: an antialiased filled circle
+        piece: the sprite of a player's piece
+        hint: the sprite of a possible move
+    """
+
+    def __init__(self, SQUARE_SIZE):
+        self._square_size = SQUARE_SIZE
+        self._fonts = {}
+        self._texts = {}
+        self._discs = {}
+
+    @property
+    def square_size(self):
+        """
+        Returns the size of each square
+        """
+        return self._square_size
+
+    def resize(self, SQUARE_SIZE):
+        """
+        Changes the size of the squares, dropping the sprites of the old size
+
+        Args:
+            SQUARE_SIZE (int): The new size of each square
+
+        Returns:
+            None
+
+        """
+        if SQUARE_SIZE != self._square_size:
+            self._square_size = SQUARE_SIZE
+            self._discs = {}
+
+    def font(self, name, size):
+        """
+        Returns the (cached) system font with a given name and size
+        """
+        key = (name, size)
+        if key not in self._fonts:
+            self._fonts[key] = pygame.font.SysFont(name, size)
+        return self._fonts[key]
+
+    def text(self, text, name, size, color):
+        """
+        Returns the (cached) surface of a piece of text
+        """
+        key = (text, name, size, color)
+        if key not in self._texts:
+            self._texts[key] = self.font(name, size).render(text, True, color)
+        return self._texts[key]
+
+    def disc(self, color, radius, size=None):
+        """
+        Returns the (cached) sprite of an antialiased filled circle, centred
+        in a transparent square of side size (default: just big enough)
+        """
+        radius = max(int(radius), 1)
+        size = 2 * radius + 2 if size is None else size
+        key = (color, radius, size)
+        if key not in self._discs:
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            rgb = pygame.Color(color)
+            pygame.gfxdraw.aacircle(sprite, size // 2, size // 2, radius, rgb)
+            pygame.gfxdraw.filled_circle(sprite, size // 2, size // 2, radius,
+                                         rgb)
+            self._discs[key] = sprite
+        return self._discs[key]
+
+    def piece(self, player):
+        """
+        Returns the sprite of a player's piece, the size of a square
+        """
+        return self.disc(PLAYER_COLORS[player - 1],
+                         self._square_size//2 - 5, self._square_size)
+
+    def hint(self):
+        """
+        Returns the sprite of a possible move, the size of a square
+        """
+        return self.disc("Yellow",
+                         self._square_size//2 - (self._square_size//2.5),
+                         self._square_size)
+
+
+class FrameStats:
+    """
+    Records where the time of each frame goes: how long each draw function
+    took (not counting the draw functions it calls), how long the game logic
+    took, the frame rate and how long the last bot took to move. Each frame
+    can also be logged as a row of a CSV file.
+
+    Attributes:
+        enabled (bool): Whether time is being recorded (when it is not,
+            timed and end_frame do nothing)
+        fps (int): The number of frames drawn in the second before the last
+            frame ended
+        last (dict): The seconds spent on each of STAT_NAMES in the last
+            finished frame
+        frame_time (float): The seconds spent on the last finished frame
+        bot_time (float): The seconds the last bot move took, or None
+
+    Methods:
+        timed: time a block of code as part of the current frame
+        end_frame: finish the current frame
+        close: close the CSV file
     """
-    Draws the board
+
+    def __init__(self, csv_path=None, enabled=True):
+        self.enabled = enabled
+        self.last = {}
+        self.bot_time = None
+        self._times = {}
+        self._stack = [] # time taken by the blocks inside each running block
+        self._frames = deque() # when the frames of the last second ended
+        self._num_frames = 0
+        self._start = time.perf_counter()
+        self._file = None
+        if csv_path is not None:
+            self._file = open(csv_path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["time", "frame", "fps"] + STAT_NAMES +
+                                  ["bot"])
+
+    @property
+    def fps(self):
+        """
+        Returns the number of frames drawn in the second before the last
+        frame ended (it is not brought up to date while nothing is drawn)
+        """
+        return len(self._frames)
+
+    @property
+    def frame_time(self):
+        """
+        Returns the seconds spent on the last finished frame
+        """
+        return sum(self.last.values())
+
+    @contextmanager
+    def timed(self, name):
+        """
+        Adds the time a block of code takes to one of STAT_NAMES, leaving out
+        the time of any timed blocks inside it
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        self._stack.append(0.)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            inner = self._stack.pop()
+            self._times[name] = self._times.get(name, 0.) + elapsed - inner
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def end_frame(self):
+        """
+        Finishes the current frame, logging it if there is a CSV file
+
+        Returns:
+            None
+
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._frames.append(now)
+        while self._frames[0] < now - 1:
+            self._frames.popleft()
+        self._num_frames += 1
+        self.last = self._times
+        self._times = {}
+        if self._file is not None:
+            self._writer.writerow(
+                [f"{now - self._start:.4f}", self._num_frames, self.fps] +
+                [f"{self.last.get(name, 0.) * 1000:.3f}"
+                 for name in STAT_NAMES] +
+                ["" if self.bot_time is None else
+                 f"{self.bot_time * 1000:.1f}"])
+
+    def close(self):
+        """
+        Closes the CSV file, if there is one
+
+        Returns:
+            None
+
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def collect_stats(stats):
+    """
+    Makes the draw functions report their time to a FrameStats (None to stop)
+
+    Returns:
+        None
+
+    """
+    global _stats
+    _stats = stats
+
+
+def profiled(func):
+    """
+    Decorator that times a draw function when stats are being collected
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _stats is None:
+            return func(*args, **kwargs)
+        with _stats.timed(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@profiled
+def draw_all(screen, background, snapshot, assets, view):
+    """
+    Draws the whole window
 
     Args:
         screen (pygame.Surface): The screen to draw on
-        BOARD_SIZE (int): The size of the board
-        SQUARE_SIZE (int): The size of each square
+        background (pygame.Surface): The background from create_background
+        snapshot (RenderSnapshot): The game state to draw
+        assets (AssetCache): The fonts and sprites to draw with
+        view (Viewport): The part of the board on the screen
 
     Returns:
-        grid (list): A list of the rectangles that make up the board
+        rects (list): The areas of the screen that were drawn on
 
     """
-    grid = []
-    for i in range(BOARD_SIZE): #draw the board
-        row = []
-        for j in range(BOARD_SIZE):
-            rect = pygame.Rect(i*SQUARE_SIZE, j*SQUARE_SIZE, SQUARE_SIZE,
-                               SQUARE_SIZE)
-            row.append(rect)
-        grid.append(row)
-    return grid
-            
+    screen.blit(background, (0, 0))
+    draw_pieces(screen, snapshot, assets, view) # draws the pieces
+    draw_possible_move(screen, snapshot, assets, view) # draws the hints
+    draw_player_turn(screen, snapshot, assets) # draws the player turn
+    draw_winner(screen, snapshot, assets) # draws the winner
+    return [screen.get_rect()]
 
-def draw_pieces(screen, logic, SQUARE_SIZE):
+
+@profiled
+def draw_changes(screen, background, old, new, assets, view):
+    """
+    Draws only the parts of the window that differ between two snapshots,
+    restoring each changed cell from the background first
+
+    Args:
+        screen (pygame.Surface): The screen to draw on
+        background (pygame.Surface): The background from create_background
+        old (RenderSnapshot): The snapshot on the screen
+        new (RenderSnapshot): The snapshot to draw
+        assets (AssetCache): The fonts and sprites to draw with
+        view (Viewport): The part of the board on the screen
+
+    Returns:
+        rects (list): The areas of the screen that were drawn on
+
+    """
+    if new.done != old.done: # the winner box covers the middle of the board
+        return draw_all(screen, background, new, assets, view)
+
+    cells = changed_cells(old, new) & set(view.visible_cells())
+    rects = []
+    for row, col in cells:
+        rect = view.cell_rect(row, col).clip(view.area)
+        screen.blit(background, rect, rect)
+        rects.append(rect)
+    draw_pieces(screen, new, assets, view, cells)
+    draw_possible_move(screen, new, assets, view, cells)
+
+    if new.turn != old.turn:
+        rect = pygame.Rect(705, 265, 90, 100)
+        screen.blit(background, rect, rect)
+        draw_player_turn(screen, new, assets)
+        rects.append(rect)
+    return rects
+
+
+@profiled
+def draw_pieces(screen, snapshot, assets, view, cells=None):
     """
     Draws the pieces on the board
 
     Args:
         screen (pygame.Surface): The screen to draw on
-        logic (Reversilogic): The logic to draw the pieces from
-        SQUARE_SIZE (int): The size of each square
+        snapshot (RenderSnapshot): The game state to draw the pieces from
+        assets (AssetCache): The fonts and sprites to draw with
+        view (Viewport): The part of the board on the screen
+        cells (set): Only draw the pieces in these cells (default: all the
+            visible cells)
 
     Returns:
         None
 
     """
+    if cells is None:
+        cells = view.visible_cells()
+    screen.set_clip(view.inner)
+    for row_index, col_index in cells:
+        location = snapshot.piece_at(row_index, col_index)
+        if location != 0 and location is not None:
+            screen.blit(assets.piece(location),
+                        view.cell_rect(row_index, col_index))
+    screen.set_clip(None)
 
-    radius = SQUARE_SIZE//2 - 5
-    colors = ["Black", "White", "Blue", "Red", "Green", "Purple", "Orange",
-               "Pink", "Brown"]
-    for row_index, row in enumerate(logic.grid):
-        for col_index, col in enumerate(row):
-            location = logic.grid[row_index][col_index]
-            if location != 0 and location is not None:
-                pygame.draw.circle(screen, colors[location - 1], ((row_index *
-                     SQUARE_SIZE + SQUARE_SIZE//2), (col_index*SQUARE_SIZE + 
-                                                     SQUARE_SIZE//2)), radius)
-
-def draw_possible_move(screen, logic, SQUARE_SIZE):
+@profiled
+def draw_possible_move(screen, snapshot, assets, view, cells=None):
     """
     Draws the possible moves on the board
 
     Args:
         screen (pygame.Surface): The screen to draw on
-        logic (Reversilogic): The logic to draw the pieces from
-        SQUARE_SIZE (int): The size of each square
+        snapshot (RenderSnapshot): The game state to draw the moves from
+        assets (AssetCache): The fonts and sprites to draw with
+        view (Viewport): The part of the board on the screen
+        cells (set): Only draw the moves in these cells (default: all the
+            visible cells)
 
     Returns:
         None
 
     """
+    if cells is None:
+        cells = view.visible_cells()
+    hint = assets.hint()
+    screen.set_clip(view.inner)
+    for row, col in snapshot.moves & set(cells):
+        screen.blit(hint, view.cell_rect(row, col))
+    screen.set_clip(None)
 
-    radius = SQUARE_SIZE//2 - (SQUARE_SIZE//2.5)
-    for location in logic.available_moves:
-        row, col = location
-        pygame.draw.circle(screen, "Yellow", ((row * SQUARE_SIZE +
-                                                  SQUARE_SIZE//2),
-                                                    (col*SQUARE_SIZE +
-                                                        SQUARE_SIZE//2)),
-                                                         radius)
-
-def draw_player_turn(screen, logic):
+@profiled
+def draw_player_turn(screen, snapshot, assets):
     """
     Draws the player turn on the board
     
     Args:
         screen (pygame.Surface): The screen to draw on
-        logic (Reversilogic): The logic to draw the pieces from
+        snapshot (RenderSnapshot): The game state to draw the turn from
+        assets (AssetCache): The fonts and sprites to draw with
 
     Returns:
         None
 
     """
-    turn = logic.turn
-    colors = ["Black", "White", "Blue", "Red", "Green", "Purple", "Orange", 
-              "Pink", "Brown"]
+    turn = snapshot.turn
     pygame.draw.rect(screen, "Black", (705, 265, 90, 100), 4)
-    pygame.draw.circle(screen, colors[turn - 1 ], (750, 325), 30)
-    
-    font = pygame.font.SysFont("Arial", 20)
-    text = font.render("Turn", True, "BLACK")
-    screen.blit(text, (730, 270))
+    disc = assets.disc(PLAYER_COLORS[turn - 1], 30)
+    screen.blit(disc, disc.get_rect(center=(750, 325)))
+
+    screen.blit(assets.text("Turn", "Arial", 20, "BLACK"), (730, 270))
     
 
-def draw_winner(screen, logic):
+@profiled
+def draw_thinking(screen, background, thinking, assets):
+    """
+    Draws (or clears) an animated indicator that the bot is thinking
+
+    Args:
+        screen (pygame.Surface): The screen to draw on
+        background (pygame.Surface): The background from create_background
+        thinking (bool): Whether the bot is thinking
+        assets (AssetCache): The fonts and sprites to draw with
+
+    Returns:
+        rect (pygame.Rect): The area of the screen that was drawn on
+
+    """
+    rect = pygame.Rect(705, 375, 90, 30)
+    screen.blit(background, rect, rect)
+    if thinking:
+        dots = "." * (int(time.monotonic() / 0.3) % 4)
+        screen.blit(assets.text("Thinking" + dots, "Arial", 16, "BLACK"),
+                    (712, 380))
+    return rect
+
+
+@profiled
+def draw_winner(screen, snapshot, assets):
     """
     Draws the winner on the board
 
     Args:
         screen (pygame.Surface): The screen to draw on
-        logic (Reversilogic): The logic to draw the pieces from
+        snapshot (RenderSnapshot): The game state to draw the winner from
+        assets (AssetCache): The fonts and sprites to draw with
 
     Returns:
         None
 
     """
-    winner = logic.outcome
-    colors = ["Black", "White", "Blue", "Red", "Green", "Purple", "Orange",
-               "Pink", "Brown"]
+    winner = snapshot.winners
     brown = (162,137,88)
     gray = (178, 178, 178)
-    if logic.done:
+    if snapshot.done:
         if len(winner) == 1:
             pygame.draw.rect(screen, gray, (170, 200, 435, 335))
             pygame.draw.rect(screen, brown, (170, 200, 435, 335), 9)
 
-            pygame.draw.circle(screen, colors[winner[0] - 1], (390, 390), 50)
+            disc = assets.disc(PLAYER_COLORS[winner[0] - 1], 50)
+            screen.blit(disc, disc.get_rect(center=(390, 390)))
 
-            font = pygame.font.SysFont("Verdana", 55) #draws the text
-            text = font.render("!!WINNER!!", True, "White")
-            screen.blit(text, (240, 255))
+            screen.blit(assets.text("!!WINNER!!", "Verdana", 55, "White"),
+                        (240, 255)) #draws the text
         else:
             pygame.draw.rect(screen, gray, (170, 200, 435, 335))
             pygame.draw.rect(screen, brown, (170, 200, 435, 335), 9) 
 
-            font = pygame.font.SysFont("Verdana", 85) #draws the text
-            text = font.render("TIE", True, "White")
-            screen.blit(text, (310, 300))
+            screen.blit(assets.text("TIE", "Verdana", 85, "White"),
+                        (310, 300)) #draws the text
+
+
+def draw_stats(screen, background, stats, assets):
+    """
+    Draws the frame-time overlay: the time the last frame took, in total and
+    for each part, and the time the last bot move took. The overlay is only
+    redrawn with a frame, so it shows the last frame rather than a rate that
+    would go stale while the window is idle
+
+    Args:
+        screen (pygame.Surface): The screen to draw on
+        background (pygame.Surface): The background from create_background
+        stats (FrameStats): The stats to draw
+        assets (AssetCache): The fonts and sprites to draw with
+
+    Returns:
+        rect (pygame.Rect): The area of the screen that was drawn on
+
+    """
+    labels = {"draw_all": "all", "draw_changes": "changes",
+              "draw_pieces": "pieces", "draw_possible_move": "hints",
+              "draw_player_turn": "turn", "draw_thinking": "thinking",
+              "draw_winner": "winner", "engine": "engine"}
+    lines = [f"frame {stats.frame_time * 1000:.1f}ms"]
+    lines += [f"{labels[name]} {stats.last.get(name, 0.) * 1000:.1f}ms"
+              for name in STAT_NAMES]
+    if stats.bot_time is not None:
+        lines.append(f"bot {stats.bot_time:.2f}s")
+
+    rect = pygame.Rect(705, 415, 90, 275)
+    screen.blit(background, rect, rect)
+    font = assets.font("Arial", 13) # the numbers change too often to cache
+    for line_num, line in enumerate(lines):
+        screen.blit(font.render(line, True, "Black"),
+                    (710, 420 + 17 * line_num))
+    return rect
@@ -0,0 +1,302 @@
+"""
+Pattern-table evaluation for reversi (in the style of Logistello).
+
+A pattern is a fixed list of squares, such as the squares along an edge
+starting from a corner. The contents of those squares are read as a number
+in base (players + 1), with 0 for an empty square and the player number
+otherwise, and that number indexes a table of weights. All instances of a
+pattern that are rotations or reflections of each other share one table.
+
+The evaluator keeps the index of every pattern instance up to date as pieces
+are placed and flipped, so evaluating a position only takes one table lookup
+per pattern instance.
+"""
+from array import array
+from math import isqrt
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from reversi import Reversi
+
+MAX_TABLE_SIZE = 3 ** 9
+"""
+Largest number of entries in a single weight table (per player). Patterns
+are made shorter when there are more players, so tables stay small.
+"""
+
+PatternsType = Dict[str, List[List[Tuple[int, int]]]]
+"""
+Type for the pattern instances of a board: for each kind of pattern, the
+list of instances, each of which is a list of squares
+"""
+
+
+def pattern_length(players: int) -> int:
+    """
+    Returns the number of squares in a pattern for a given number of players,
+    so that (players + 1) ** length is at most MAX_TABLE_SIZE.
+
+    Inputs:
+        players (int): the number of players
+    """
+    base = players + 1
+    length = 1
+    while base ** (length + 1) <= MAX_TABLE_SIZE:
+        length += 1
+    return length
+
+
+def make_patterns(side: int, players: int) -> PatternsType:
+    """
+    Creates the pattern instances for a board.
+
+    There are three kinds of pattern, each anchored at a corner:
+    - edge: squares along an edge, starting at the corner (two per corner)
+    - corner: a square block of squares in the corner (one per corner)
+    - diagonal: squares along the diagonal, starting at the corner (one per
+      corner)
+
+    Inputs:
+        side (int): the size of the board
+        players (int): the number of players
+
+    Returns (PatternsType): the pattern instances
+    """
+    length = min(pattern_length(players), side)
+    block = min(isqrt(length), side // 2)
+    last = side - 1
+
+    patterns: PatternsType = {"edge": [], "corner": [], "diagonal": []}
+    for row0, drow in ((0, 1), (last, -1)):
+        for col0, dcol in ((0, 1), (last, -1)):
+            patterns["edge"].append([(row0, col0 + i * dcol)
+                                     for i in range(length)])
+            patterns["edge"].append([(row0 + i * drow, col0)
+                                     for i in range(length)])
+            patterns["corner"].append([(row0 + i * drow, col0 + j * dcol)
+                                       for i in range(block)
+                                       for j in range(block)])
+            patterns["diagonal"].append([(row0 + i * drow, col0 + i * dcol)
+                                         for i in range(length)])
+    return patterns
+
+
+def square_value(side: int, pos: Tuple[int, int]) -> float:
+    """
+    Returns a hand-picked value of owning a square: corners are very
+    valuable, squares next to an empty corner are dangerous, and edges are
+    better than the middle of the board.
+
+    Inputs:
+        side (int): the size of the board
+        pos (Tuple[int, int]): the square
+    """
+    row, col = (min(coord, side - 1 - coord) for coord in pos)
+    if row == 0 and col == 0:
+        return 20.
+    if row <= 1 and col <= 1:
+        return -8. if row == col else -4.
+    if row == 0 or col == 0:
+        return 3.
+    return 1.
+
+
+def default_weights(side: int, players: int,
+                    patterns: PatternsType) -> Dict[str, array]:
+    """
+    Creates weight tables from the hand-picked square values, for use until
+    tuned weights are available.
+
+    Each table holds players * (players + 1) ** length entries: one block per
+    player, giving the value of every pattern index from the point of view of
+    that player. Owning a square adds its value; a square owned by another
+    player subtracts its value, shared out among the other players.
+
+    Inputs:
+        side (int): the size of the board
+        players (int): the number of players
+        patterns (PatternsType): the pattern instances (from make_patterns)
+
+    Returns (Dict[str, array]): the weight table of every kind of pattern
+    """
+    base = players + 1
+    weights = {}
+    for kind, instances in patterns.items():
+        squares = instances[0]
+        values = np.array([square_value(side, pos) for pos in squares])
+        indices = np.arange(base ** len(squares))
+        digits = (indices[:, None] // base ** np.arange(len(squares))) % base
+
+        table = np.empty((players, len(indices)), dtype=np.float32)
+        for player in range(1, players + 1):
+            sign = np.where(digits == player, 1.,
+                            np.where(digits == 0, 0., -1. / (players - 1)))
+            table[player - 1] = sign @ values
+        weights[kind] = array("f", table.tobytes())
+    return weights
+
+
+_DEFAULT_WEIGHTS: Dict[Tuple[int, int], Dict[str, array]] = {}
+"""
+Default weight tables, built once for every (side, players)
+"""
+
+
+class PatternEvaluator:
+    """
+    Class to evaluate reversi positions with pattern tables.
+
+    Attributes:
+        side (int): the size of the board
+        players (int): the number of players
+        weights (Dict[str, array]): the weight table of every kind of pattern
+        indices (List[int]): the current index of every pattern instance
+
+    Methods:
+        update: keep the pattern indices up to date when a square changes
+        evaluate: rate the position from the point of view of a player
+        copy: copy the evaluator, sharing its weight tables
+    """
+    _side: int
+    _players: int
+    _kinds: List[str]
+    _sizes: List[int]
+    _indices: List[int]
+    _counts: List[int]
+    _squares: Dict[Tuple[int, int], List[Tuple[int, int]]]
+    _weights: Dict[str, array]
+
+    def __init__(self, side: int, players: int,
+                 weights: Optional[Dict[str, array]] = None):
+        self._side = side
+        self._players = players
+        patterns = make_patterns(side, players)
+        if weights is None:
+            if (side, players) not in _DEFAULT_WEIGHTS:
+                _DEFAULT_WEIGHTS[(side, players)] = \
+                    default_weights(side, players, patterns)
+            weights = _DEFAULT_WEIGHTS[(side, players)]
+        self._weights = weights
+
+        # For every square, the (instance, place value) pairs it belongs to
+        self._kinds = []
+        self._sizes = []
+        self._squares = {}
+        for kind, instances in patterns.items():
+            for squares in instances:
+                instance = len(self._kinds)
+                self._kinds.append(kind)
+                self._sizes.append((players + 1) ** len(squares))
+                for place, pos in enumerate(squares):
+                    self._squares.setdefault(pos, []).append(
+                        (instance, (players + 1) ** place))
+        self._indices = [0] * len(self._kinds)
+        self._counts = [0] * (players + 1)
+
+    @classmethod
+    def for_game(cls, game: Reversi,
+                 weights: Optional[Dict[str, array]] = None
+                 ) -> "PatternEvaluator":
+        """
+        Creates an evaluator for the current position of a game.
+
+        Inputs:
+            game (Reversi): gameboard
+            weights (Optional[Dict[str, array]]): weight tables to use instead
+                of the default ones
+
+        Returns (PatternEvaluator): the evaluator
+        """
+        evaluator = cls(game.size, game.num_players, weights)
+        for row, cells in enumerate(game.grid):
+            for col, player in enumerate(cells):
+                if player is not None:
+                    evaluator.update((row, col), None, player)
+        return evaluator
+
+    @property
+    def side(self) -> int:
+        """
+        Returns the size of the board
+        """
+        return self._side
+
+    @property
+    def players(self) -> int:
+        """
+        Returns the number of players
+        """
+        return self._players
+
+    @property
+    def weights(self) -> Dict[str, array]:
+        """
+        Returns the weight table of every kind of pattern
+        """
+        return self._weights
+
+    @property
+    def indices(self) -> List[int]:
+        """
+        Returns the current index of every pattern instance
+        """
+        return list(self._indices)
+
+    def update(self, pos: Tuple[int, int], old: Optional[int],
+               new: int) -> None:
+        """
+        Updates the pattern indices after a square changes. Its signature
+        matches the listeners of Reversi, so it can be registered with
+        Reversi.add_listener.
+
+        Inputs:
+            pos (Tuple[int, int]): the square that changed
+            old (Optional[int]): the player that was there (None if empty)
+            new (int): the player that is there now (0 to empty the
+                square again, as when taking back a move)
+
+        Returns: None
+        """
+        old_digit = 0 if old is None else old
+        delta = new - old_digit
+        indices = self._indices
+        for instance, place in self._squares.get(pos, ()):
+            indices[instance] += delta * place
+        self._counts[old_digit] -= 1
+        self._counts[new] += 1
+
+    def evaluate(self, player: int) -> float:
+        """
+        Rates the current position from the point of view of a player: the
+        sum of the pattern weights plus the player's disc margin over the
+        average other player.
+
+        Inputs:
+            player (int): the player whose point of view is taken
+
+        Returns (float): the rating (higher is better for player)
+        """
+        weights = self._weights
+        kinds = self._kinds
+        sizes = self._sizes
+        offset = player - 1
+        score = 0.
+        for instance, index in enumerate(self._indices):
+            score += weights[kinds[instance]][offset * sizes[instance] + index]
+
+        others = sum(self._counts[1:]) - self._counts[player]
+        return score + self._counts[player] - others / (self._players - 1)
+
+    def copy(self) -> "PatternEvaluator":
+        """
+        Returns a copy of the evaluator that shares its weight tables
+        """
+        evaluator = object.__new__(PatternEvaluator)
+        evaluator._side = self._side
+        evaluator._players = self._players
+        evaluator._kinds = self._kinds
+        evaluator._sizes = self._sizes
+        evaluator._squares = self._squares
+        evaluator._weights = self._weights
+        evaluator._indices = list(self._indices)
+        evaluator._counts = list(self._counts)
+        return evaluator
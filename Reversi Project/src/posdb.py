@@ -0,0 +1,445 @@
+"""
+Memory-mapped database of evaluated reversi positions.
+
+A database is a single file of fixed-size records sorted by position key
+(a 64-bit hash of the board, the player to move and the kind of game), after
+a small header:
+
+    header  8-byte magic, then the number of records (uint64)
+    record  key (uint64), score (float32), best move (uint16 square number
+            row * side + col, NO_MOVE if none), depth (uint16)
+
+all little-endian. Lookups binary-search the file through mmap, so only the
+few pages they touch are read and a database can be much bigger than
+memory. Any number of processes can read the same file at once; the
+operating system shares its pages between them.
+
+Entries are added in bulk with merge, which streams the sorted file and the
+sorted new entries into a new file and then atomically replaces the old
+one. Readers that still have the old file open keep seeing it until they
+call PositionDB.refresh.
+
+With canonical=True, positions are keyed by their symmetry-canonical key
+(see symmetry.py), so that symmetric positions share one record, and best
+moves are stored on the canonical board and translated back on lookup. A
+database should be built and read with the same setting.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import (BinaryIO, Iterable, Iterator, List, NamedTuple, Optional,
+                    Tuple)
+import click
+import numpy as np
+from reversi import Reversi
+from records import GameRecord, read_records
+from symmetry import (KEY_HEADER, canonical_key, transform_move,
+                      untransform_move)
+
+try:
+    import fcntl
+    HAVE_FCNTL = True
+except ImportError: # not on Windows; merges are then not locked
+    HAVE_FCNTL = False
+
+MAGIC = b"RVPOSDB1"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QfHH")
+RECORD_DTYPE = np.dtype([("key", "<u8"), ("score", "<f4"), ("move", "<u2"),
+                         ("depth", "<u2")])
+NO_MOVE = 0xFFFF
+
+
+class PositionEntry(NamedTuple):
+    """
+    One record of the database.
+
+    Attributes:
+        key (int): the position key (see position_key)
+        score (float): the evaluation of the position, from the point of view
+            of the player to move
+        move (Optional[int]): the best move as a square number (row * side
+            + col), or None
+        depth (int): how deep the evaluation searched
+    """
+    key: int
+    score: float
+    move: Optional[int]
+    depth: int
+
+
+def _hash(data: bytes) -> int:
+    """
+    Returns the 64-bit hash of a serialised position
+    """
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(),
+                          "little")
+
+
+def position_key(game: Reversi, canonical: bool = False) -> int:
+    """
+    Returns the 64-bit key of a position: a hash of a KEY_HEADER (the kind
+    of game and the player to move) and the squares of the board. The number
+    of moves is left out, as in canonical keys, so a position has the same
+    key whether it was played or loaded with load_game.
+
+    Inputs:
+        game (Reversi): gameboard
+        canonical (bool): hash the symmetry-canonical key of the position
+            instead, so that symmetric positions have the same key
+    """
+    if canonical:
+        return _hash(canonical_key(game)[0])
+    header = KEY_HEADER.pack(game.size, game.num_players, int(game.othello),
+                             game.turn)
+    return _hash(header + game.cells)
+
+
+def make_entry(game: Reversi, score: float,
+               move: Optional[Tuple[int, int]] = None,
+               depth: int = 0, canonical: bool = False) -> PositionEntry:
+    """
+    Creates the entry of a position.
+
+    Inputs:
+        game (Reversi): the position
+        score (float): its evaluation, for the player to move
+        move (Optional[Tuple[int, int]]): its best move
+        depth (int): how deep the evaluation searched
+        canonical (bool): key the entry by the symmetry-canonical key of the
+            position (the move is then stored on the canonical board)
+
+    Returns (PositionEntry): the entry
+    """
+    if canonical:
+        raw_key, transform = canonical_key(game)
+        key = _hash(raw_key)
+        if move is not None:
+            move = transform_move(move, game.size, transform)
+    else:
+        key = position_key(game)
+    square = None if move is None else move[0] * game.size + move[1]
+    return PositionEntry(key, score, square, depth)
+
+
+def _to_array(entries: Iterable[PositionEntry]) -> np.ndarray:
+    """
+    Converts entries to a structured array sorted by key. When a key appears
+    more than once, only its last entry is kept.
+    """
+    array = np.array([(entry.key, entry.score,
+                       NO_MOVE if entry.move is None else entry.move,
+                       entry.depth) for entry in entries],
+                     dtype=RECORD_DTYPE)
+    array = array[np.argsort(array["key"], kind="stable")]
+    return _last_of_each_key(array)
+
+
+def _last_of_each_key(array: np.ndarray) -> np.ndarray:
+    """
+    Drops all but the last record of every key from an array sorted by key
+    """
+    if len(array) == 0:
+        return array
+    keys = array["key"]
+    return array[np.append(keys[1:] != keys[:-1], True)]
+
+
+def merge(path: str, entries: Iterable[PositionEntry],
+          chunk_size: int = 1 << 20) -> int:
+    """
+    Adds entries to a database (creating it if needed), replacing the
+    entries of keys that are already in it.
+
+    The existing records are read chunk_size at a time and merged with the
+    sorted new entries into a new file, which then replaces the old one, so
+    readers never see a half-written database.
+
+    Inputs:
+        path (str): the database file
+        entries (Iterable[PositionEntry]): the entries to add
+        chunk_size (int): the number of existing records merged at a time
+
+    Returns (int): the number of records in the database afterwards
+
+    Raises:
+        ValueError: if path exists but is not a position database
+    """
+    new = _to_array(entries)
+    lock = open(path + ".lock", "wb")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if HAVE_FCNTL:
+            fcntl.flock(lock, fcntl.LOCK_EX) # one merge at a time
+        old = np.zeros(0, dtype=RECORD_DTYPE)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as file:
+                header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"{path} is not a position database")
+            magic, count = HEADER.unpack(header)
+            if (magic != MAGIC or os.path.getsize(path) !=
+                    HEADER.size + count * RECORD.size):
+                raise ValueError(f"{path} is not a position database")
+            if count:
+                old = np.memmap(path, dtype=RECORD_DTYPE, mode="r",
+                                offset=HEADER.size, shape=(count,))
+
+        total = 0
+        with open(temp_path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, 0))
+            used = 0 # new entries written so far
+            for start in range(0, len(old), chunk_size):
+                chunk = np.array(old[start:start + chunk_size])
+                # The new entries that sort before the end of this chunk go
+                # after it, so that they win ties in the stable sort
+                end = int(np.searchsorted(new["key"], chunk["key"][-1],
+                                          side="right"))
+                merged = np.concatenate([chunk, new[used:end]])
+                merged = merged[np.argsort(merged["key"], kind="stable")]
+                merged = _last_of_each_key(merged)
+                merged.tofile(out)
+                total += len(merged)
+                used = end
+            new[used:].tofile(out)
+            total += len(new) - used
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, total))
+        del old
+        os.replace(temp_path, path)
+    finally:
+        # Left behind only if the merge failed
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        lock.close()
+    return total
+
+
+class PositionDB:
+    """
+    Class for reading a position database, through a read-only memory map.
+
+    Attributes:
+        path (str): the database file
+
+    Methods:
+        get: the entry of a key
+        lookup: the entry of a position
+        entries: all entries, in key order
+        refresh: pick up the database if it was replaced by a merge
+        close: close the file
+    """
+    _path: str
+    _file: Optional[BinaryIO]
+    _map: Optional[mmap.mmap]
+    _count: int
+    _inode: int
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+        self._map = None
+        self._open()
+
+    def _open(self) -> None:
+        """
+        Opens and maps the database file, checking its header
+        """
+        self._file = open(self._path, "rb")
+        try:
+            stat = os.fstat(self._file.fileno())
+            self._inode = stat.st_ino
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            if len(self._map) < HEADER.size:
+                raise ValueError(f"{self._path} is not a position database")
+            magic, self._count = HEADER.unpack_from(self._map)
+            if (magic != MAGIC or
+                len(self._map) != HEADER.size + self._count * RECORD.size):
+                raise ValueError(f"{self._path} is not a position database")
+        except BaseException:
+            self.close()
+            raise
+
+    def _data(self) -> mmap.mmap:
+        """
+        Returns the memory map of the database file, which must be open
+        """
+        if self._map is None:
+            raise ValueError(f"{self._path} is closed")
+        return self._map
+
+    @property
+    def path(self) -> str:
+        """
+        Returns the path of the database file
+        """
+        return self._path
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, key: int) -> Optional[PositionEntry]:
+        """
+        Finds the entry of a key by binary search.
+
+        Inputs:
+            key (int): the position key
+
+        Returns (Optional[PositionEntry]): the entry, or None if the key is
+            not in the database
+        """
+        data = self._data()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            found, score, move, depth = RECORD.unpack_from(
+                data, HEADER.size + middle * RECORD.size)
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return PositionEntry(found, score,
+                                     None if move == NO_MOVE else move, depth)
+        return None
+
+    def lookup(self, game: Reversi,
+               canonical: bool = False) -> Optional[PositionEntry]:
+        """
+        Finds the entry of a position.
+
+        Inputs:
+            game (Reversi): the position
+            canonical (bool): look the position up by its symmetry-canonical
+                key (for databases built with canonical entries); the move of
+                the entry is translated back to the board of the game
+
+        Returns (Optional[PositionEntry]): the entry, or None if the position
+            is not in the database
+        """
+        if not canonical:
+            return self.get(position_key(game))
+
+        raw_key, transform = canonical_key(game)
+        entry = self.get(_hash(raw_key))
+        if entry is None or entry.move is None:
+            return entry
+        row, col = untransform_move(divmod(entry.move, game.size), game.size,
+                                    transform)
+        return entry._replace(move=row * game.size + col)
+
+    def __contains__(self, key: int) -> bool:
+        return self.get(key) is not None
+
+    def entries(self) -> Iterator[PositionEntry]:
+        """
+        Iterates over all entries, in key order
+        """
+        for key, score, move, depth in RECORD.iter_unpack(
+                self._data()[HEADER.size:]):
+            yield PositionEntry(key, score, None if move == NO_MOVE else move,
+                                depth)
+
+    def refresh(self) -> bool:
+        """
+        Reopens the database if a merge has replaced the file since it was
+        opened.
+
+        Returns (bool): whether it was reopened
+        """
+        if os.stat(self._path).st_ino == self._inode:
+            return False
+        self.close()
+        self._open()
+        return True
+
+    def close(self) -> None:
+        """
+        Closes the database.
+
+        Returns: None
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "PositionDB":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def record_entries(record: dict,
+                   canonical: bool = False) -> List[PositionEntry]:
+    """
+    Creates an entry for every position of a recorded game, scored with the
+    final disc margin of the player to move over the best other player, and
+    with the move that was played as its move.
+
+    Inputs:
+        record (dict): a record written by the tournament runner
+        canonical (bool): key the entries by symmetry-canonical keys
+
+    Returns (List[PositionEntry]): the entries
+    """
+    game_record = GameRecord.from_record(record)
+    final = game_record.seek(len(game_record))
+    pieces = [final.num_pieces(player)
+              for player in range(1, game_record.players + 1)]
+
+    entries = []
+    game = game_record.seek(0)
+    for move in game_record.moves:
+        others = max(count for player, count in enumerate(pieces, start=1)
+                     if player != game.turn)
+        entries.append(make_entry(game, pieces[game.turn - 1] - others,
+                                  move, canonical=canonical))
+        game.apply_move(move)
+    return entries
+
+
+@click.command()
+@click.argument("database")
+@click.argument("record_files", nargs=-1)
+@click.option("--chunk-size", default=1 << 20,
+              help="Database records merged at a time")
+@click.option("--batch-size", default=1 << 20,
+              type=click.IntRange(min=1),
+              help="New positions collected before they are merged")
+@click.option("--canonical/--exact", default=False,
+              help="Store symmetric positions as one record")
+def main(database, record_files, chunk_size, batch_size, canonical) -> None:
+    """
+    Adds the positions of recorded games to a position database
+    """
+    start = time.perf_counter()
+    # Merged a batch at a time, so memory does not grow with the number of
+    # games; later batches replace the entries of earlier ones, as one merge
+    # would
+    entries: List[PositionEntry] = []
+    num_entries = 0
+    total = 0
+    for record_file in record_files:
+        for record in read_records(record_file):
+            entries.extend(record_entries(record, canonical))
+            if len(entries) >= batch_size:
+                total = merge(database, entries, chunk_size)
+                num_entries += len(entries)
+                entries = []
+    if entries or not num_entries:
+        total = merge(database, entries, chunk_size)
+        num_entries += len(entries)
+    print(f"Merged {num_entries} positions, {total} in {database} "
+          f"({time.perf_counter() - start:.2f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
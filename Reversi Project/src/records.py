@@ -0,0 +1,348 @@
+"""
+Game records for reversi tournaments.
+
+Each finished game is stored as one JSON object per line (JSONL) in a
+gzip-compressed file. Files are only ever appended to, so several runs can
+log into the same file, and records are read back lazily one at a time. A
+file that is still being written can be followed with tail_records.
+
+A single game can also be held as a GameRecord: its moves in a compact
+binary form, with keyframes for jumping to any point of the game.
+"""
+import gzip
+import json
+import struct
+import sys
+import time
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from reversi import Reversi
+
+RecordType = Dict[str, Any]
+"""
+Type for a single game record. A record produced by the tournament runner
+has the keys "side", "players", "othello", "bots", "seed", "moves",
+"think_times", "score" and "outcome".
+"""
+
+
+class RecordWriter:
+    """
+    Class to append game records to a compressed JSONL file.
+
+    Records are kept in memory and only compressed and written once
+    buffer_size of them have been collected (or when the writer is flushed
+    or closed), so logging costs next to nothing per game.
+
+    Attributes:
+        path (str): the file the records are written to
+        buffer_size (int): the number of records held before writing
+
+    Methods:
+        write: add a record to the file
+        flush: write out all buffered records
+        close: flush and close the file
+    """
+    _path: str
+    _buffer_size: int
+    _buffer: List[str]
+
+    def __init__(self, path: str, buffer_size: int = 64):
+        self._path = path
+        self._buffer_size = buffer_size
+        self._buffer = []
+        self._file = gzip.open(path, "ab")
+
+    @property
+    def path(self) -> str:
+        """
+        Returns the path of the file being written
+        """
+        return self._path
+
+    def write(self, record: RecordType) -> None:
+        """
+        Adds a record to the file.
+
+        Inputs:
+            record (RecordType): the game record, which must be JSON
+                serialisable
+
+        Returns: None
+        """
+        self._buffer.append(json.dumps(record, separators=(",", ":")))
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Compresses and writes all buffered records. The compressed stream is
+        flushed too, so everything written so far can already be read back
+        while the file is still open.
+
+        Returns: None
+        """
+        if self._buffer:
+            data = "\n".join(self._buffer) + "\n"
+            self._file.write(data.encode("utf-8"))
+            self._buffer = []
+        self._file.flush()
+
+    def close(self) -> None:
+        """
+        Flushes any remaining records and closes the file.
+
+        Returns: None
+        """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_records(path: str) -> Iterator[RecordType]:
+    """
+    Lazily iterates over the records in a file written by RecordWriter.
+    The file may still be open for writing, or may not have been closed
+    (after a crash): reading then stops after the last flushed record.
+
+    Inputs:
+        path (str): the file to read
+
+    Returns: an iterator yielding one record (RecordType) at a time
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        except EOFError: # the compressed stream was not finished
+            return
+
+
+def tail_records(path: str, follow: bool = True,
+                 poll_interval: float = 0.5) -> Iterator[RecordType]:
+    """
+    Iterates over the records in a file written by RecordWriter, decompressing
+    it as a stream. With follow, it then keeps waiting for more records to be
+    flushed to the file (like tail -f), reading only the new data each time.
+
+    Inputs:
+        path (str): the file to read
+        follow (bool): whether to wait for more records at the end of the
+            file (the iterator then never ends)
+        poll_interval (float): seconds to wait before looking for new data
+
+    Returns: an iterator yielding one record (RecordType) at a time
+    """
+    # Every run of RecordWriter appends a new gzip member to the file
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    pending = b""
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(1 << 16)
+            if not data:
+                if not follow:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            while data:
+                pending += decompressor.decompress(data)
+                data = b""
+                if decompressor.eof:
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class GameRecord:
+    """
+    Class for a game stored as its list of moves, for archiving and for
+    jumping around in.
+
+    Moves are kept as square numbers (row * side + col) in an array of 16-bit
+    integers. Every keyframe_interval moves, the position is also kept as
+    Reversi.to_bytes, so seek only has to replay the few moves since the
+    last keyframe instead of the whole game.
+
+    Attributes:
+        side (int): the size of the board
+        players (int): the number of players
+        othello (bool): whether the game started from the Othello position
+        moves (List[Tuple[int, int]]): the moves played
+        keyframe_interval (int): the number of moves between keyframes
+
+    Methods:
+        append: play a move at the end of the game
+        seek: the game after some number of moves
+        to_bytes: the game in binary form (moves only)
+        from_bytes: read a game written by to_bytes
+        from_record: the game of a record written by the tournament runner
+    """
+    HEADER = struct.Struct("<HBBI")
+    """
+    Header of a game in binary form: the side, the number of players, flags
+    (1 for Othello) and the number of moves. The moves follow as
+    little-endian 16-bit square numbers.
+    """
+
+    _side: int
+    _players: int
+    _othello: bool
+    _keyframe_interval: int
+    _moves: array
+    _keyframes: List[bytes]
+    _game: Reversi
+
+    def __init__(self, side: int, players: int, othello: bool,
+                 moves: Iterable[Tuple[int, int]] = (),
+                 keyframe_interval: int = 8):
+        if side * side > 1 << 16:
+            raise ValueError("The board is too big to record")
+        if keyframe_interval < 1:
+            raise ValueError("The keyframe interval must be at least 1")
+        self._side = side
+        self._players = players
+        self._othello = othello
+        self._keyframe_interval = keyframe_interval
+        self._moves = array("H")
+        self._game = Reversi(side, players, othello)
+        self._keyframes = [self._game.to_bytes()]
+        for move in moves:
+            self.append(move)
+
+    @property
+    def side(self) -> int:
+        """
+        Returns the size of the board
+        """
+        return self._side
+
+    @property
+    def players(self) -> int:
+        """
+        Returns the number of players
+        """
+        return self._players
+
+    @property
+    def othello(self) -> bool:
+        """
+        Returns whether the game started from the Othello position
+        """
+        return self._othello
+
+    @property
+    def keyframe_interval(self) -> int:
+        """
+        Returns the number of moves between keyframes
+        """
+        return self._keyframe_interval
+
+    @property
+    def moves(self) -> List[Tuple[int, int]]:
+        """
+        Returns the moves played, in order
+        """
+        return [divmod(square, self._side) for square in self._moves]
+
+    def __len__(self) -> int:
+        return len(self._moves)
+
+    def append(self, move: Tuple[int, int]) -> None:
+        """
+        Plays a move at the end of the game.
+
+        Inputs:
+            move (Tuple[int, int]): the move, which must be legal
+
+        Returns: None
+        """
+        self._game.apply_move(move)
+        self._moves.append(move[0] * self._side + move[1])
+        if len(self._moves) % self._keyframe_interval == 0:
+            self._keyframes.append(self._game.to_bytes())
+
+    def seek(self, ply: int) -> Reversi:
+        """
+        Returns the game after a number of moves, starting from the nearest
+        keyframe. The game's moves history only holds the moves since that
+        keyframe.
+
+        Inputs:
+            ply (int): the number of moves, from 0 to len(self)
+
+        Returns (Reversi): a new game in that position
+        """
+        if ply < 0 or ply > len(self._moves):
+            raise ValueError(f"Ply {ply} is not between 0 and "
+                             f"{len(self._moves)}")
+        keyframe = ply // self._keyframe_interval
+        game = Reversi.from_bytes(self._keyframes[keyframe])
+        for square in self._moves[keyframe * self._keyframe_interval:ply]:
+            game.apply_move(divmod(square, self._side))
+        return game
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the game in binary form: a HEADER followed by the moves
+        (keyframes are rebuilt when the game is read back)
+        """
+        moves = array("H", self._moves)
+        if sys.byteorder == "big":
+            moves.byteswap()
+        return self.HEADER.pack(self._side, self._players,
+                                int(self._othello),
+                                len(moves)) + moves.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes,
+                   keyframe_interval: int = 8) -> "GameRecord":
+        """
+        Reads a game written by to_bytes, replaying it to build keyframes.
+
+        Inputs:
+            data (bytes): the game in binary form
+            keyframe_interval (int): the number of moves between keyframes
+
+        Returns (GameRecord): the game
+        """
+        if len(data) < cls.HEADER.size:
+            raise ValueError("The data is too short to hold a game")
+        side, players, flags, num_moves = cls.HEADER.unpack_from(data)
+        moves = array("H")
+        moves.frombytes(data[cls.HEADER.size:])
+        if len(moves) != num_moves:
+            raise ValueError("The data does not match the number of moves")
+        if sys.byteorder == "big":
+            moves.byteswap()
+        return cls(side, players, bool(flags & 1),
+                   (divmod(square, side) for square in moves),
+                   keyframe_interval)
+
+    @classmethod
+    def from_record(cls, record: RecordType,
+                    keyframe_interval: int = 8) -> "GameRecord":
+        """
+        Creates a game from a record written by the tournament runner.
+
+        Inputs:
+            record (RecordType): the record
+            keyframe_interval (int): the number of moves between keyframes
+
+        Returns (GameRecord): the game
+        """
+        return cls(record["side"], record["players"], record["othello"],
+                   (tuple(move) for move in record["moves"]),
+                   keyframe_interval)
@@ -0,0 +1,240 @@
+"""
+Headless batch renderer for recorded games.
+
+Replays games from a record file (see records.py) and draws selected plies
+with the same drawing code as the GUI, without opening a window (SDL's dummy
+video driver is used). Frames are either saved as PNG files or written one
+after the other as raw RGB bytes, for piping into a video encoder. Frames are
+rendered in parallel worker processes.
+"""
+import contextlib
+import os
+import sys
+from multiprocessing import Pool
+from typing import Iterator, List, Optional, Tuple
+import click
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1") # workers must stop
+
+import pygame
+from reversi import Reversi
+from records import RecordType, read_records
+from gui_helpers import (AssetCache, Viewport, create_background, draw_all,
+                         take_snapshot)
+
+WINDOW_SIZE = (800, 700)
+"""
+Size of the GUI window, which frames are drawn at before scaling
+"""
+
+BACKGROUND_GREEN = (59, 133, 76)
+
+FRAMES_PER_TASK = 16
+"""
+Most frames a worker renders per task, which bounds how many raw frames are
+held in memory before they are written out
+"""
+
+_assets: Optional[AssetCache] = None
+_background: Optional[pygame.Surface] = None
+_view: Optional[Viewport] = None
+
+
+def init_worker() -> None:
+    """
+    Initialises pygame for headless drawing in a (worker) process
+    """
+    pygame.display.init()
+    pygame.font.init()
+
+
+def select_plies(plies: str, num_moves: int) -> List[int]:
+    """
+    Works out which plies of a game to render.
+
+    Inputs:
+        plies (str): "all", "last", "every:N" or a comma-separated list of
+            ply numbers (negative numbers count from the end)
+        num_moves (int): the number of moves in the game
+
+    Returns (List[int]): the ply numbers, where ply k is the position after
+        k moves
+
+    Raises:
+        click.BadParameter: If plies is not in one of these forms
+    """
+    if plies == "all":
+        return list(range(num_moves + 1))
+    if plies == "last":
+        return [num_moves]
+    if plies.startswith("every:"):
+        try:
+            step = int(plies[len("every:"):])
+        except ValueError:
+            step = 0
+        if step < 1:
+            raise click.BadParameter("every:N needs a whole number N of at "
+                                     "least 1", param_hint="'-p' / '--plies'")
+        return sorted(set(range(0, num_moves + 1, step)) | {num_moves})
+    selected = set()
+    for ply in plies.split(","):
+        try:
+            ply_num = int(ply)
+        except ValueError:
+            raise click.BadParameter(
+                f"{ply!r} is not all, last, every:N or a ply number",
+                param_hint="'-p' / '--plies'") from None
+        if ply_num < 0:
+            ply_num += num_moves + 1
+        if 0 <= ply_num <= num_moves:
+            selected.add(ply_num)
+    return sorted(selected)
+
+
+def render_frame(game: Reversi, width: Optional[int]) -> pygame.Surface:
+    """
+    Draws the current position of a game as the GUI would show it.
+
+    Inputs:
+        game (Reversi): the game
+        width (Optional[int]): width to scale the frame to (None to keep the
+            size of the GUI window)
+
+    Returns (pygame.Surface): the frame
+    """
+    global _assets, _background, _view
+    if _view is None or game.size != _view.board_size:
+        _view = Viewport(game.size)
+        _assets = AssetCache(_view.square_size)
+        _background = create_background(WINDOW_SIZE, _view, BACKGROUND_GREEN)
+
+    frame = pygame.Surface(WINDOW_SIZE)
+    snapshot = take_snapshot(game, game.done, _view)
+    draw_all(frame, _background, snapshot, _assets, _view)
+    if width is not None and width != WINDOW_SIZE[0]:
+        height = round(width * WINDOW_SIZE[1] / WINDOW_SIZE[0])
+        frame = pygame.transform.smoothscale(frame, (width, height))
+    return frame
+
+
+def render_plies(task: Tuple[int, bytes, int, List[Tuple[int, int]],
+                             List[int], Optional[str],
+                             Optional[int]]) -> List[Optional[bytes]]:
+    """
+    Renders consecutive selected plies of a recorded game, stepping the game
+    forward once through them.
+
+    Inputs:
+        task: the number of the game, its position at the first ply to render
+            (as Reversi.to_bytes), that ply, the moves played from there to
+            the last ply to render, the plies to render, the directory to
+            save PNG files in (None to return raw frames instead) and the
+            width of the frames
+
+    Returns (List[Optional[bytes]]): for each ply, the raw RGB frame, or None
+        if it was saved as a PNG file
+    """
+    game_num, position, first_ply, moves, plies, directory, width = task
+    game = Reversi.from_bytes(position)
+    ply = first_ply
+    frames: List[Optional[bytes]] = []
+    for wanted in plies:
+        for move in moves[ply - first_ply:wanted - first_ply]:
+            game.apply_move(move)
+        ply = wanted
+
+        frame = render_frame(game, width)
+        if directory is None:
+            frames.append(pygame.image.tobytes(frame, "RGB"))
+        else:
+            pygame.image.save(frame, os.path.join(
+                directory, f"game-{game_num:05d}-ply-{ply:03d}.png"))
+            frames.append(None)
+    return frames
+
+
+def game_tasks(game_num: int, record: RecordType, plies: List[int],
+               directory: Optional[str],
+               width: Optional[int]) -> Iterator[tuple]:
+    """
+    Splits the selected plies of a recorded game into render_plies tasks of
+    at most FRAMES_PER_TASK frames. The game is replayed once, and each task
+    starts from the position at its first ply, so no task replays the moves
+    of the ones before it.
+
+    Inputs:
+        game_num (int): the number of the game
+        record (RecordType): the game
+        plies (List[int]): the plies to render, in order
+        directory (Optional[str]): the directory to save PNG files in
+        width (Optional[int]): the width of the frames
+
+    Yields (tuple): the tasks, in order
+    """
+    moves = [(move[0], move[1]) for move in record["moves"]]
+    game = Reversi(record["side"], record["players"], record["othello"])
+    ply = 0
+    for start in range(0, len(plies), FRAMES_PER_TASK):
+        chunk = plies[start:start + FRAMES_PER_TASK]
+        for move in moves[ply:chunk[0]]:
+            game.apply_move(move)
+        ply = chunk[0]
+        yield (game_num, game.to_bytes(), ply, moves[ply:chunk[-1]], chunk,
+               directory, width)
+
+
+@click.command()
+@click.argument("record_file")
+@click.option("-o", "--output", default=None,
+              help="Directory to save PNG frames in")
+@click.option("--raw", default=None,
+              help="File to write raw RGB frames to ('-' for stdout)")
+@click.option("-p", "--plies", default="last",
+              help="Plies to render: all, last, every:N or a list like 0,10,-1")
+@click.option("--width", default=None, type=int,
+              help="Width of the frames in pixels (default 800)")
+@click.option("-m", "--max-games", default=None, type=int,
+              help="Only render the first games of the file")
+@click.option("-w", "--workers", default=None, type=int,
+              help="Worker processes (default: one per CPU)")
+def main(record_file, output, raw, plies, width, max_games, workers) -> None:
+    """
+    Renders recorded games to PNG files or a raw frame stream
+    """
+    if (output is None) == (raw is None):
+        raise click.UsageError("Give exactly one of --output and --raw")
+    select_plies(plies, 0) # checks the option before any work is done
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+
+    def tasks() -> Iterator[tuple]:
+        for game_num, record in enumerate(read_records(record_file)):
+            if max_games is not None and game_num >= max_games:
+                return
+            yield from game_tasks(game_num, record,
+                                  select_plies(plies, len(record["moves"])),
+                                  output, width)
+
+    num_frames = 0
+    with (open(raw, "wb") if raw not in (None, "-")
+          else contextlib.nullcontext(sys.stdout.buffer)) as stream, \
+            Pool(workers, initializer=init_worker) as pool:
+        for frames in pool.imap(render_plies, tasks()):
+            for frame in frames:
+                if frame is not None:
+                    stream.write(frame)
+                num_frames += 1
+
+    if raw is None:
+        print(f"Saved {num_frames} frames to {output}", file=sys.stderr)
+    else:
+        frame_width = width or WINDOW_SIZE[0]
+        frame_height = round(frame_width * WINDOW_SIZE[1] / WINDOW_SIZE[0])
+        print(f"Wrote {num_frames} frames of {frame_width}x{frame_height} "
+              f"RGB", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,12 @@ Reversi implementation.
 Contains a base class (ReversiBase). You must implement
 a Reversi class that inherits from this base class.
 """
+import functools
+import struct
+from itertools import islice
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Optional
+from typing import (Any, Dict, List, Tuple, Optional, Callable, Sequence,
+                    Union, cast)
 from board import Board
 
 BoardGridType = List[List[Optional[int]]]
@@ -22,6 +26,82 @@ ListMovesType = List[Tuple[int, int]]
 Type for representing lists of moves on the board.
 """
 
+ListenerType = Callable[[Tuple[int, int], Optional[int], int], None]
+"""
+Type for functions that are told about every square changed by a move. They
+are called with the position, the player that was there before (None if the
+square was empty) and the player that is there now.
+"""
+
+POSITION_HEADER = struct.Struct("<HBBBI")
+"""
+Header of a position serialised by Reversi.to_bytes: the side, the number of
+players, flags (1 for Othello), the player whose turn it is and the number of
+moves played. The squares follow, row by row, packed into 2 bits each for
+two players and 4 bits each for more.
+"""
+
+def _pack_tables(bits: int) -> Dict[int, Tuple[bytes, bytes]]:
+    """
+    Builds the bytes.translate tables that pack and unpack squares of a
+    number of bits: for the position of each square within a byte (its
+    shift), a table moving a square value into that position, and a table
+    taking it back out.
+    """
+    mask = (1 << bits) - 1
+    return {shift: (bytes(((value & mask) << shift) & 0xFF
+                          for value in range(256)),
+                    bytes((value >> shift) & mask for value in range(256)))
+            for shift in range(8 - bits, -1, -bits)}
+
+_PACK_TABLES = {2: _pack_tables(2), 4: _pack_tables(4)}
+
+RAY_LIST_MAX_SIDE = 64
+"""
+Largest board side whose rays are stored as lists. Lists are the fastest to
+walk, but the total length of the rays grows with the cube of the side, so
+bigger boards store each ray as a range (a straight line of squares is an
+arithmetic run of indices), which takes the same small amount of memory
+however long the ray is.
+"""
+
+RAY_CACHE_SIZE = 4
+"""
+Number of board sides whose rays are kept. Games almost always share one or
+two sides, and bounding the cache keeps a stray huge board from holding on to
+its rays for the rest of the process.
+"""
+
+@functools.lru_cache(maxsize=RAY_CACHE_SIZE)
+def _rays(side: int) -> List[List[Union[List[int], range]]]:
+    """
+    Returns the rays leaving each square of a board of the given side: for
+    each direction, the indices (into the row by row storage of the board)
+    of the squares along it, for the rays that are long enough to capture
+    along. They are shared by all games of the same side.
+    """
+    directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (-1, -1),
+                  (1, -1), (-1, 1)]
+    rays: List[List[Union[List[int], range]]] = []
+    for row in range(side):
+        for col in range(side):
+            square_rays: List[Union[List[int], range]] = []
+            for drow, dcol in directions:
+                # The number of squares before the edge of the board
+                length = min(side - 1 - row if drow > 0 else
+                             row if drow < 0 else side,
+                             side - 1 - col if dcol > 0 else
+                             col if dcol < 0 else side)
+                if length >= 2:
+                    step = drow * side + dcol
+                    start = row * side + col + step
+                    ray = range(start, start + length * step, step)
+                    square_rays.append(list(ray)
+                                       if side <= RAY_LIST_MAX_SIDE
+                                       else ray)
+            rays.append(square_rays)
+    return rays
+
 class ReversiBase(ABC):
     """
     Abstract base class for the game of Reversi
@@ -210,7 +290,8 @@ class ReversiBase(ABC):
             would make the next move ("whose turn is it?")
             Players are numbered from 1.
             grid: The state of the board as a list of lists
-            (same as returned by the grid property)
+            (same as returned by the grid property). Implementations may
+            also accept other forms of the board.
 
         Raises:
              ValueError:
@@ -289,6 +370,8 @@ class Reversi(ReversiBase):
 
         self._turn = 1
         self._num_moves = 0
+        self._moves: ListMovesType = []
+        self._listeners: List[ListenerType] = []
         self._side = side
 
     @property
@@ -301,46 +384,56 @@ class Reversi(ReversiBase):
     
     @property
     def grid(self) -> BoardGridType:
-        grid: BoardGridType = [[None] * self._side for _ in range(self._side)]
-        for row in range(self._board.num_rows):
-            for col in range(self._board.num_cols):
-                if self.piece_at((row, col)) is not None:
-                    grid[row][col] = \
-                        self.piece_at((row, col))
-        return grid
+        cells = self._board.cells
+        side = self._side
+        return [[player or None for player in cells[row * side:
+                                                    (row + 1) * side]]
+                for row in range(side)]
+
+    @property
+    def cells(self) -> bytes:
+        """
+        Returns the squares of the board, row by row (0 for an empty square
+        and the player number otherwise)
+        """
+        return bytes(self._board.cells)
+
+    @property
+    def othello(self) -> bool:
+        """
+        Returns whether the game started from the Othello position
+        """
+        return self._othello
 
     @property
     def turn(self) -> int:
         return self._turn
 
+    @property
+    def moves(self) -> ListMovesType:
+        """
+        Returns the moves applied since the game was created or loaded, in
+        the order they were played
+        """
+        return list(self._moves)
+
     @property
     def available_moves(self) -> ListMovesType:      
-        moves = set()
-        for row in range(self._board.num_rows):
-            for col in range(self._board.num_cols):
-                if self.piece_at((row, col)) is None and \
-                    self.legal_move((row, col)):
-                    moves.add((row, col))
-        return list(moves)
+        # Deduplicated through a set as before, so that the moves come out in
+        # the same order and the bots break ties the same way
+        return list(set(self._moves_of(self._turn)))
     
     @property
     def done(self) -> bool:
         """
         Returns: True if the game is over, False otherwise.
 
-        Saves the current player. Then checks all the available moves for each 
-        player and if a single player has a move then the game is not done. 
-        resets the turn to the current player. If no player has a move then the 
-        game is done
-        """
-        current_player = self._turn 
-        for player in range(1, self._players + 1): 
-            self._turn = player
-            if len(self.available_moves) > 0:
-                self._turn = current_player
-                return False 
-        self._turn = current_player 
-        return True 
+        Checks whether any player has a move; if a single player has a move
+        then the game is not done. If no player has a move then the game is
+        done
+        """
+        return not any(self._has_move(player)
+                       for player in range(1, self._players + 1))
         
     @property
     def outcome(self) -> List[int]:
@@ -373,51 +466,135 @@ class Reversi(ReversiBase):
             row < 0 or col < 0:
             raise ValueError("The specified position is outside the bounds of \
                              the board.")
-        piece = self._board.board[row][col]
-        return None if piece is None else int(piece.get_player())
+        return self._board.player_at(pos) or None
 
     def legal_move(self, pos: Tuple[int, int]) -> bool:
         row, col = pos
-        piece = self._turn
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), \
-                              (-1, -1), (1, -1),(-1, 1)]
         if row >= self._board.num_rows or col >= self._board.num_cols or \
             row < 0 or col < 0:
             raise ValueError("The specified position is outside the bounds of \
                              the board.")
-        if not self._othello and self._num_moves < (self.num_players **2):
-            #Players can only put within the middle number of \
-            #(players by player square)
-            # they can put anywhere
-            edge_len = (self._board.num_rows - self.num_players) // 2
-            if edge_len <= row < (self._board.num_rows-edge_len):
-                if edge_len <= col < (self._board.num_cols-edge_len):
-                    if self.piece_at((row,col)) is None:
-                        return True
-            return False
+        return self._is_legal(row * self._side + col, self._turn)
 
-        else:
-            if self.piece_at((row, col)) is None:          
-                for row_direc, col_direc in directions:
-                    new_row, new_col = row + row_direc, col + col_direc
-                    if new_row < self._board.num_rows and new_col < \
-                        self._board.num_cols and new_row >= 0 and new_col >= 0:
-                        if self.piece_at((new_row, new_col)) is not None and \
-                            self.piece_at((new_row, new_col)) != piece:
-                            done = False
-                            while not done:
-                                if new_row >= self._board.num_rows or \
-                                    new_col >= self._board.num_cols or \
-                                        new_row < 0 or new_col < 0:
-                                    done = True
-                                elif self.piece_at((new_row, new_col)) is None:
-                                    done = True
-                                elif self.piece_at((new_row, new_col)) == piece:
-                                    return True
-                                new_row, new_col = new_row + row_direc, new_col\
-                                 + col_direc
+    def _is_legal(self, index: int, player: int) -> bool:
+        """
+        Returns whether a player could place a piece on a square, given by
+        its index in the row by row storage of the board.
 
+        In the opening of non-Othello games, players can put their pieces
+        anywhere in the middle (players by players) square. Otherwise a move
+        must capture: along one of the rays leaving the square, a line of
+        other players' pieces must end in one of the player's own.
+        """
+        cells = self._board.cells
+        if cells[index]:
             return False
+        if not self._othello and self._num_moves < self._players ** 2:
+            edge_len = (self._side - self._players) // 2
+            row, col = divmod(index, self._side)
+            return (edge_len <= row < self._side - edge_len and
+                    edge_len <= col < self._side - edge_len)
+
+        for ray in _rays(self._side)[index]:
+            first = cells[ray[0]]
+            if first == 0 or first == player:
+                continue
+            for other in islice(ray, 1, None):
+                piece = cells[other]
+                if piece == player:
+                    return True
+                if piece == 0:
+                    break
+        return False
+
+    def _moves_of(self, player: int) -> ListMovesType:
+        """
+        Returns the moves a player could make, row by row
+        """
+        side = self._side
+        is_legal = self._is_legal
+        return [divmod(index, side)
+                for index, piece in enumerate(self._board.cells)
+                if piece == 0 and is_legal(index, player)]
+
+    def _has_move(self, player: int) -> bool:
+        """
+        Returns whether a player has any move, stopping at the first one
+        """
+        is_legal = self._is_legal
+        return any(piece == 0 and is_legal(index, player)
+                   for index, piece in enumerate(self._board.cells))
+
+    def captures(self, pos: Tuple[int, int]) -> int:
+        """
+        Counts the pieces a move of the current player would flip, without
+        applying it (0 for moves that flip nothing, such as the opening
+        moves of non-Othello games).
+
+        Args:
+            pos: the (row, col) of a legal move
+
+        Returns: the number of pieces the move would flip
+        """
+        if not self._othello and self._num_moves < self._players ** 2:
+            return 0
+        cells = self._board.cells
+        player = self._turn
+        total = 0
+        for ray in _rays(self._side)[pos[0] * self._side + pos[1]]:
+            count = 0
+            for other in ray:
+                piece = cells[other]
+                if piece == player:
+                    total += count
+                    break
+                if piece == 0:
+                    break
+                count += 1
+        return total
+
+    def flipped(self, pos: Tuple[int, int]) -> ListMovesType:
+        """
+        Lists the pieces a move of the current player would flip, without
+        applying it (none for moves that flip nothing, such as the opening
+        moves of non-Othello games).
+
+        Args:
+            pos: the (row, col) of a legal move
+
+        Returns: the (row, col) positions of the pieces the move would flip
+        """
+        if not self._othello and self._num_moves < self._players ** 2:
+            return []
+        cells = self._board.cells
+        player = self._turn
+        side = self._side
+        squares: ListMovesType = []
+        for ray in _rays(side)[pos[0] * side + pos[1]]:
+            count = 0
+            for other in ray:
+                piece = cells[other]
+                if piece == player:
+                    squares.extend(divmod(index, side)
+                                   for index in islice(ray, count))
+                    break
+                if piece == 0:
+                    break
+                count += 1
+        return squares
+
+    def add_listener(self, listener: ListenerType) -> None:
+        """
+        Registers a function to be called for every square that changes when
+        a move is applied (the placed piece and every flipped piece).
+
+        Listeners are not copied by simulate_moves, and are not called by
+        load_game.
+
+        Args:
+            listener: Function called as listener(pos, old_player, new_player)
+        """
+        self._listeners.append(listener)
 
     def flip(self, pos: Tuple[int, int], dir: Tuple[int, int]):
         """
@@ -441,22 +618,31 @@ class Reversi(ReversiBase):
             while not self._board.out_of_bounds(cursor) and \
             self.piece_at(cursor) is not None and \
             self.piece_at(cursor) != self.piece_at(pos):
-                pieces_to_flip.append(self._board.get_piece(cursor))
+                pieces_to_flip.append(cursor)
                 cursor = (cursor[0] + dx, cursor[1] + dy)
 
             # If cursor ends on own piece, flip all encountered pieces
             if not self._board.out_of_bounds(cursor) and\
             self.piece_at(cursor) == self.piece_at(pos):
-                for piece in pieces_to_flip:
-                    piece.set_player(self.turn)        
+                for flip_pos in pieces_to_flip:
+                    old_player = self._board.player_at(flip_pos)
+                    self._board.set_piece(flip_pos, self.turn)
+                    for listener in self._listeners:
+                        listener(flip_pos, old_player, self.turn)
 
     def apply_move(self, pos: Tuple[int, int]) -> None:
-        if pos not in self.available_moves:
+        # Only the square being played is checked: this accepts exactly the
+        # moves in available_moves without generating all of them
+        row, col = pos
+        if not (0 <= row < self._side and 0 <= col < self._side) or \
+            not self._is_legal(row * self._side + col, self._turn):
             raise ValueError("Illegal Move")
 
         # Insert piece of player
         player = self._turn
         self._board.add_piece(player, pos)
+        for listener in self._listeners:
+            listener(pos, None, player)
 
         # Adjust the values of all neighboring enemy pieces
         dirs = [(1,0), (1,1), (0, 1), (-1, 1),\
@@ -466,10 +652,11 @@ class Reversi(ReversiBase):
         
         # Adjust values of turn and num_moves
         self._num_moves += 1
+        self._moves.append(pos)
 
         old_turn = self._turn
         self._turn = self.turn % self._players + 1
-        while not self.available_moves:
+        while not self._has_move(self._turn):
             self._turn = self.turn % self._players + 1
             if self._turn == old_turn:
                 break
@@ -477,12 +664,64 @@ class Reversi(ReversiBase):
         # If applying the move ends the game, update game.done and 
         # outcome accordingly
 
-    def load_game(self, turn: int, grid: BoardGridType) -> None:
-        count = 0
+    def load_game(self, turn: int,
+                  grid: Union[BoardGridType, bytes, bytearray,
+                              memoryview]) -> None:
+        """
+        Loads the state of a game (see ReversiBase.load_game).
+
+        Besides a list of lists (or any other sequence of rows), grid can be
+        a flat buffer of side * side bytes (bytes, bytearray or memoryview:
+        0 for an empty square and the player number otherwise, row by row, as
+        in Board.cells) or a NumPy integer or boolean array of side * side
+        such values (of any shape, in row-major order). These are checked and
+        copied into the board in bulk, without visiting each square in
+        Python.
+        """
         if turn < 1 or turn > self._players:
             raise ValueError("The value of turn is inconsistent with the \
                              _players attribute.")
-        
+
+        if hasattr(grid, "dtype"):
+            array = cast(Any, grid) # a NumPy array
+            if array.dtype.kind not in "iub": # integers or booleans
+                raise ValueError("The values of the grid must be integers.")
+            if array.size != self._side * self._side:
+                raise ValueError("The size of the grid is inconsistent with \
+                                 the _side attribute.")
+            if array.size and (array.min() < 0 or
+                               array.max() > self._players):
+                raise ValueError("A value in the grid is inconsistent with\
+                                 the _players attribute.")
+            cells = array.astype("uint8").tobytes()
+        elif isinstance(grid, (bytes, bytearray, memoryview)):
+            cells = bytes(grid)
+            if len(cells) != self._side * self._side:
+                raise ValueError("The size of the grid is inconsistent with \
+                                 the _side attribute.")
+            if max(cells, default=0) > self._players:
+                raise ValueError("A value in the grid is inconsistent with\
+                                 the _players attribute.")
+        else:
+            cells = self._grid_cells(grid)
+
+        self._turn = turn
+        self._board.load_cells(cells)
+        self._num_moves = len(cells) - cells.count(0)
+        self._moves = []
+        old_turn = self._turn
+
+        while not self._has_move(self._turn):
+            self._turn = self.turn % self._players + 1
+            if self._turn == old_turn:
+                break
+
+    def _grid_cells(self,
+                    grid: Sequence[Sequence[Optional[int]]]) -> bytes:
+        """
+        Checks a grid given as a list of lists, and returns its squares row
+        by row (as in Board.cells)
+        """
         size = len(grid)
         if size != self._side:
             raise ValueError("The size of the grid is inconsistent with the \
@@ -496,30 +735,11 @@ class Reversi(ReversiBase):
                 if cell is not None and (cell < 1 or cell > self._players):
                     raise ValueError("A value in the grid is inconsistent with\
                                      the _players attribute.")
-        
-        self._turn = turn
-
-        self._board.clear_board() 
-        # Clear the board before loading the new game state
-
-        for row_idx in range(size):
-            for col_idx in range(size):
-                if grid[row_idx][col_idx] is not None:
-                    count += 1
-                    self._board.add_piece(grid[row_idx][col_idx], \
-                                          (row_idx, col_idx))
-        
-        self._num_moves = count
-        old_turn = self._turn
-
-        while not self.available_moves:
-            self._turn = self.turn % self._players + 1
-            if self._turn == old_turn:
-                break
+        return bytes(cell or 0 for row in grid for cell in row)
 
     def simulate_moves(self, moves: ListMovesType) -> "Reversi":
         simulation = Reversi(self._side, self._players, self._othello)
-        simulation.load_game(self.turn, self.grid) 
+        simulation.load_game(self.turn, self._board.cells) 
         # Load the current state into the simulation
 
         for move in moves:
@@ -535,3 +755,79 @@ class Reversi(ReversiBase):
         Return the number of pieces of a given player on the board
         """
         return self._board.num_player_pieces(player)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialises the position compactly: a POSITION_HEADER followed by the
+        squares, packed 2 bits each for two players and 4 bits each for more.
+        The squares are packed with bytes.translate, a few slices at a time,
+        rather than one by one. The moves history is not kept.
+
+        Returns: the serialised position (bytes)
+        """
+        if self._players > 15:
+            raise ValueError("Only games of up to 15 players can be packed")
+        bits = 2 if self._players == 2 else 4
+        per_byte = 8 // bits
+        cells = bytes(self._board.cells)
+        cells += bytes(-len(cells) % per_byte)
+
+        # Square k of every byte is moved into place by one translate, and
+        # the slices are combined by OR-ing them as big integers
+        packed = 0
+        for slot, (pack, _) in enumerate(_PACK_TABLES[bits].values()):
+            packed |= int.from_bytes(cells[slot::per_byte].translate(pack),
+                                     "big")
+        header = POSITION_HEADER.pack(self._side, self._players,
+                                      int(self._othello), self._turn,
+                                      self._num_moves)
+        return header + packed.to_bytes(len(cells) // per_byte, "big")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Reversi":
+        """
+        Creates a game from a position serialised by to_bytes.
+
+        Args:
+            data: the serialised position
+
+        Raises:
+            ValueError: If the data is not a valid position
+
+        Returns: the game, in that position
+        """
+        if len(data) < POSITION_HEADER.size:
+            raise ValueError("The data is too short to hold a position")
+        side, players, flags, turn, num_moves = \
+            POSITION_HEADER.unpack_from(data)
+        othello = bool(flags & 1)
+
+        # The header is checked before anything is built for it, since the
+        # size of a board is only limited by the 16 bits of its side
+        if players < 1 or players > 15:
+            raise ValueError("Only games of up to 15 players can be packed")
+        if side < 1 or players % 2 != side % 2:
+            raise ValueError("Parity of players and side must match")
+        if othello and players != 2:
+            raise ValueError("Othello is only for 2 players")
+        if turn < 1 or turn > players:
+            raise ValueError("The value of turn is inconsistent with the \
+                             _players attribute.")
+        bits = 2 if players == 2 else 4
+        per_byte = 8 // bits
+        body = bytes(data[POSITION_HEADER.size:])
+        if len(body) != -(-side * side // per_byte):
+            raise ValueError("The data does not match the size of the board")
+
+        cells = bytearray(len(body) * per_byte)
+        for slot, (_, unpack) in enumerate(_PACK_TABLES[bits].values()):
+            cells[slot::per_byte] = body.translate(unpack)
+        del cells[side * side:]
+        if max(cells, default=0) > players:
+            raise ValueError("A square holds a piece of an unknown player")
+
+        game = cls(side, players, othello)
+        game._board.load_cells(cells)
+        game._turn = turn
+        game._num_moves = num_moves
+        return game
@@ -0,0 +1,286 @@
+"""
+Self-play position generation for tuning evaluation functions.
+
+Games are played by bots in worker processes. Positions are sampled from
+each game, optionally labelled, and streamed into shards of NumPy files:
+
+    boards-00000.npy  int8 array (n, side, side), 0 for empty squares and
+                      the player number otherwise
+    turns-00000.npy   int8 array (n,), the player to move
+    labels-00000.npy  float32 array (n,), the label of each position (NaN if
+                      positions are not labelled)
+
+Every shard can be opened with numpy.load(..., mmap_mode="r"), so a trainer
+can work through the whole data set without loading it into memory.
+"""
+import os
+import random
+from multiprocessing import Pool
+from typing import Iterator, List, Optional, Tuple
+import click
+import numpy as np
+from reversi import Reversi
+from bot import BOTS
+
+LABELS = ("none", "result", "search")
+"""
+Ways of labelling a sampled position:
+
+- none: positions are not labelled
+- result: the final disc margin of the self-play game, from the point of view
+  of the player to move
+- search: the best disc margin the player to move can reach with one move
+"""
+
+PositionsType = Tuple[np.ndarray, np.ndarray, np.ndarray]
+"""
+Type for a batch of positions: boards, turns and labels (see above)
+"""
+
+
+def disc_margin(game: Reversi, player: int) -> int:
+    """
+    Returns the number of pieces player has minus the number of pieces of the
+    strongest other player.
+
+    Input:
+        game (Reversi): gameboard
+        player (int): the player whose point of view is taken
+    """
+    others = [game.num_pieces(other) for other in range(1, game.num_players + 1)
+              if other != player]
+    return game.num_pieces(player) - max(others)
+
+
+def search_label(game: Reversi) -> int:
+    """
+    Labels a position with the best disc margin the player to move can reach
+    by playing one move.
+
+    Input:
+        game (Reversi): gameboard
+    """
+    player = game.turn
+    return max(disc_margin(game.simulate_moves([move]), player)
+               for move in game.available_moves)
+
+
+def play_game(side: int, players: int, othello: bool, bot_name: str,
+              seed: int, sample_rate: float, label: str) -> PositionsType:
+    """
+    Plays one self-play game and samples positions from it.
+
+    Inputs:
+        side (int): the size of the board
+        players (int): the number of players
+        othello (bool): whether to start from the Othello configuration
+        bot_name (str): the bot (from bot.BOTS) playing every seat
+        seed (int): random seed of the game
+        sample_rate (float): probability of sampling each position
+        label (str): how to label positions (one of LABELS)
+
+    Returns (PositionsType): the sampled positions
+    """
+    random.seed(seed)
+    sampler = random.Random(seed ^ 0x5EED)
+    bot = BOTS[bot_name]
+
+    game = Reversi(side, players, othello)
+    cells: List[bytes] = []
+    turns: List[int] = []
+    labels: List[float] = []
+    while not game.done:
+        if sampler.random() < sample_rate:
+            cells.append(game.cells)
+            turns.append(game.turn)
+            labels.append(float(search_label(game)) if label == "search"
+                          else np.nan)
+        bot(game)
+
+    if label == "result":
+        labels = [float(disc_margin(game, turn)) for turn in turns]
+
+    # The squares are already bytes (0 for empty), so no Python loop is
+    # needed to build the boards
+    boards = np.frombuffer(b"".join(cells), dtype=np.uint8)
+    return (boards.reshape(len(cells), side, side).astype(np.int8),
+            np.array(turns, dtype=np.int8),
+            np.array(labels, dtype=np.float32))
+
+
+def _play_game_task(task: tuple) -> PositionsType:
+    """
+    Unpacks the arguments of play_game for a worker process
+    """
+    return play_game(*task)
+
+
+class ShardWriter:
+    """
+    Class to stream batches of positions into fixed-size shards.
+
+    Attributes:
+        directory (str): the directory the shards are written to
+        shard_size (int): the number of positions in each full shard
+        num_positions (int): the number of positions written so far
+        num_shards (int): the number of shards written so far
+
+    Methods:
+        add: add a batch of positions
+        close: write out the last (possibly smaller) shard
+    """
+    _directory: str
+    _shard_size: int
+    _pending: List[PositionsType]
+    _num_pending: int
+    _num_positions: int
+    _num_shards: int
+
+    def __init__(self, directory: str, shard_size: int):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._shard_size = shard_size
+        self._pending = []
+        self._num_pending = 0
+        self._num_positions = 0
+        self._num_shards = 0
+
+    @property
+    def num_positions(self) -> int:
+        """
+        Returns the number of positions written to shards so far
+        """
+        return self._num_positions
+
+    @property
+    def num_shards(self) -> int:
+        """
+        Returns the number of shards written so far
+        """
+        return self._num_shards
+
+    def add(self, positions: PositionsType) -> None:
+        """
+        Adds a batch of positions, writing out every shard that fills up.
+
+        Inputs:
+            positions (PositionsType): the positions to add
+
+        Returns: None
+        """
+        if len(positions[1]) == 0:
+            return
+        self._pending.append(positions)
+        self._num_pending += len(positions[1])
+        while self._num_pending >= self._shard_size:
+            self._write_shard(self._shard_size)
+
+    def close(self) -> None:
+        """
+        Writes the remaining positions as a final, smaller shard.
+
+        Returns: None
+        """
+        if self._num_pending > 0:
+            self._write_shard(self._num_pending)
+
+    def _write_shard(self, size: int) -> None:
+        """
+        Writes the first size pending positions as one shard
+        """
+        boards, turns, labels = (np.concatenate(arrays) for arrays in
+                                 zip(*self._pending))
+        name = f"{self._num_shards:05d}.npy"
+        np.save(os.path.join(self._directory, "boards-" + name), boards[:size])
+        np.save(os.path.join(self._directory, "turns-" + name), turns[:size])
+        np.save(os.path.join(self._directory, "labels-" + name), labels[:size])
+
+        self._pending = [(boards[size:], turns[size:], labels[size:])]
+        self._num_pending -= size
+        self._num_positions += size
+        self._num_shards += 1
+
+
+def load_shards(directory: str) -> Iterator[PositionsType]:
+    """
+    Lazily iterates over the shards in a directory, memory-mapping each one.
+
+    Inputs:
+        directory (str): the directory written by generate
+
+    Returns: an iterator yielding (boards, turns, labels) for each shard
+    """
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith("boards-") and name.endswith(".npy"))
+    for name in names:
+        suffix = name[len("boards-"):]
+        yield tuple(np.load(os.path.join(directory, kind + suffix),
+                            mmap_mode="r")
+                    for kind in ("boards-", "turns-", "labels-"))
+
+
+def generate(directory: str, num_games: int, side: int = 8, players: int = 2,
+             othello: bool = True, bot_name: str = "random",
+             sample_rate: float = 0.25, label: str = "result",
+             shard_size: int = 100000, workers: Optional[int] = None,
+             seed: int = 0) -> int:
+    """
+    Plays self-play games in worker processes and writes the sampled positions
+    to shards in directory.
+
+    Inputs:
+        directory (str): the directory to write the shards to
+        num_games (int): the number of games to play
+        side, players, othello: the kind of game to play (as for Reversi)
+        bot_name (str): the bot (from bot.BOTS) playing every seat
+        sample_rate (float): probability of sampling each position
+        label (str): how to label positions (one of LABELS)
+        shard_size (int): the number of positions in each shard
+        workers (Optional[int]): the number of worker processes (defaults to
+            the number of CPUs)
+        seed (int): random seed of the first game (games use seed, seed+1..)
+
+    Returns (int): the number of positions written
+    """
+    if label not in LABELS:
+        raise ValueError(f"Unknown label {label}")
+
+    writer = ShardWriter(directory, shard_size)
+    tasks = ((side, players, othello, bot_name, seed + game_num, sample_rate,
+              label) for game_num in range(num_games))
+    with Pool(workers) as pool:
+        # In game order, so that a seed always gives the same shards
+        for positions in pool.imap(_play_game_task, tasks, chunksize=4):
+            writer.add(positions)
+    writer.close()
+    return writer.num_positions
+
+
+@click.command()
+@click.option("-o", "--output", default="positions", help="Output directory")
+@click.option("-g", "--num-games", default=1000, help="Number of games")
+@click.option("-n", "--num-players", default=2, help="Number of players")
+@click.option("-s", "--board-size", default=8, help="Board size")
+@click.option("--othello/--non-othello", default=True, help="Othello mode")
+@click.option("-b", "--bot", "bot_name", default="random",
+              type=click.Choice(list(BOTS)), help="Bot playing every seat")
+@click.option("-r", "--sample-rate", default=0.25,
+              help="Probability of sampling each position")
+@click.option("-l", "--label", default="result", type=click.Choice(LABELS),
+              help="How to label positions")
+@click.option("--shard-size", default=100000, help="Positions per shard")
+@click.option("-w", "--workers", default=None, type=int,
+              help="Worker processes (default: one per CPU)")
+@click.option("--seed", default=0, help="Random seed of the first game")
+def main(output, num_games, num_players, board_size, othello, bot_name,
+         sample_rate, label, shard_size, workers, seed) -> None:
+    """
+    Generates labelled self-play positions
+    """
+    count = generate(output, num_games, board_size, num_players, othello,
+                     bot_name, sample_rate, label, shard_size, workers, seed)
+    print(f"Wrote {count} positions to {output}")
+
+
+if __name__ == "__main__":
+    main()
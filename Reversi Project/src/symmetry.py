@@ -0,0 +1,147 @@
+"""
+Symmetry-canonical keys of reversi positions.
+
+Turning or mirroring the board (the 8 symmetries of a square) does not
+change the rules: a move is legal, and flips the same pieces, in the
+transformed position exactly when its transformed square is legal there. The
+middle zone that the first players ** 2 pieces of a non-Othello game are
+placed in is centred, so it maps onto itself, and so do the four squares of
+the Othello start (which is itself unchanged by half of the symmetries and
+swapped to the other diagonal by the rest). Positions that are symmetric to
+each other can therefore share one entry in caches and position databases.
+
+canonical_key picks, out of the 8 transformed boards, the smallest one and
+returns it as the key, together with the transform that produced it, so
+that a move found for the key's board can be translated back with
+untransform_move.
+
+Transforms are numbered 0 to 7, as in TRANSFORMS. Each one is applied to a
+board by a precomputed permutation of its squares (an operator.itemgetter
+over Board.cells), so no square is visited in Python.
+"""
+import struct
+from operator import itemgetter
+from typing import Callable, Dict, List, Tuple
+from reversi import Reversi
+
+TRANSFORMS: List[Tuple[str, Callable[[int, int, int], Tuple[int, int]]]] = [
+    ("identity", lambda row, col, last: (row, col)),
+    ("rotate 90", lambda row, col, last: (col, last - row)),
+    ("rotate 180", lambda row, col, last: (last - row, last - col)),
+    ("rotate 270", lambda row, col, last: (last - col, row)),
+    ("mirror columns", lambda row, col, last: (row, last - col)),
+    ("mirror rows", lambda row, col, last: (last - row, col)),
+    ("transpose", lambda row, col, last: (col, row)),
+    ("anti-transpose", lambda row, col, last: (last - col, last - row)),
+]
+"""
+The 8 symmetries of the board, as (name, function) pairs: each function maps
+a square (row, col) to its new square, given the index of the last row
+(side - 1). Rotations are clockwise.
+"""
+
+INVERSE = (0, 3, 2, 1, 4, 5, 6, 7)
+"""
+The transform that undoes each transform
+"""
+
+KEY_HEADER = struct.Struct("<HBBB")
+"""
+Header of a canonical key: the side, the number of players, flags (1 for
+Othello) and the player whose turn it is. The number of moves is left out:
+in a non-Othello game it equals the number of pieces on the board, and in
+Othello it does not change the rules.
+"""
+
+_PERMUTATIONS: Dict[int, List[itemgetter]] = {}
+"""
+For each board side, an itemgetter per transform that picks the squares of
+the transformed board out of the original one
+"""
+
+
+def _permutations(side: int) -> List[itemgetter]:
+    """
+    Returns the square permutations of every transform for a board side,
+    building them on first use
+    """
+    if side not in _PERMUTATIONS:
+        getters = []
+        for _, function in TRANSFORMS:
+            source = [0] * (side * side)
+            for row in range(side):
+                for col in range(side):
+                    new_row, new_col = function(row, col, side - 1)
+                    source[new_row * side + new_col] = row * side + col
+            getters.append(itemgetter(*source))
+        _PERMUTATIONS[side] = getters
+    return _PERMUTATIONS[side]
+
+
+def transform_cells(cells: bytes, side: int, transform: int) -> bytes:
+    """
+    Transforms a board.
+
+    Inputs:
+        cells (bytes): the squares of the board, row by row (as in
+            Board.cells)
+        side (int): the number of squares on each side of the board
+        transform (int): the transform to apply
+
+    Returns (bytes): the squares of the transformed board
+    """
+    return bytes(_permutations(side)[transform](cells))
+
+
+def transform_move(move: Tuple[int, int], side: int,
+                   transform: int) -> Tuple[int, int]:
+    """
+    Returns the square a move is moved to by a transform.
+
+    Inputs:
+        move (Tuple[int, int]): the (row, col) of the move
+        side (int): the number of squares on each side of the board
+        transform (int): the transform to apply
+    """
+    return TRANSFORMS[transform][1](move[0], move[1], side - 1)
+
+
+def untransform_move(move: Tuple[int, int], side: int,
+                     transform: int) -> Tuple[int, int]:
+    """
+    Returns the square a move came from before a transform (the opposite of
+    transform_move).
+
+    Inputs:
+        move (Tuple[int, int]): the (row, col) of the move, after the
+            transform
+        side (int): the number of squares on each side of the board
+        transform (int): the transform that was applied
+    """
+    return transform_move(move, side, INVERSE[transform])
+
+
+def canonical_key(game: Reversi) -> Tuple[bytes, int]:
+    """
+    Finds the canonical key of a position: the same for every position that
+    is symmetric to it.
+
+    The key is a KEY_HEADER followed by the squares of the smallest of the
+    8 transformed boards, one byte each.
+
+    Input:
+        game (Reversi): gameboard
+
+    Returns (Tuple[bytes, int]): the key and the transform that maps the
+        board of the game to the board of the key
+    """
+    side = game.size
+    cells = game.cells
+    best, best_transform = cells, 0
+    for transform, permutation in enumerate(_permutations(side)[1:], start=1):
+        candidate = bytes(permutation(cells))
+        if candidate < best:
+            best, best_transform = candidate, transform
+    header = KEY_HEADER.pack(side, game.num_players, int(game.othello),
+                             game.turn)
+    return header + best, best_transform
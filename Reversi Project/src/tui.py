@@ -1,8 +1,16 @@
 # TEXT USER INTERFACE
 
+import os
+import select
+import shutil
 import sys
-from typing import List, Tuple
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import (Callable, Dict, Iterable, Iterator, List, Optional, Set,
+                    Tuple)
 from reversi import Reversi, ReversiBase
+from bot import choose_move, parse_seats
+from records import GameRecord, RecordType, tail_records
 import click
 from colored import fg, attr # type: ignore
 
@@ -37,10 +45,33 @@ PLAYER_SYMBOLS = {
     9: "◊",                
 }
 
+PLAYER_GLYPHS = {player: PLAYER_COLORS[player] + symbol + attr('reset')
+                 for player, symbol in PLAYER_SYMBOLS.items()}
+"""
+The coloured symbol of each player, as drawn in the grid
+"""
+
 EMPTY_CELL_SYMBOL = " "
 
 PIECES = {"EMPTY": " "}
 
+BOT_TIME_BUDGET = 2.0 # seconds a bot may think before it must move
+
+BOT_WORKERS = max(2, os.cpu_count() or 1)
+"""
+Processes the bots think in. Pondering uses all but one of them, counting
+the ones still busy with replies to moves that were not played (which
+cannot be stopped once they have started), so that a reply that was not
+pondered never waits behind ponder jobs
+"""
+
+CSI = "\x1b[" # starts an ANSI escape sequence
+CLEAR_SCREEN = CSI + "2J" + CSI + "H"
+CLEAR_BELOW = CSI + "J" # clears from the cursor to the end of the screen
+
+REPLAY_HELP = ("space: pause  left/right: step  up/down: 10 moves  "
+               "+/-: speed  n/p: next/previous game  q: quit")
+
 def make_grid(board_size):
     """
     Creates a grid for the board
@@ -95,13 +126,70 @@ def print_grid(grid):
     for row in grid:
         print(''.join(row))
 
+def cursor_to(line, column):
+    """
+    Returns the escape sequence that moves the cursor
+
+    Args:
+        line (int): The line to move to (starting from 1)
+        column (int): The column to move to (starting from 1)
+
+    Returns:
+        str: The escape sequence
+    """
+    return f"{CSI}{line};{column}H"
+
+def draw_grid(grid):
+    """
+    Returns the output that clears the terminal and draws the whole grid at
+    the top of it
+
+    Args:
+        grid (List[List[str]]): The grid to draw
+
+    Returns:
+        str: The output to write
+    """
+    return CLEAR_SCREEN + "\n".join(''.join(row) for row in grid) + "\n"
+
+def redraw_squares(grid, squares):
+    """
+    Returns the output that repaints some squares of a grid drawn with
+    draw_grid, by moving the cursor to each of them
+
+    Args:
+        grid (List[List[str]]): The grid to draw
+        squares (Iterable[Tuple[int, int]]): The (row, col) positions of the
+                                             board squares to repaint
+
+    Returns:
+        str: The output to write
+    """
+    return ''.join(cursor_to(2 * row + 2, 2 * col + 2) +
+                   grid[2 * row + 1][2 * col + 1] for row, col in squares)
+
 @click.command()
 @click.option('-n', '--num-players', default=2, help='Number of players')
 @click.option('-s', '--board-size', default=8, help='Board size')
 @click.option('--othello/--non-othello', 'game_mode', default=True, 
               help='Othello mode')
-
-def main(num_players, board_size, game_mode):
+@click.option('--incremental', is_flag=True,
+              help='Draw the board once and only repaint changed squares')
+@click.option('--script', type=click.File('r'), default=None,
+              help='Play the moves in a file (- for stdin) without prompting')
+@click.option('--bot', default=None, help='Bot to play against (player 2)')
+@click.option('--seat', 'seats', multiple=True,
+              help='Bot for any player, as PLAYER=BOT (can be repeated)')
+@click.option('--replay', default=None,
+              help='Watch the games in a record file instead of playing')
+@click.option('--speed', default=2.0,
+              type=click.FloatRange(min=0, min_open=True),
+              help='Replay speed, in moves per second')
+@click.option('--follow', is_flag=True,
+              help='Keep watching for games added to the record file')
+
+def main(num_players, board_size, game_mode, incremental, script, bot, seats,
+         replay, speed, follow):
     """
     Main function for the text user interface
 
@@ -109,14 +197,44 @@ def main(num_players, board_size, game_mode):
         num_players (int): The number of players
         board_size (int): The size of the board
         game_mode (bool): Whether to play in Othello mode or not
+        incremental (bool): Whether to repaint only the changed squares
+            (with ANSI cursor addressing) instead of reprinting the board
+        script (TextIO): A file of moves to play instead of asking for them
+            (see read_script)
+        bot (str): The bot playing as player 2
+        seats (Tuple[str]): Bots for other players, as PLAYER=BOT
+        replay (str): A record file to watch the games of (see records.py)
+        speed (float): The number of moves per second to replay
+        follow (bool): Whether to wait for more games at the end of the
+            record file, as it is written by a tournament
         
     Returns:
         None
     """
+    if replay is not None:
+        replay_records(tail_records(replay, follow), speed)
+        return
+
     if num_players % 2 != board_size % 2:
         print("Error: Num of players and board should be both even or odd")
         sys.exit(1)
 
+    if script is not None:
+        run_script(script, num_players, board_size, game_mode)
+        return
+
+    try:
+        bot_seats = parse_seats(bot, seats, num_players) # player -> bot name
+    except ValueError as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+
+    # Bots think in a separate process, so they can ponder while the human
+    # players are typing
+    executor = ProcessPoolExecutor(BOT_WORKERS) if bot_seats else None
+    pondering = {} # the bot's reply to each move the human might play
+    running = [] # replies to moves that were not played, still running
+
     stub = Reversi(board_size, num_players, game_mode)
 
     # use helper function to make the grid
@@ -125,48 +243,403 @@ def main(num_players, board_size, game_mode):
     # Add the pieces from the stub object to the grid
     update_grid_with_pieces(grid, stub)
 
-    while not stub.done:
-        # Print the final grid
-        print_grid(grid)
+    # The squares changed by the moves since the grid was last updated, as
+    # reported by the engine for every placed and flipped piece
+    changed = set()
+    stub.add_listener(lambda pos, old, new: changed.add(pos))
+    drawn = False # whether the grid is on the terminal, in incremental mode
+
+    # However the game ends (including Ctrl-C or the end of input), replies
+    # that have not started are cancelled and the workers are stopped once
+    # the ones that have started finish (within their time budget)
+    try:
+        while not stub.done:
+            # Get the possible moves for the current player
+            possible_moves = get_possible_moves(stub)
+            if stub.turn in bot_seats:
+                prompt = "Player {} ({}) is thinking...\n".format(
+                    stub.turn, bot_seats[stub.turn])
+            else:
+                prompt = format_pos_moves(possible_moves, stub,
+                                          shutil.get_terminal_size().columns
+                                          if incremental else 0)
+
+            if incremental:
+                # One write per turn: the changed squares, then the moves below
+                # the board (replacing the last turn's moves and input)
+                output = (redraw_squares(grid, changed) if drawn
+                          else draw_grid(grid))
+                output += cursor_to(len(grid) + 1, 1) + CLEAR_BELOW + prompt
+                sys.stdout.write(output)
+                sys.stdout.flush()
+                drawn = True
+            else:
+                # Print the final grid and the possible moves
+                print_grid(grid)
+                print(prompt, end="")
+                sys.stdout.flush()
+            changed.clear()
+
+            if stub.turn in bot_seats:
+                # Get the bot's move, which is ready if it was pondered
+                move = get_bot_move(executor, stub, bot_seats[stub.turn],
+                                    pondering)
+            else:
+                # Get player move, while the bots ponder their replies on the
+                # workers that are not still busy with abandoned replies
+                running = [reply for reply in running if not reply.done()]
+                pondering = ponder(executor, stub, bot_seats,
+                                   BOT_WORKERS - 1 - len(running))
+                move = get_player_move(possible_moves)
+                for move_played, reply in pondering.items():
+                    if move_played != move and not reply.cancel():
+                        running.append(reply) # started, so it runs to the end
+                pondering = ({move: pondering[move]} if move in pondering
+                             else {})
+
+            # Apply move
+            stub.apply_move(move)
+
+            # Update grid with the squares the move changed
+            update_grid_with_pieces(grid, stub, changed)
+
+        if drawn:
+            sys.stdout.write(redraw_squares(grid, changed) +
+                             cursor_to(len(grid) + 1, 1) + CLEAR_BELOW)
+            sys.stdout.flush()
+        else:
+            print_grid(grid)
+        print("Game over!")
+        print_winner(stub)
+    finally:
+        if executor is not None:
+            for reply in list(pondering.values()) + running:
+                reply.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def ponder(executor: Optional[ProcessPoolExecutor], stub: Reversi,
+           bot_seats: Dict[int, str],
+           workers: int) -> Dict[Tuple[int, int], Future]:
+    """
+    Starts working out how the bots would reply to the moves the current
+    player is most likely to make (the ones that capture the most pieces),
+    one move per free worker. Only the games of those moves are copied.
 
-        # Get and display possible moves for the current player
-        possible_moves = get_possible_moves(stub)
-        display_pos_moves(possible_moves, stub)
+    Args:
+        executor (ProcessPoolExecutor): The bots' worker (None if no bots)
+        stub (Reversi): The stub object
+        bot_seats (Dict[int, str]): The name of the bot playing each bot
+                                    player
+        workers (int): The number of workers free to ponder on
 
-        # Get player move
-        move = get_player_move(possible_moves)
+    Returns:
+        Dict[Tuple[int, int], Future]: The bot's reply to each pondered move
+    """
+    pondering: Dict[Tuple[int, int], Future] = {}
+    if executor is None:
+        return pondering
+    likely = sorted(stub.available_moves, key=lambda move:
+                    -stub.captures(move))
+    for move in likely:
+        if len(pondering) >= workers:
+            break
+        after = stub.simulate_moves([move])
+        if not after.done and after.turn in bot_seats:
+            pondering[move] = executor.submit(choose_move, after,
+                                              bot_seats[after.turn],
+                                              BOT_TIME_BUDGET)
+    return pondering
+
+def get_bot_move(executor: ProcessPoolExecutor, stub: Reversi,
+                 bot_name: str,
+                 pondering: Dict[Tuple[int, int], Future]) -> Tuple[int, int]:
+    """
+    Gets a bot's move, reusing its pondered reply to the last move if there
+    is one
+
+    Args:
+        executor (ProcessPoolExecutor): The bots' worker
+        stub (Reversi): The stub object
+        bot_name (str): The bot to move
+        pondering (Dict[Tuple[int, int], Future]): The pondered replies
+
+    Returns:
+        Tuple[int, int]: The bot's move
+    """
+    reply = pondering.pop(stub.moves[-1], None) if stub.moves else None
+    if reply is not None and not reply.cancelled():
+        return reply.result()
+    return executor.submit(choose_move, stub.simulate_moves([]), bot_name,
+                           BOT_TIME_BUDGET).result()
 
-        # Apply move
-        stub.apply_move(move)
+def read_key(timeout: Optional[float]) -> Optional[str]:
+    """
+    Waits for a key press on a terminal in cbreak mode
+
+    Args:
+        timeout (Optional[float]): The seconds to wait (None for no limit)
 
-        # Update grid with the new pieces
-        update_grid_with_pieces(grid, stub)
+    Returns:
+        Optional[str]: The key (an escape sequence for arrow keys), or None
+                       if no key was pressed in time
+    """
+    if not sys.stdin.isatty():
+        if timeout is not None:
+            time.sleep(timeout)
+        return None
+    ready, _, _ = select.select([sys.stdin], [], [], timeout)
+    if not ready:
+        return None
+    return os.read(sys.stdin.fileno(), 8).decode(errors="ignore")
+
+def seek(stub: Reversi, current: int, game_record: GameRecord, ply: int,
+         changed: Set[Tuple[int, int]]) -> Reversi:
+    """
+    Moves a replayed game to the position after some number of moves,
+    playing on from the current position if it is a little earlier and
+    jumping there from the nearest keyframe otherwise
 
+    Args:
+        stub (Reversi): The game being replayed
+        current (int): The number of moves played in it
+        game_record (GameRecord): Its record
+        ply (int): The number of moves to go to
+        changed (Set[Tuple[int, int]]): The set to add the changed squares
+                                        to (when playing on, the game's
+                                        listener is expected to do this)
+
+    Returns:
+        Reversi: The game after ply moves
+    """
+    if ply < current or ply - current > game_record.keyframe_interval:
+        old_grid = stub.grid
+        stub = game_record.seek(ply)
+        stub.add_listener(lambda pos, old, new: changed.add(pos))
+        changed.update((row, col) for row, cells in enumerate(stub.grid)
+                       for col, piece in enumerate(cells)
+                       if piece != old_grid[row][col])
+    else:
+        for move in game_record.moves[current:ply]:
+            stub.apply_move(move)
+    return stub
+
+def replay_game(record: RecordType, title: str, speed: float,
+                get_key: Callable[[Optional[float]], Optional[str]]
+                ) -> Tuple[str, float]:
+    """
+    Replays one recorded game, repainting only the squares each move changes
+
+    Args:
+        record (RecordType): The record of the game
+        title (str): The name of the game to show
+        speed (float): The number of moves per second
+        get_key (Callable): Waits for a key press, as read_key
+
+    Returns:
+        Tuple[str, float]: What to do next ("next", "previous" or "quit")
+                           and the speed it was left at
+    """
+    game_record = GameRecord.from_record(record)
+    moves = game_record.moves
+    stub = game_record.seek(0)
+    changed = set()
+    stub.add_listener(lambda pos, old, new: changed.add(pos))
+    grid = make_grid(stub.size)
     update_grid_with_pieces(grid, stub)
-    print_grid(grid)
-    
-    print("Game over!")
-    print_winner(stub)
 
-def update_grid_with_pieces(grid: List[List[str]], stub: ReversiBase):
+    output = draw_grid(grid)
+    paused = False
+    ply = 0
+    while True:
+        status = "{}  move {}/{}  {:g} moves/s{}".format(
+            title, ply, len(moves), speed, "  (paused)" if paused else "")
+        if ply == len(moves):
+            outcome = stub.outcome if stub.done else record.get("outcome", [])
+            status += "\n" + ("Player {} wins!".format(outcome[0])
+                              if len(outcome) == 1 else "It's a tie!"
+                              if outcome else "Game over!")
+        sys.stdout.write(output + cursor_to(len(grid) + 1, 1) + CLEAR_BELOW +
+                         status + "\n" + REPLAY_HELP + "\n")
+        sys.stdout.flush()
+
+        # The end of a game stays up for a few moves' time
+        wait = None if paused else (3 if ply == len(moves) else 1) / speed
+        key = get_key(wait)
+        target = ply
+        if key is None:
+            if ply == len(moves):
+                return "next", speed
+            target = ply + 1
+        elif key == " ":
+            paused = not paused
+        elif key in ("+", "="):
+            speed *= 2
+        elif key == "-":
+            speed /= 2
+        elif key in ("n", "p", "q"):
+            return {"n": "next", "p": "previous", "q": "quit"}[key], speed
+        elif key in (CSI + "C", CSI + "D", CSI + "A", CSI + "B"):
+            paused = True
+            target += {"C": 1, "D": -1, "A": -10, "B": 10}[key[-1]]
+
+        target = min(max(target, 0), len(moves))
+        if target != ply:
+            stub = seek(stub, ply, game_record, target, changed)
+            update_grid_with_pieces(grid, stub, changed)
+            ply = target
+        output = redraw_squares(grid, changed)
+        changed.clear()
+
+def replay_records(records: Iterator[RecordType], speed: float):
+    """
+    Watches recorded games one after another, with keys to pause, seek,
+    change the speed and move between games. Games are only read from the
+    iterator when they are reached, so a file can be followed as it grows.
+    Records that do not hold a playable game (such as a truncated one) are
+    skipped with a message.
+
+    Args:
+        records (Iterator[RecordType]): The games to watch
+        speed (float): The number of moves per second
+
+    Returns:
+        None
+    """
+    terminal = None
+    if sys.stdin.isatty():
+        import termios
+        import tty
+        terminal = termios.tcgetattr(sys.stdin)
+        tty.setcbreak(sys.stdin.fileno())
+    seen: List[RecordType] = [] # the games read so far, to go back to
+    index = 0
+    try:
+        while True:
+            if index == len(seen):
+                sys.stdout.write("Waiting for the next game...\n")
+                sys.stdout.flush()
+                record = next(records, None)
+                if record is None:
+                    break
+                try:
+                    GameRecord.from_record(record)
+                except Exception as error: # Reversi raises plain Exception
+                    sys.stdout.write("Skipping a malformed game record: "
+                                     "{!r}\n".format(error))
+                    continue
+                seen.append(record)
+            action, speed = replay_game(seen[index],
+                                        "Game {}".format(index + 1), speed,
+                                        read_key)
+            if action == "quit":
+                break
+            index = max(index - 1, 0) if action == "previous" else index + 1
+    finally:
+        if terminal is not None:
+            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, terminal)
+
+def read_script(lines: Iterable[str]) -> Iterator[List[Tuple[int, int]]]:
+    """
+    Reads the games of a script. Moves are written as ROW,COL and separated
+    by spaces or newlines, and a blank line ends a game (so a script can be
+    one move per line, or one game per line with blank lines in between).
+    Anything after a # is a comment.
+
+    Args:
+        lines (Iterable[str]): The lines of the script
+
+    Returns:
+        Iterator[List[Tuple[int, int]]]: The moves of each game
+    """
+    moves: List[Tuple[int, int]] = []
+    for line in lines:
+        line = line.split("#", 1)[0]
+        if not line.strip():
+            if moves:
+                yield moves
+            moves = []
+            continue
+        for token in line.split():
+            row, _, col = token.partition(",")
+            try:
+                moves.append((int(row), int(col)))
+            except ValueError as error:
+                raise ValueError(f"Invalid move {token}, expected ROW,COL") \
+                    from error
+    if moves:
+        yield moves
+
+def run_script(lines: Iterable[str], num_players: int, board_size: int,
+               game_mode: bool):
+    """
+    Plays the games of a script at full speed, printing only the final
+    board and outcome of each game and the time taken
+
+    Args:
+        lines (Iterable[str]): The lines of the script (see read_script)
+        num_players (int): The number of players
+        board_size (int): The size of the board
+        game_mode (bool): Whether to play in Othello mode or not
+
+    Returns:
+        None
+    """
+    start = time.perf_counter()
+    num_games = 0
+    num_moves = 0
+    try:
+        for num_games, moves in enumerate(read_script(lines), start=1):
+            stub = Reversi(board_size, num_players, game_mode)
+            for move_num, move in enumerate(moves, start=1):
+                try:
+                    legal = not stub.done and stub.legal_move(move)
+                except ValueError: # off the board
+                    legal = False
+                if not legal:
+                    print(f"Error: Illegal move {move[0]},{move[1]} "
+                          f"(move {move_num} of game {num_games})")
+                    sys.exit(1)
+                stub.apply_move(move)
+            num_moves += len(moves)
+
+            # Only the final board is shown, so the grid is built once
+            grid = make_grid(board_size)
+            update_grid_with_pieces(grid, stub)
+            print_grid(grid)
+            if stub.done:
+                print_winner(stub)
+            else:
+                print(f"Game not finished, Player {stub.turn} to move")
+    except ValueError as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+
+    elapsed = time.perf_counter() - start
+    print(f"Played {num_games} games ({num_moves} moves) in {elapsed:.3f}s")
+
+def update_grid_with_pieces(grid: List[List[str]], stub: ReversiBase,
+                            squares: Optional[Iterable[Tuple[int, int]]]
+                            = None):
     """
     Updates the grid with the pieces from the stub object
 
     Args:
         grid (List[List[str]]): The grid to update
         stub (ReversiBase): The stub object
+        squares (Iterable[Tuple[int, int]]): Only update these squares, such
+                                             as the ones changed by the last
+                                             move (default: all squares)
 
     Returns:
         None
     """
-    for row in range(stub.size):
-        for col in range(stub.size):
-            piece = stub.piece_at((row, col))
-            if piece is not None:
-                player_color = PLAYER_COLORS.get(piece, "")
-                player_symbol = PLAYER_SYMBOLS.get(piece, "")
-                grid[2 * row + 1][2 * col + 1] = (player_color + player_symbol
-                                                  + attr('reset'))
+    if squares is None:
+        squares = [(row, col) for row in range(stub.size)
+                   for col in range(stub.size)]
+    for row, col in squares:
+        piece = stub.piece_at((row, col))
+        grid[2 * row + 1][2 * col + 1] = (PIECES["EMPTY"] if piece is None
+                                          else PLAYER_GLYPHS.get(piece, ""))
 
 def get_possible_moves(stub: ReversiBase) -> List[Tuple[int, int]]:
     """
@@ -192,9 +665,36 @@ def display_pos_moves(possible_moves: List[Tuple[int, int]], stub: ReversiBase):
     Returns:
         None
     """
-    print("It is Player {}'s turn. Please choose a move:".format(stub.turn))
-    for index, move in enumerate(possible_moves, start=1):
-        print("{}) {}, {}".format(index, move[0], move[1]))
+    print(format_pos_moves(possible_moves, stub), end="")
+
+def format_pos_moves(possible_moves: List[Tuple[int, int]], stub: ReversiBase,
+                     width: int = 0) -> str:
+    """
+    Formats the possible moves for the current player
+
+    Args:
+        possible_moves (List[Tuple[int, int]]): A list of possible moves for
+                                                the current player
+        stub (ReversiBase): The stub object
+        width (int): The width of the terminal, to fit several moves on each
+                     line (default: one move per line)
+
+    Returns:
+        str: The lines to print
+    """
+    lines = ["It is Player {}'s turn. Please choose a move:".format(stub.turn)]
+    entries = ["{}) {}, {}".format(index, move[0], move[1])
+               for index, move in enumerate(possible_moves, start=1)]
+    entry_width = max((len(entry) for entry in entries), default=0) + 2
+    per_line = max(1, width // entry_width)
+    for start in range(0, len(entries), per_line):
+        line = entries[start:start + per_line]
+        if per_line == 1:
+            lines.append(line[0])
+        else:
+            lines.append(''.join(entry.ljust(entry_width)
+                                 for entry in line).rstrip())
+    return "\n".join(lines) + "\n"
 
 def get_player_move(possible_moves: List[Tuple[int, int]]) -> Tuple[int, int]:
     """
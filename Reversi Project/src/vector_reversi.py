@@ -0,0 +1,367 @@
+"""
+Vectorised reversi engine that plays many games at once.
+
+VectorReversi holds N independent games of the same kind in NumPy arrays and
+advances all of them in lockstep: every step, each unfinished game gets one
+move. Legal moves are found for all games together by shifting the boards in
+each of the eight directions, so the Python overhead of a step is paid once
+for all N games instead of once per game (the array work itself still grows
+linearly with N). This makes it suitable for random playouts (Monte Carlo
+search, data generation), where Reversi would spend most of its time in pure
+Python scans.
+
+The rules are the same as in Reversi, including the free placement of the
+first players ** 2 pieces in the middle of the board in non-Othello games.
+"""
+import time
+from typing import Optional, Tuple
+import click
+import numpy as np
+
+DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1),
+              (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+
+def shift(masks: np.ndarray, drow: int, dcol: int,
+          out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Shifts a stack of boards, so that the result at (row, col) is the value
+    of the input at (row + drow, col + dcol), or False off the board.
+
+    Inputs:
+        masks (np.ndarray): boolean array (n, side, side)
+        drow, dcol (int): the offset to read from
+        out (Optional[np.ndarray]): array of the same shape to write the
+            result to, instead of a new one (must not be masks)
+
+    Returns (np.ndarray): the shifted array
+    """
+    side = masks.shape[1]
+    if out is None:
+        shifted = np.zeros_like(masks)
+    else:
+        shifted = out
+        shifted.fill(False)
+    if abs(drow) >= side or abs(dcol) >= side:
+        return shifted
+    rows_to = slice(max(0, -drow), side - max(0, drow))
+    rows_from = slice(max(0, drow), side - max(0, -drow))
+    cols_to = slice(max(0, -dcol), side - max(0, dcol))
+    cols_from = slice(max(0, dcol), side - max(0, -dcol))
+    shifted[:, rows_to, cols_to] = masks[:, rows_from, cols_from]
+    return shifted
+
+
+class VectorReversi:
+    """
+    Class for playing many games of reversi at once.
+
+    Attributes:
+        num_games (int): the number of games
+        size (int): the number of squares on each side of the boards
+        num_players (int): the number of players
+        boards (np.ndarray): int8 array (num_games, side, side), 0 for empty
+            squares and the player number otherwise
+        turns (np.ndarray): int8 array (num_games,), the player to move
+        num_moves (np.ndarray): int32 array (num_games,), moves played so far
+        done (np.ndarray): bool array (num_games,), which games are over
+
+    Methods:
+        legal_masks: the legal moves of every game as boolean boards
+        apply_moves: play one move in each of a set of games
+        step: play one random move in every unfinished game
+        play_random: play random moves until every game is over
+        scores: the number of pieces of every player in every game
+        outcomes: the winners of every game
+    """
+    _side: int
+    _players: int
+    _othello: bool
+    _zone: np.ndarray
+    _legal: np.ndarray
+    _legal_known: np.ndarray
+
+    def __init__(self, num_games: int, side: int, players: int,
+                 othello: bool):
+        if players % 2 != side % 2:
+            raise ValueError("Parity of players and side must match")
+
+        if othello and players != 2:
+            raise Exception("Othello is only for 2 players")
+
+        self._side = side
+        self._players = players
+        self._othello = othello
+
+        self.boards = np.zeros((num_games, side, side), dtype=np.int8)
+        if othello:
+            middle = side // 2
+            self.boards[:, middle, middle] = 2
+            self.boards[:, middle - 1, middle - 1] = 2
+            self.boards[:, middle, middle - 1] = 1
+            self.boards[:, middle - 1, middle] = 1
+        self.turns = np.ones(num_games, dtype=np.int8)
+        self.num_moves = np.zeros(num_games, dtype=np.int32)
+        self.done = np.zeros(num_games, dtype=bool)
+
+        # Squares open to the first players ** 2 moves of non-Othello games
+        edge_len = (side - players) // 2
+        self._zone = np.zeros((1, side, side), dtype=bool)
+        self._zone[:, edge_len:side - edge_len, edge_len:side - edge_len] = True
+
+        # The legal moves of the player to move, kept from _advance_turns
+        # (which has to find them anyway) for the next step
+        self._legal = np.zeros((num_games, side, side), dtype=bool)
+        self._legal_known = np.zeros(num_games, dtype=bool)
+
+    @property
+    def num_games(self) -> int:
+        """
+        Returns the number of games
+        """
+        return len(self.turns)
+
+    @property
+    def size(self) -> int:
+        """
+        Returns the size of the boards (the number of squares per side)
+        """
+        return self._side
+
+    @property
+    def num_players(self) -> int:
+        """
+        Returns the number of players
+        """
+        return self._players
+
+    def legal_masks(self, games: Optional[np.ndarray] = None,
+                    players: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Finds the legal moves of a set of games.
+
+        Inputs:
+            games (Optional[np.ndarray]): indices of the games to look at
+                (defaults to all of them)
+            players (Optional[np.ndarray]): the player to find the moves of in
+                each of those games (defaults to the player to move)
+
+        Returns (np.ndarray): bool array (len(games), side, side), True where
+            the player could place a piece
+        """
+        if games is None:
+            games = np.arange(self.num_games)
+        if players is None:
+            players = self.turns[games]
+        boards = self.boards[games]
+        empty = boards == 0
+        own = boards == players.reshape(-1, 1, 1)
+        opp = ~empty & ~own
+
+        legal = np.zeros_like(empty)
+        # Reused for every direction and distance
+        run = np.empty_like(empty)
+        shifted = np.empty_like(empty)
+        for drow, dcol in DIRECTIONS:
+            # run: squares followed by an unbroken line of opponent pieces
+            shift(opp, drow, dcol, out=run)
+            for dist in range(2, self._side):
+                if not run.any():
+                    break
+                shift(own, dist * drow, dist * dcol, out=shifted)
+                legal |= np.logical_and(run, shifted, out=shifted)
+                run &= shift(opp, dist * drow, dist * dcol, out=shifted)
+        legal &= empty
+
+        if not self._othello:
+            opening = self.num_moves[games] < self._players ** 2
+            legal[opening] = empty[opening] & self._zone
+        return legal
+
+    def apply_moves(self, games: np.ndarray, rows: np.ndarray,
+                    cols: np.ndarray) -> None:
+        """
+        Places a piece of the player to move in each of a set of games, flips
+        the pieces it captures and moves the turn on to the next player who
+        can move (marking games where nobody can move as done).
+
+        The moves are assumed to be legal.
+
+        Inputs:
+            games (np.ndarray): indices of the games to play in
+            rows, cols (np.ndarray): the move to play in each of those games
+
+        Returns: None
+        """
+        side = self._side
+        players = self.turns[games]
+        self.boards[games, rows, cols] = players
+
+        flipping = np.ones(len(games), dtype=bool)
+        if not self._othello:
+            flipping = self.num_moves[games] >= self._players ** 2
+        for drow, dcol in DIRECTIONS:
+            # Length of the line of opponent pieces next to the move, and
+            # whether it is closed off by one of the player's own pieces
+            length = np.zeros(len(games), dtype=np.int32)
+            running = flipping.copy()
+            closed = np.zeros(len(games), dtype=bool)
+            for dist in range(1, side):
+                row = rows + dist * drow
+                col = cols + dist * dcol
+                inside = (row >= 0) & (row < side) & (col >= 0) & (col < side)
+                running &= inside
+                if not running.any():
+                    break
+                cells = self.boards[games, np.clip(row, 0, side - 1),
+                                    np.clip(col, 0, side - 1)]
+                closed |= running & (cells == players)
+                running &= (cells != 0) & (cells != players)
+                length += running
+            length[~closed] = 0
+
+            for dist in range(1, int(length.max(initial=0)) + 1):
+                sel = length >= dist
+                self.boards[games[sel], rows[sel] + dist * drow,
+                            cols[sel] + dist * dcol] = players[sel]
+
+        self.num_moves[games] += 1
+        self._legal_known[games] = False
+        self._advance_turns(games)
+
+    def _advance_turns(self, games: np.ndarray) -> None:
+        """
+        Moves the turn of each game on to the next player who has a legal
+        move, marking the game as done if nobody has one. The moves found for
+        that player are kept for step.
+        """
+        movers = self.turns[games].astype(np.int32)
+        waiting = games
+        waiting_movers = movers
+        for offset in range(1, self._players + 1):
+            candidates = (waiting_movers + offset - 1) % self._players + 1
+            masks = self.legal_masks(waiting, candidates)
+            can_move = masks.any(axis=(1, 2))
+            moving = waiting[can_move]
+            self.turns[moving] = candidates[can_move]
+            self._legal[moving] = masks[can_move]
+            self._legal_known[moving] = True
+            waiting = waiting[~can_move]
+            waiting_movers = waiting_movers[~can_move]
+            if len(waiting) == 0:
+                return
+        self.done[waiting] = True
+
+    def step(self, rng: np.random.Generator) -> np.ndarray:
+        """
+        Plays one random legal move in every unfinished game. Games whose
+        last move was played with apply_moves reuse the legal moves found
+        then, so boards and turns must not be changed directly in between.
+
+        Inputs:
+            rng (np.random.Generator): source of randomness
+
+        Returns (np.ndarray): int array (num_games, 2) with the move played in
+            each game, or (-1, -1) for games that were already over
+        """
+        moves = np.full((self.num_games, 2), -1, dtype=np.int32)
+        games = np.flatnonzero(~self.done)
+        if len(games) == 0:
+            return moves
+
+        unknown = games[~self._legal_known[games]]
+        if len(unknown):
+            self._legal[unknown] = self.legal_masks(unknown)
+            self._legal_known[unknown] = True
+        legal = self._legal[games].reshape(len(games), -1)
+        choice = np.argmax(rng.random(legal.shape) * legal, axis=1)
+        rows, cols = np.divmod(choice, self._side)
+        self.apply_moves(games, rows, cols)
+
+        moves[games, 0] = rows
+        moves[games, 1] = cols
+        return moves
+
+    def play_random(self, rng: np.random.Generator) -> int:
+        """
+        Plays random moves until every game is over.
+
+        Inputs:
+            rng (np.random.Generator): source of randomness
+
+        Returns (int): the number of steps taken
+        """
+        steps = 0
+        while not self.done.all():
+            self.step(rng)
+            steps += 1
+        return steps
+
+    def scores(self) -> np.ndarray:
+        """
+        Returns an int array (num_games, players + 1) with the number of
+        pieces of every player in every game (column 0 counts empty squares)
+        """
+        flat = self.boards.reshape(self.num_games, -1).astype(np.int64)
+        offsets = np.arange(self.num_games)[:, None] * (self._players + 1)
+        counts = np.bincount((flat + offsets).ravel(),
+                             minlength=self.num_games * (self._players + 1))
+        return counts.reshape(self.num_games, self._players + 1)
+
+    def outcomes(self) -> np.ndarray:
+        """
+        Returns a bool array (num_games, players + 1) marking the winners of
+        every finished game (column 0 is unused). Unfinished games have no
+        winners.
+        """
+        scores = self.scores()
+        scores[:, 0] = -1
+        winners = scores == scores.max(axis=1, keepdims=True)
+        winners[~self.done] = False
+        return winners
+
+
+def random_playouts(num_games: int, side: int, players: int, othello: bool,
+                    seed: Optional[int] = None
+                    ) -> Tuple[VectorReversi, float]:
+    """
+    Plays random games to the end, all at once.
+
+    Inputs:
+        num_games (int): the number of games
+        side, players, othello: the kind of game to play (as for Reversi)
+        seed (Optional[int]): random seed
+
+    Returns (Tuple[VectorReversi, float]): the finished games and the number
+        of games completed per second
+    """
+    rng = np.random.default_rng(seed)
+    games = VectorReversi(num_games, side, players, othello)
+    start = time.perf_counter()
+    games.play_random(rng)
+    elapsed = time.perf_counter() - start
+    return games, num_games / elapsed if elapsed > 0 else float("inf")
+
+
+@click.command()
+@click.option("-g", "--num-games", default=10000, help="Number of games")
+@click.option("-n", "--num-players", default=2, help="Number of players")
+@click.option("-s", "--board-size", default=8, help="Board size")
+@click.option("--othello/--non-othello", default=True, help="Othello mode")
+@click.option("--seed", default=None, type=int, help="Random seed")
+def main(num_games, num_players, board_size, othello, seed) -> None:
+    """
+    Plays random games in lockstep and reports the throughput
+    """
+    games, rate = random_playouts(num_games, board_size, num_players, othello,
+                                  seed)
+    wins = games.outcomes()[:, 1:].sum(axis=0)
+    print(f"{num_games} games in {num_games / rate:.2f}s "
+          f"({rate:.0f} games/s)")
+    for player, count in enumerate(wins, start=1):
+        print(f"Player {player} wins (incl. ties): "
+              f"{count / num_games * 100:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
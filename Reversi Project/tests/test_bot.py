@@ -0,0 +1,114 @@
+"""
+Tests for the bots and the tournament runner
+"""
+import itertools
+import pytest
+from click.testing import CliRunner
+import bot
+from bot import DEADLINE_MARGIN, main, parse_seats, use_bot
+from reversi import Reversi
+from records import RecordWriter, tail_records
+
+
+def test_use_bot_passes_deadline(monkeypatch):
+    """
+    Test that use_bot tells strategies that accept a deadline when their
+    thinking time ends, and calls other strategies as usual
+    """
+    monkeypatch.setattr(bot.time, "perf_counter", lambda: 100.0)
+    calls = []
+
+    def deadline_strategy(game, deadline=None):
+        calls.append(("deadline", deadline))
+
+    def plain_strategy(game):
+        calls.append(("plain", game))
+
+    game = Reversi(8, 2, True)
+    assert use_bot(game, deadline_strategy, 2.0) == 0.0
+    use_bot(game, deadline_strategy)
+    use_bot(game, plain_strategy, 2.0)
+    assert calls == [("deadline", 100.0 + DEADLINE_MARGIN * 2.0),
+                     ("deadline", None),
+                     ("plain", game)]
+
+
+@pytest.mark.parametrize("bot_name", ["smart", "very-smart", "pattern"])
+def test_deadline_bots_do_not_forfeit(bot_name, monkeypatch):
+    """
+    Test that bots that are told the deadline finish their games under a time
+    limit without running over it. The clock moves on a fixed step every time
+    it is read, so that the bots reach their deadlines on every long move.
+    """
+    ticks = itertools.count()
+    monkeypatch.setattr(bot.time, "perf_counter", lambda: next(ticks) / 1024)
+
+    result = CliRunner().invoke(main, ["-n", "3", "-1", bot_name, "-2",
+                                       bot_name, "-t", str(16 / 1024),
+                                       "--seed", "1"])
+    assert result.exit_code == 0, result.output
+    assert "Moves over the time limit: Player 1: 0, Player 2: 0" in \
+        result.output
+
+
+@pytest.mark.parametrize("flush_every,expected", [
+    ("1", [0, 1, 2]),
+    ("2", [0, 0, 2]),
+    ("64", [0, 0, 0]),
+])
+def test_records_flushed_every_few_games(tmp_path, monkeypatch, flush_every,
+                                         expected):
+    """
+    Test that the tournament runner writes games to its record file in
+    batches of --flush-every (each game as soon as it ends with 1, for
+    spectators following the file), and that every game is in the file once
+    the run is over
+    """
+    path = str(tmp_path / "games.jsonl.gz")
+    readable = [] # Records readable from the file before each write
+
+    class CheckedWriter(RecordWriter):
+        def write(self, record):
+            readable.append(len(list(tail_records(path, follow=False))))
+            super().write(record)
+
+    monkeypatch.setattr(bot, "RecordWriter", CheckedWriter)
+    result = CliRunner().invoke(main, ["-n", "3", "--seed", "1",
+                                       "--record", path,
+                                       "--flush-every", flush_every])
+    assert result.exit_code == 0, result.output
+    assert readable == expected
+    records = list(tail_records(path, follow=False))
+    assert len(records) == 3
+    assert all(record["othello"] for record in records)
+
+
+def test_parse_seats():
+    """
+    Test that --bot seats player 2, that --seat can be repeated and that a
+    later seat for the same player wins
+    """
+    assert parse_seats(None, [], 2) == {}
+    assert parse_seats("smart", [], 2) == {2: "smart"}
+    assert parse_seats(None, ["1=random", "3=pattern"], 3) == \
+        {1: "random", 3: "pattern"}
+    assert parse_seats("smart", ["1=random", "2=very-smart"], 2) == \
+        {1: "random", 2: "very-smart"}
+    assert parse_seats(None, ["1=random", "1=smart"], 2) == {1: "smart"}
+
+
+@pytest.mark.parametrize("bot_name,seats", [
+    (None, ["3=random"]),
+    (None, ["0=random"]),
+    (None, ["x=random"]),
+    (None, ["random"]),
+    ("clever", []),
+    (None, ["1=clever"]),
+])
+def test_parse_seats_invalid(bot_name, seats):
+    """
+    Test that seats for players outside the game, badly formed seats and
+    unknown bots are rejected
+    """
+    with pytest.raises(ValueError):
+        parse_seats(bot_name, seats, 2)
@@ -0,0 +1,46 @@
+"""
+Tests for the GUI's background music
+"""
+import os
+import threading
+import pygame
+import gui
+
+
+def test_start_music_initialises_mixer_on_calling_thread(monkeypatch, capsys):
+    """
+    Test that the mixer is started on the calling thread and only the file
+    is loaded in the background, with failures reported
+    """
+    monkeypatch.setenv("SDL_AUDIODRIVER", "dummy")
+    init_threads = []
+    mixer_init = pygame.mixer.init
+
+    def recording_init():
+        init_threads.append(threading.current_thread())
+        mixer_init()
+
+    monkeypatch.setattr(pygame.mixer, "init", recording_init)
+    try:
+        thread = gui.start_music(os.path.join("no", "such", "music.mp3"))
+        assert init_threads == [threading.current_thread()]
+        assert thread is not threading.current_thread()
+        thread.join(5)
+        assert not thread.is_alive()
+    finally:
+        pygame.mixer.quit()
+    assert "Background music disabled" in capsys.readouterr().out
+
+
+def test_start_music_without_audio(monkeypatch, capsys):
+    """
+    Test that the game stays silent, without a thread, if the mixer cannot
+    start
+    """
+    def failing_init():
+        raise pygame.error("no audio device")
+
+    monkeypatch.setattr(pygame.mixer, "init", failing_init)
+    assert gui.start_music("music.mp3") is None
+    assert "Background music disabled: no audio device" in \
+        capsys.readouterr().out
@@ -0,0 +1,298 @@
+"""
+Tests for the GUI's viewport, render snapshots, asset cache and frame stats
+"""
+import csv
+import pygame
+import pytest
+from reversi import Reversi
+import gui_helpers
+from gui_helpers import (STAT_NAMES, AssetCache, FrameStats, RenderSnapshot,
+                         Viewport, changed_cells, collect_stats, draw_stats,
+                         profiled, take_snapshot)
+
+
+class FakeClock:
+    """
+    Stands in for time.perf_counter, moving on only when told to
+    """
+
+    def __init__(self):
+        self.now = 10.
+
+    def __call__(self):
+        return self.now
+
+
+def test_viewport_small_board():
+    """
+    Test that a board that fits the window is shown whole, and that points
+    are mapped to the cells under them
+    """
+    view = Viewport(8)
+    assert view.square_size == 87
+    assert (view.first_row, view.first_col) == (0, 0)
+    assert view.visible_range() == (range(0, 8), range(0, 8))
+
+    assert view.cell_at((0, 0)) == (0, 0)
+    assert view.cell_at((90, 180)) == (1, 2)
+    assert view.cell_rect(1, 2) == pygame.Rect(87, 174, 87, 87)
+    assert view.cell_at((699, 10)) is None # past the last square
+    assert view.cell_at((750, 10)) is None # outside the board area
+
+
+def test_viewport_pan():
+    """
+    Test that a big board starts in the middle and is panned without
+    leaving the board
+    """
+    view = Viewport(100)
+    assert view.square_size == Viewport.MIN_SQUARE_SIZE
+    assert (view.first_row, view.first_col) == (6, 6)
+    assert view.cell_at((0, 8)) == (6, 7)
+
+    assert view.pan(-100, 2)
+    assert (view.first_row, view.first_col) == (0, 8)
+    assert not view.pan(-1, 0)
+    assert view.pan(1000, 1000)
+    assert (view.first_row, view.first_col) == (13, 13)
+    assert view.visible_range() == (range(13, 100), range(13, 100))
+
+
+def test_viewport_zoom():
+    """
+    Test that zooming keeps the cell under the point in place, and that the
+    size of the squares is kept within its limits
+    """
+    view = Viewport(100)
+    assert not view.zoom(0.5) # already as small as it gets
+
+    pos = (200, 300)
+    anchor = view.cell_at(pos)
+    assert view.zoom(2, pos)
+    assert view.square_size == 16
+    assert view.cell_at(pos) == anchor
+
+    center = view.cell_at(view.area.center)
+    assert view.zoom(100)
+    assert view.square_size == Viewport.MAX_SQUARE_SIZE
+    assert view.cell_at(view.area.center) == center
+
+
+def test_viewport_zoom_outside_board():
+    """
+    Test that zooming at a point outside the board area (over the side
+    panel) zooms about the middle of the board instead
+    """
+    view = Viewport(100)
+    middle = Viewport(100)
+    assert view.zoom(2, (750, 300))
+    middle.zoom(2)
+    assert (view.square_size, view.first_row, view.first_col) == \
+        (middle.square_size, middle.first_row, middle.first_col)
+
+
+def test_changed_cells():
+    """
+    Test that the cells whose piece or hint changed are found, and that every
+    cell changes when the view moves
+    """
+    old = RenderSnapshot(grid=((None, 1), (2, None)), turn=1,
+                         moves=frozenset({(0, 0)}), done=False, winners=())
+    new = RenderSnapshot(grid=((1, 1), (1, None)), turn=2,
+                         moves=frozenset({(1, 1)}), done=False, winners=())
+    assert changed_cells(old, new) == {(0, 0), (1, 0), (1, 1)}
+    assert changed_cells(new, new) == set()
+
+    moved = new._replace(origin=(5, 7))
+    assert changed_cells(new, moved) == {(5, 7), (5, 8), (6, 7), (6, 8)}
+
+
+def test_take_snapshot_view():
+    """
+    Test that a snapshot with a view only holds the visible cells and their
+    hints, and that done is taken from the caller
+    """
+    game = Reversi(20, 2, True)
+    view = Viewport(20, pygame.Rect(0, 0, 200, 200))
+    snapshot = take_snapshot(game, False, view)
+    rows, cols = view.visible_range()
+    assert snapshot.origin == (rows.start, cols.start)
+    assert len(snapshot.grid) == len(rows)
+    assert snapshot.moves == {move for move in game.available_moves
+                              if move[0] in rows and move[1] in cols}
+    for row in rows:
+        for col in cols:
+            assert snapshot.piece_at(row, col) == game.piece_at((row, col))
+
+    over = take_snapshot(game, True, view)
+    assert over.done and over.moves == frozenset()
+
+
+def test_asset_cache_hits_and_misses(monkeypatch):
+    """
+    Test that fonts, text and sprites are built once and then reused
+    """
+    pygame.font.init()
+    built = []
+    sys_font = pygame.font.SysFont
+
+    def counting_sys_font(name, size):
+        built.append((name, size))
+        return sys_font(name, size)
+
+    monkeypatch.setattr(pygame.font, "SysFont", counting_sys_font)
+    assets = AssetCache(40)
+
+    font = assets.font("Arial", 20)
+    assert assets.font("Arial", 20) is font
+    assert assets.font("Arial", 30) is not font
+    assert built == [("Arial", 20), ("Arial", 30)]
+
+    text = assets.text("Player 1", "Arial", 20, "Black")
+    assert assets.text("Player 1", "Arial", 20, "Black") is text
+    assert assets.text("Player 1", "Arial", 20, "White") is not text
+    assert assets.text("Player 2", "Arial", 20, "Black") is not text
+    assert len(built) == 2 # the fonts were reused
+
+    piece = assets.piece(1)
+    assert piece.get_size() == (40, 40)
+    assert assets.piece(1) is piece
+    assert assets.piece(2) is not piece
+    assert assets.hint() is assets.hint()
+
+
+def test_asset_cache_resize():
+    """
+    Test that resizing rebuilds the sprites at the new size but keeps the
+    text, and that resizing to the same size keeps everything
+    """
+    pygame.font.init()
+    assets = AssetCache(40)
+    piece = assets.piece(1)
+    hint = assets.hint()
+    text = assets.text("Player 1", "Arial", 20, "Black")
+
+    assets.resize(40)
+    assert assets.piece(1) is piece and assets.hint() is hint
+
+    assets.resize(60)
+    assert assets.square_size == 60
+    assert assets.piece(1) is not piece
+    assert assets.piece(1).get_size() == (60, 60)
+    assert assets.hint().get_size() == (60, 60)
+    assert assets.text("Player 1", "Arial", 20, "Black") is text
+
+
+def test_frame_stats_split(monkeypatch):
+    """
+    Test that each timed block is charged its own time, without the time of
+    the blocks inside it, and that frames add up to the time of their blocks
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(gui_helpers.time, "perf_counter", clock)
+    stats = FrameStats()
+
+    with stats.timed("draw_all"):
+        clock.now += 0.002
+        with stats.timed("draw_pieces"):
+            clock.now += 0.003
+        with stats.timed("draw_pieces"):
+            clock.now += 0.001
+    with stats.timed("engine"):
+        clock.now += 0.004
+    stats.end_frame()
+
+    assert stats.last == pytest.approx({"draw_all": 0.002,
+                                        "draw_pieces": 0.004,
+                                        "engine": 0.004})
+    assert stats.frame_time == pytest.approx(0.010)
+    assert stats.fps == 1
+
+    clock.now += 0.5
+    stats.end_frame()
+    assert stats.last == {} and stats.frame_time == 0
+    assert stats.fps == 2
+    clock.now += 0.9
+    stats.end_frame()
+    assert stats.fps == 2 # the first frame is over a second old
+
+
+def test_frame_stats_disabled():
+    """
+    Test that nothing is recorded while stats are disabled
+    """
+    stats = FrameStats(enabled=False)
+    with stats.timed("engine"):
+        pass
+    stats.end_frame()
+    assert stats.last == {} and stats.fps == 0
+
+
+def test_frame_stats_csv(tmp_path, monkeypatch):
+    """
+    Test that every frame is logged as a CSV row, in milliseconds
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(gui_helpers.time, "perf_counter", clock)
+    path = tmp_path / "frames.csv"
+    stats = FrameStats(str(path))
+
+    with stats.timed("engine"):
+        clock.now += 0.0015
+    stats.end_frame()
+    stats.bot_time = 0.25
+    clock.now += 0.01
+    stats.end_frame()
+    stats.close()
+    stats.close()
+
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == ["time", "frame", "fps"] + STAT_NAMES + ["bot"]
+    assert [row["frame"] for row in rows] == ["1", "2"]
+    assert [row["time"] for row in rows] == ["0.0015", "0.0115"]
+    assert rows[0]["engine"] == "1.500" and rows[1]["engine"] == "0.000"
+    assert rows[0]["bot"] == "" and rows[1]["bot"] == "250.0"
+
+
+def test_profiled_reports_to_collected_stats(monkeypatch):
+    """
+    Test that profiled functions are timed under their name only while
+    stats are being collected
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(gui_helpers.time, "perf_counter", clock)
+
+    @profiled
+    def draw_winner():
+        clock.now += 0.002
+        return "drawn"
+
+    stats = FrameStats()
+    assert draw_winner() == "drawn"
+    collect_stats(stats)
+    try:
+        assert draw_winner() == "drawn"
+    finally:
+        collect_stats(None)
+    draw_winner()
+    stats.end_frame()
+    assert stats.last == pytest.approx({"draw_winner": 0.002})
+
+
+def test_draw_stats():
+    """
+    Test that the overlay is drawn in its corner of the window only
+    """
+    pygame.font.init()
+    background = pygame.Surface((800, 700))
+    background.fill((59, 133, 76))
+    screen = background.copy()
+    stats = FrameStats()
+    stats.bot_time = 1.5
+
+    rect = draw_stats(screen, background, stats, AssetCache(87))
+    assert rect == pygame.Rect(705, 415, 90, 275)
+    changed = [(x, y) for x in range(0, 800, 5) for y in range(0, 700, 5)
+               if screen.get_at((x, y)) != background.get_at((x, y))]
+    assert changed and all(rect.collidepoint(point) for point in changed)
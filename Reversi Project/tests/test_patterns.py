@@ -0,0 +1,77 @@
+"""
+Tests for the pattern-table evaluator
+"""
+import random
+import pytest
+
+from reversi import Reversi
+from patterns import PatternEvaluator, MAX_TABLE_SIZE
+from bot import pattern_bot
+
+
+@pytest.mark.parametrize("side,players,othello", [(4, 2, True), (8, 2, True),
+                                                  (7, 3, False),
+                                                  (9, 9, False)])
+def test_incremental_matches_fresh(side, players, othello):
+    """
+    Test that following a game move by move gives the same pattern indices
+    and evaluations as building an evaluator from the final position
+    """
+    random.seed(side * players)
+    reversi = Reversi(side, players, othello)
+    evaluator = PatternEvaluator.for_game(reversi)
+    reversi.add_listener(evaluator.update)
+
+    while not reversi.done:
+        reversi.apply_move(random.choice(reversi.available_moves))
+
+    fresh = PatternEvaluator.for_game(reversi)
+    assert evaluator.indices == fresh.indices
+    for player in range(1, players + 1):
+        assert evaluator.evaluate(player) == pytest.approx(
+            fresh.evaluate(player))
+
+
+def test_table_sizes():
+    """
+    Test that weight tables stay small for every number of players
+    """
+    for players in range(2, 10):
+        evaluator = PatternEvaluator(players + 10, players)
+        for table in evaluator.weights.values():
+            assert len(table) <= players * MAX_TABLE_SIZE
+
+
+def test_corner_preferred():
+    """
+    Test that owning a corner rates better than owning the square next to it
+    """
+    reversi = Reversi(side=8, players=2, othello=False)
+    corner = reversi.simulate_moves([])
+    corner.load_game(1, [[1] + [None] * 7] + [[None] * 8 for _ in range(7)])
+    x_square = reversi.simulate_moves([])
+    x_square.load_game(1, [[None] * 8, [None, 1] + [None] * 6] +
+                       [[None] * 8 for _ in range(6)])
+
+    assert PatternEvaluator.for_game(corner).evaluate(1) > \
+        PatternEvaluator.for_game(x_square).evaluate(1)
+
+
+@pytest.mark.parametrize("side,players,othello", [(8, 2, True),
+                                                  (7, 3, False)])
+def test_pattern_bot_best_rated_move(side, players, othello):
+    """
+    Test that the pattern bot plays a move whose resulting position rates
+    best, as rated by an evaluator built from that position
+    """
+    rng = random.Random(side)
+    reversi = Reversi(side, players, othello)
+    while not reversi.done:
+        player = reversi.turn
+        scores = [PatternEvaluator.for_game(reversi.simulate_moves([move]))
+                  .evaluate(player) for move in reversi.available_moves]
+        bot_game = reversi.simulate_moves([])
+        pattern_bot(bot_game)
+        played = reversi.available_moves.index(bot_game.moves[-1])
+        assert scores[played] == pytest.approx(max(scores))
+        reversi.apply_move(rng.choice(reversi.available_moves))
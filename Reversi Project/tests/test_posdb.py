@@ -0,0 +1,231 @@
+"""
+Tests for the memory-mapped position database
+"""
+import random
+import pytest
+from click.testing import CliRunner
+from reversi import Reversi
+from records import RecordWriter
+import posdb
+from posdb import (HEADER, MAGIC, RECORD, PositionDB, PositionEntry, main,
+                   make_entry, merge, position_key, record_entries)
+
+
+def random_entries(rng, count):
+    """
+    Returns entries with random keys, scores, moves and depths
+    """
+    return [PositionEntry(rng.getrandbits(64), float(rng.randint(-64, 64)),
+                          rng.choice([None, rng.randrange(64)]),
+                          rng.randrange(20))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_merge_and_get(tmp_path, chunk_size):
+    """
+    Test that entries from several merges can all be found, that later
+    merges replace the entries of existing keys, and that missing keys are
+    not found
+    """
+    path = str(tmp_path / "positions.db")
+    rng = random.Random(3)
+    first = random_entries(rng, 200)
+    second = random_entries(rng, 150)
+    second += [entry._replace(score=entry.score + 1, depth=99)
+               for entry in first[::4]]
+
+    merge(path, first, chunk_size)
+    total = merge(path, second, chunk_size)
+
+    expected = {entry.key: entry for entry in first + second}
+    with PositionDB(path) as db:
+        assert len(db) == total == len(expected)
+        keys = [entry.key for entry in db.entries()]
+        assert keys == sorted(expected)
+        for key, entry in expected.items():
+            assert db.get(key) == entry
+        assert db.get(max(expected) + 1) is None
+
+
+def test_merge_empty_batch(tmp_path):
+    """
+    Test that merging no entries creates an empty database, and leaves an
+    existing one unchanged
+    """
+    path = str(tmp_path / "positions.db")
+    assert merge(path, []) == 0
+    with PositionDB(path) as db:
+        assert len(db) == 0
+        assert db.get(1) is None
+
+    entries = random_entries(random.Random(7), 20)
+    merge(path, entries)
+    assert merge(path, []) == 20
+    with PositionDB(path) as db:
+        assert list(db.entries()) == sorted(entries)
+
+
+def test_main_merges_in_batches(tmp_path, monkeypatch):
+    """
+    Test that recorded games are merged a batch at a time, giving the same
+    database as merging them all at once
+    """
+    records = []
+    for seed in range(4):
+        rng = random.Random(seed)
+        game = Reversi(6, 2, True)
+        while not game.done:
+            game.apply_move(rng.choice(game.available_moves))
+        records.append({"side": 6, "players": 2, "othello": True,
+                        "moves": [list(move) for move in game.moves]})
+    record_file = str(tmp_path / "games.jsonl.gz")
+    with RecordWriter(record_file) as writer:
+        for record in records:
+            writer.write(record)
+
+    batches = []
+    original_merge = posdb.merge
+    def counting_merge(path, entries, chunk_size):
+        batches.append(len(entries))
+        return original_merge(path, entries, chunk_size)
+    monkeypatch.setattr(posdb, "merge", counting_merge)
+
+    path = str(tmp_path / "positions.db")
+    result = CliRunner().invoke(main, [path, record_file,
+                                       "--batch-size", "40"])
+    assert result.exit_code == 0, result.output
+    entries = [entry for record in records
+               for entry in record_entries(record)]
+    assert sum(batches) == len(entries)
+    assert len(batches) > 1 and max(batches) < 40 + 32
+
+    single = str(tmp_path / "single.db")
+    original_merge(single, entries)
+    with PositionDB(path) as db, PositionDB(single) as expected:
+        assert list(db.entries()) == list(expected.entries())
+
+
+def test_lookup_position(tmp_path):
+    """
+    Test looking up positions by their game state
+    """
+    path = str(tmp_path / "positions.db")
+    game = Reversi(8, 2, True)
+    move = game.available_moves[0]
+    merge(path, [make_entry(game, 1.5, move, 4)])
+
+    with PositionDB(path) as db:
+        entry = db.lookup(game)
+        assert entry.score == 1.5
+        assert divmod(entry.move, game.size) == move
+        assert entry.depth == 4
+
+        game.apply_move(move)
+        assert db.lookup(game) is None
+    assert position_key(Reversi(8, 2, True)) != position_key(game)
+
+
+@pytest.mark.parametrize("othello", [True, False])
+def test_key_of_loaded_position(othello):
+    """
+    Test that a played position has the same key as the same position loaded
+    with load_game
+    """
+    game = Reversi(6, 2, othello)
+    rng = random.Random(2)
+    while not game.done:
+        loaded = Reversi(6, 2, othello)
+        loaded.load_game(game.turn, game.grid)
+        assert position_key(loaded) == position_key(game)
+        assert position_key(loaded, canonical=True) == \
+            position_key(game, canonical=True)
+        game.apply_move(rng.choice(game.available_moves))
+
+
+def test_reader_survives_merge(tmp_path):
+    """
+    Test that an open reader keeps its view of the database during a merge,
+    and sees the new entries after refreshing
+    """
+    path = str(tmp_path / "positions.db")
+    rng = random.Random(5)
+    old, new = random_entries(rng, 50), random_entries(rng, 50)
+    merge(path, old)
+
+    with PositionDB(path) as db:
+        merge(path, new)
+        assert len(db) == 50
+        assert db.get(new[0].key) is None
+        assert db.get(old[0].key) == old[0]
+
+        assert db.refresh()
+        assert len(db) == 100
+        assert db.get(new[0].key) == new[0]
+        assert not db.refresh()
+
+
+def test_not_a_database(tmp_path):
+    """
+    Test that files that are not databases are rejected
+    """
+    path = tmp_path / "positions.db"
+    path.write_bytes(b"not a database at all")
+    with pytest.raises(ValueError):
+        PositionDB(str(path))
+
+
+@pytest.mark.parametrize("contents", [
+    b"short",
+    b"not a database at all",
+    HEADER.pack(b"RVPOSDB0", 0),
+    HEADER.pack(MAGIC, 3) + bytes(RECORD.size * 2),
+    HEADER.pack(MAGIC, 1) + bytes(RECORD.size + 1),
+])
+def test_merge_into_non_database(tmp_path, contents):
+    """
+    Test that merging into a file that is not a database (wrong magic, or a
+    size that does not match its record count) is refused and leaves the
+    file as it was
+    """
+    path = tmp_path / "positions.db"
+    path.write_bytes(contents)
+    with pytest.raises(ValueError):
+        merge(str(path), random_entries(random.Random(7), 5))
+    assert path.read_bytes() == contents
+    assert [name.name for name in tmp_path.iterdir()
+            if name.suffix == ".tmp"] == []
+
+
+def test_failed_merge_cleans_up(tmp_path, monkeypatch):
+    """
+    Test that a merge that fails leaves the database as it was and no
+    temporary file behind
+    """
+    path = str(tmp_path / "positions.db")
+    rng = random.Random(6)
+    old = random_entries(rng, 20)
+    merge(path, old)
+
+    def fail(source, destination):
+        raise OSError("disk full")
+    monkeypatch.setattr(posdb.os, "replace", fail)
+    with pytest.raises(OSError):
+        merge(path, random_entries(rng, 20))
+
+    assert sorted(tmp_path.iterdir()) == [tmp_path / "positions.db",
+                                          tmp_path / "positions.db.lock"]
+    with PositionDB(path) as db:
+        assert list(db.entries()) == sorted(old)
+
+
+def test_closed_database(tmp_path):
+    """
+    Test that a closed database cannot be read
+    """
+    path = str(tmp_path / "positions.db")
+    merge(path, random_entries(random.Random(7), 5))
+    db = PositionDB(path)
+    db.close()
+    with pytest.raises(ValueError):
+        db.get(0)
@@ -0,0 +1,150 @@
+"""
+Tests for the game record writer and reader
+"""
+import random
+import pytest
+from reversi import Reversi
+from records import GameRecord, RecordWriter, read_records, tail_records
+
+
+def test_records_round_trip(tmp_path):
+    """
+    Test that records written in several sessions are read back in order
+    """
+    path = str(tmp_path / "games.jsonl.gz")
+    records = [{"seed": i, "moves": [[2, 3], [2, 2]], "outcome": [1]}
+               for i in range(10)]
+
+    with RecordWriter(path, buffer_size=3) as writer:
+        for record in records[:7]:
+            writer.write(record)
+    with RecordWriter(path) as writer:
+        for record in records[7:]:
+            writer.write(record)
+
+    assert list(read_records(path)) == records
+
+
+def test_records_flush_readable(tmp_path):
+    """
+    Test that flushed records can be read while the writer is still open
+    """
+    path = str(tmp_path / "games.jsonl.gz")
+    writer = RecordWriter(path)
+    writer.write({"seed": 1})
+    writer.flush()
+
+    reader = read_records(path)
+    assert next(reader) == {"seed": 1}
+
+    writer.close()
+
+
+def test_records_readable_without_close(tmp_path):
+    """
+    Test that the flushed records of a file whose writer was never closed
+    (as after a crash) are read without an error
+    """
+    path = str(tmp_path / "games.jsonl.gz")
+    writer = RecordWriter(path)
+    writer.write({"seed": 1})
+    writer.write({"seed": 2})
+    writer.flush()
+    writer.write({"seed": 3}) # still buffered
+
+    assert list(read_records(path)) == [{"seed": 1}, {"seed": 2}]
+    writer.close()
+
+
+def test_tail_records_follows(tmp_path):
+    """
+    Test that tail_records picks up records flushed after it reached the end
+    of the file, including ones from a later run of the writer
+    """
+    path = str(tmp_path / "games.jsonl.gz")
+    writer = RecordWriter(path)
+    writer.write({"seed": 1})
+    writer.write({"seed": 2})
+    writer.flush()
+
+    reader = tail_records(path, poll_interval=0.01)
+    assert next(reader) == {"seed": 1}
+    assert next(reader) == {"seed": 2}
+
+    writer.write({"seed": 3})
+    writer.close()
+    assert next(reader) == {"seed": 3}
+
+    with RecordWriter(path) as writer:
+        writer.write({"seed": 4})
+    assert next(reader) == {"seed": 4}
+
+    assert list(tail_records(path, follow=False)) == list(read_records(path))
+
+
+def random_game(side, players, othello, seed):
+    """
+    Plays a random game and returns it
+    """
+    rng = random.Random(seed)
+    game = Reversi(side, players, othello)
+    while not game.done:
+        game.apply_move(rng.choice(game.available_moves))
+    return game
+
+
+@pytest.mark.parametrize("side,players,othello", [(8, 2, True),
+                                                  (7, 3, False)])
+def test_game_record_seek(side, players, othello):
+    """
+    Test that seeking to every ply gives the same position as replaying the
+    game from the start
+    """
+    game = random_game(side, players, othello, seed=3)
+    record = GameRecord(side, players, othello, game.moves,
+                        keyframe_interval=5)
+    assert len(record) == len(game.moves)
+    assert record.moves == game.moves
+
+    replay = Reversi(side, players, othello)
+    for ply, move in enumerate(game.moves + [None]):
+        position = record.seek(ply)
+        assert position.grid == replay.grid
+        assert position.turn == replay.turn
+        if move is not None:
+            replay.apply_move(move)
+
+    with pytest.raises(ValueError):
+        record.seek(len(game.moves) + 1)
+
+
+@pytest.mark.parametrize("interval", [0, -3])
+def test_game_record_bad_keyframe_interval(interval):
+    """
+    Test that keyframes must be at least one move apart
+    """
+    with pytest.raises(ValueError, match="keyframe interval"):
+        GameRecord(8, 2, True, keyframe_interval=interval)
+
+
+def test_game_record_bytes_round_trip():
+    """
+    Test that a game record survives to_bytes and from_bytes, taking two
+    bytes per move, and can be built from a tournament record
+    """
+    game = random_game(8, 2, True, seed=5)
+    record = GameRecord(8, 2, True, game.moves)
+    data = record.to_bytes()
+    assert len(data) == GameRecord.HEADER.size + 2 * len(game.moves)
+
+    copy = GameRecord.from_bytes(data)
+    assert copy.moves == game.moves
+    assert (copy.side, copy.players, copy.othello) == (8, 2, True)
+    assert copy.seek(len(copy)).grid == game.grid
+
+    tournament = {"side": 8, "players": 2, "othello": True,
+                  "moves": [list(move) for move in game.moves]}
+    assert GameRecord.from_record(tournament).moves == game.moves
+
+    with pytest.raises(ValueError):
+        GameRecord(8, 2, True, [(0, 0)])
@@ -0,0 +1,115 @@
+"""
+Tests for the headless batch renderer
+"""
+import click
+import pytest
+from click.testing import CliRunner
+from records import RecordWriter
+from reversi import Reversi
+from render import (WINDOW_SIZE, game_tasks, init_worker, main, render_frame,
+                    render_plies, select_plies)
+import pygame
+
+RECORD = {"side": 8, "players": 2, "othello": True,
+          "moves": [[2, 3], [2, 2], [2, 1]]}
+
+
+@pytest.mark.parametrize("plies,expected", [
+    ("all", [0, 1, 2, 3, 4, 5]),
+    ("last", [5]),
+    ("every:2", [0, 2, 4, 5]),
+    ("every:5", [0, 5]),
+    ("0,-1,-2", [0, 4, 5]),
+    ("3,3,9,-9", [3]),
+])
+def test_select_plies(plies, expected):
+    """
+    Test that plies are selected from every form of the option, counting
+    negative plies from the end and dropping ones outside the game
+    """
+    assert select_plies(plies, 5) == expected
+
+
+@pytest.mark.parametrize("plies", ["every:0", "every:-2", "every:x",
+                                   "1,two"])
+def test_select_plies_invalid(plies):
+    """
+    Test that badly formed plies are reported as a bad option
+    """
+    with pytest.raises(click.BadParameter):
+        select_plies(plies, 5)
+
+
+def raw_frame(num_moves):
+    """
+    Renders the position after the first moves of RECORD, replayed from the
+    start
+    """
+    game = Reversi(8, 2, True)
+    for move in RECORD["moves"][:num_moves]:
+        game.apply_move(tuple(move))
+    return pygame.image.tobytes(render_frame(game, 80), "RGB")
+
+
+def test_render_plies(tmp_path):
+    """
+    Test that plies are rendered as raw frames of the requested width, or
+    saved as PNG files
+    """
+    init_worker()
+    frames = list(render_plies(task)
+                  for task in game_tasks(0, RECORD, [0, 1, 3], None, 80))
+    assert len(frames) == 1
+    assert len(frames[0][0]) == (
+        80 * round(80 * WINDOW_SIZE[1] / WINDOW_SIZE[0]) * 3)
+    assert frames[0] == [raw_frame(0), raw_frame(1), raw_frame(3)]
+
+    for task in game_tasks(2, RECORD, [1], str(tmp_path), 80):
+        assert render_plies(task) == [None]
+    assert (tmp_path / "game-00002-ply-001.png").exists()
+
+
+def test_game_tasks(monkeypatch):
+    """
+    Test that plies are split into tasks that each start from the position
+    at their first ply
+    """
+    monkeypatch.setattr("render.FRAMES_PER_TASK", 2)
+    tasks = list(game_tasks(0, RECORD, [0, 2, 3], None, 80))
+    assert [task[2:5] for task in tasks] == [
+        (0, [(2, 3), (2, 2)], [0, 2]), (3, [], [3])]
+
+    init_worker()
+    assert render_plies(tasks[1]) == [raw_frame(3)]
+
+
+def test_raw_stream(tmp_path):
+    """
+    Test that the selected frames of every game are written to a raw stream
+    in order
+    """
+    record_file = str(tmp_path / "games.jsonl.gz")
+    with RecordWriter(record_file) as writer:
+        writer.write(RECORD)
+        writer.write(dict(RECORD, moves=RECORD["moves"][:1]))
+    raw = tmp_path / "frames.rgb"
+
+    result = CliRunner().invoke(main, [record_file, "--raw", str(raw), "-p",
+                                       "0,-1", "--width", "80", "-w", "1"])
+    assert result.exit_code == 0, result.output
+
+    init_worker()
+    assert raw.read_bytes() == b"".join([raw_frame(0), raw_frame(3),
+                                         raw_frame(0), raw_frame(1)])
+
+
+def test_bad_plies_option(tmp_path):
+    """
+    Test that a bad plies option is reported before anything is rendered
+    """
+    result = CliRunner().invoke(main, [str(tmp_path / "games.jsonl.gz"),
+                                       "--output", str(tmp_path / "frames"),
+                                       "-p", "every:0"])
+    assert result.exit_code == 2
+    assert "every:N" in result.output
+    assert not (tmp_path / "frames").exists()
@@ -1,12 +1,17 @@
 """
 Tests for the reversi implementation
 """
+import random
 import pytest
 from typing import List,Tuple,Optional,Set
 
 BoardGridType = List[List[Optional[int]]]
 
-from reversi import Reversi
+from board import Board
+from piece import Piece
+import reversi as reversi_module
+from reversi import (POSITION_HEADER, RAY_CACHE_SIZE, RAY_LIST_MAX_SIDE,
+                     Reversi)
 
 def create_helper(size: int, num_players: int, othello_bool: bool, moves: \
                   Optional[List[Tuple[int, int]]]) -> Reversi: 
@@ -804,6 +809,45 @@ def test_apply_move_3():
         reversi = Reversi(side=8, players=2, othello=True)
         reversi.apply_move((9, 8))
 
+def test_apply_move_illegal():
+    """
+    Test that applying a move to an occupied square, a square that captures
+    nothing or, in the opening of a non-Othello game, a square outside the
+    middle raises a ValueError exception and leaves the game as it was.
+    """
+    reversi = Reversi(side=8, players=2, othello=True)
+    for move in [(3, 3), (4, 4), (0, 0), (2, 2), (5, 2)]:
+        with pytest.raises(ValueError):
+            reversi.apply_move(move)
+    assert reversi.moves == [] and reversi.turn == 1
+
+    reversi = Reversi(side=8, players=2, othello=False)
+    for move in [(0, 0), (2, 3), (3, 5)]:
+        with pytest.raises(ValueError):
+            reversi.apply_move(move)
+    reversi.apply_move((3, 3))
+    with pytest.raises(ValueError):
+        reversi.apply_move((3, 3))
+    assert reversi.moves == [(3, 3)]
+
+@pytest.mark.parametrize("side,players,othello",
+                         [(6, 2, True), (6, 2, False), (7, 3, False)])
+def test_apply_move_matches_available_moves(side, players, othello):
+    """
+    Test that over random games, apply_move rejects every square that is
+    not an available move (and accepts the ones that are played).
+    """
+    rng = random.Random(side * players)
+    reversi = Reversi(side=side, players=players, othello=othello)
+    while not reversi.done:
+        moves = set(reversi.available_moves)
+        for row in range(side):
+            for col in range(side):
+                if (row, col) not in moves:
+                    with pytest.raises(ValueError):
+                        reversi.apply_move((row, col))
+        reversi.apply_move(rng.choice(sorted(moves)))
+
 def test_apply_move_till_end_tie():
     """
     Test making moves till the end of the game.
@@ -1248,3 +1292,272 @@ def test_end_game_8x8_2_players_one_winner_other_no_moves():
     reversi.load_game(2, grid)
     assert reversi.done
     assert reversi.outcome == [2]
+
+def test_moves_history():
+    """
+    Test that the moves property lists applied moves in order, and that
+    loading a game clears it
+    """
+    reversi = Reversi(side=8, players=2, othello=True)
+    assert reversi.moves == []
+
+    reversi.apply_move((2, 3))
+    reversi.apply_move((2, 2))
+    assert reversi.moves == [(2, 3), (2, 2)]
+
+    reversi.load_game(1, reversi.grid)
+    assert reversi.moves == []
+
+@pytest.mark.parametrize("side,players,othello", [(8, 2, True), (7, 3, False),
+                                                  (10, 4, False),
+                                                  (9, 9, False)])
+def test_bytes_round_trip(side, players, othello):
+    """
+    Test that a position survives to_bytes and from_bytes, and that the
+    squares take 2 bits each for two players and 4 bits each for more
+    """
+    reversi = Reversi(side=side, players=players, othello=othello)
+    for _ in range(players ** 2 + 6):
+        if reversi.done:
+            break
+        reversi.apply_move(sorted(reversi.available_moves)[0])
+
+    data = reversi.to_bytes()
+    bits = 2 if players == 2 else 4
+    assert len(data) == 9 + -(-side * side * bits // 8)
+
+    copy = Reversi.from_bytes(data)
+    assert copy.grid == reversi.grid
+    assert copy.turn == reversi.turn
+    assert copy.size == side and copy.num_players == players
+    assert sorted(copy.available_moves) == sorted(reversi.available_moves)
+    assert copy.to_bytes() == data
+
+def test_from_bytes_invalid():
+    """
+    Test that from_bytes rejects truncated data and unknown players
+    """
+    data = Reversi(side=8, players=2, othello=True).to_bytes()
+    with pytest.raises(ValueError):
+        Reversi.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        Reversi.from_bytes(data[:5])
+    with pytest.raises(ValueError):
+        Reversi.from_bytes(data[:-1] + b"\xff")
+
+@pytest.mark.parametrize("header", [
+    (1000, 2, 0, 1, 0), # a huge board, but no squares
+    (8, 3, 0, 1, 0), # parity of players and side
+    (9, 3, 1, 1, 0), # Othello with 3 players
+    (8, 2, 0, 3, 0), # turn of a player who is not playing
+    (8, 2, 0, 0, 0),
+    (8, 0, 0, 1, 0),
+    (8, 16, 0, 1, 0),
+])
+def test_from_bytes_invalid_header(header):
+    """
+    Test that from_bytes rejects malformed headers with a ValueError, before
+    building the game
+    """
+    with pytest.raises(ValueError):
+        Reversi.from_bytes(POSITION_HEADER.pack(*header) + bytes(16))
+
+def test_load_game_flat_buffer():
+    """
+    Test that load_game accepts a flat buffer of squares, and rejects ones
+    of the wrong size or with unknown players
+    """
+    reversi = create_helper(8, 2, True, [(2, 3), (2, 2)])
+    cells = bytes(cell or 0 for row in reversi.grid for cell in row)
+
+    loaded = Reversi(side=8, players=2, othello=True)
+    loaded.load_game(1, cells)
+    assert loaded.grid == reversi.grid
+    assert sorted(loaded.available_moves) == sorted(reversi.available_moves)
+
+    with pytest.raises(ValueError):
+        loaded.load_game(1, cells[:-1])
+    with pytest.raises(ValueError):
+        loaded.load_game(1, cells[:-1] + b"\x03")
+
+def test_load_game_numpy_array():
+    """
+    Test that load_game accepts a NumPy array, flat or square, and fixes up
+    the turn when the player to move has no moves
+    """
+    np = pytest.importorskip("numpy")
+    grid = np.zeros((4, 4), dtype=np.int8)
+    grid[1:3, 1:3] = [[2, 1], [1, 2]]
+
+    reversi = Reversi(side=4, players=2, othello=True)
+    reversi.load_game(2, grid)
+    assert reversi.grid == Reversi(side=4, players=2, othello=True).grid
+    assert reversi.turn == 2
+
+    grid[:] = 1
+    grid[0, 0] = 0
+    reversi.load_game(1, grid.ravel())
+    assert reversi.turn == 1
+    assert reversi.available_moves == []
+    assert reversi.done
+
+    with pytest.raises(ValueError):
+        reversi.load_game(1, grid * 3)
+    with pytest.raises(ValueError):
+        reversi.load_game(1, grid[:3])
+    with pytest.raises(ValueError):
+        reversi.load_game(1, grid.astype(float))
+
+def test_load_game_sequence_of_rows():
+    """
+    Test that load_game accepts rows in any sequence, such as a tuple of
+    tuples, and still checks them
+    """
+    reversi = create_helper(8, 2, True, [(2, 3), (2, 2)])
+    rows = tuple(tuple(row) for row in reversi.grid)
+
+    loaded = Reversi(side=8, players=2, othello=True)
+    loaded.load_game(1, rows)
+    assert loaded.grid == reversi.grid
+
+    with pytest.raises(ValueError):
+        loaded.load_game(1, rows[:-1])
+
+def test_available_moves_large_board():
+    """
+    Test the moves of a board big enough to store its rays as ranges: long
+    lines of pieces are captured across the whole board
+    """
+    side = RAY_LIST_MAX_SIDE + 2
+    reversi = Reversi(side=side, players=2, othello=False)
+    cells = bytearray(side * side)
+    cells[1:side - 1] = b"\x02" * (side - 2)
+    cells[side - 1] = 1
+    cells[side * side - 1] = 1
+    for row in range(1, side - 1):
+        cells[row * side + row] = 2
+    reversi.load_game(1, cells)
+
+    assert (0, 0) in reversi.available_moves
+    reversi.apply_move((0, 0))
+    assert reversi.num_pieces(1) == 3 + 2 * (side - 2)
+    assert all(reversi.piece_at((0, col)) == 1 for col in range(side))
+    assert all(reversi.piece_at((pos, pos)) == 1 for pos in range(side))
+
+def test_ray_cache_is_bounded():
+    """
+    Test that the rays are shared by games of the same side, and that only
+    the rays of the last few sides used are kept
+    """
+    reversi_module._rays.cache_clear()
+    first = Reversi(side=8, players=2, othello=True)
+    Reversi(side=8, players=2, othello=True).available_moves
+    first.available_moves
+    assert reversi_module._rays.cache_info().currsize == 1
+
+    for side in range(10, 10 + 2 * RAY_CACHE_SIZE, 2):
+        Reversi(side=side, players=2, othello=True).available_moves
+    assert reversi_module._rays.cache_info().currsize == RAY_CACHE_SIZE
+
+def test_available_moves_order():
+    """
+    Test that the available moves come out in the order of a set of the
+    moves, as they always have, so that bots break ties the same way
+    """
+    reversi = create_helper(8, 2, True, [(2, 3), (2, 2), (3, 2)])
+    moves = reversi.available_moves
+    row_order = sorted(moves)
+    assert moves == list(set(row_order))
+
+def test_board_pieces_change_board():
+    """
+    Test that the pieces returned by a board are views of its squares:
+    setting their player changes the board
+    """
+    board = Board(4, 4)
+    board.add_piece(1, (1, 2))
+    assert board.get_piece((0, 0)) is None
+
+    board.get_piece((1, 2)).set_player(2)
+    assert board.player_at((1, 2)) == 2
+    board.board[1][2].player = 1
+    assert board.get_piece((1, 2)).get_player() == 1
+    assert board.num_player_pieces(1) == 1
+
+def test_board_pieces_are_pieces():
+    """
+    Test that the pieces returned by a board are set up as pieces
+    """
+    board = Board(3, 3)
+    board.add_piece(2, (0, 1))
+    piece = board.get_piece((0, 1))
+    assert isinstance(piece, Piece)
+    assert piece.get_player() == 2
+    assert board.num_player_pieces(2) == 1
+
+def test_board_cells_and_counts():
+    """
+    Test that the squares are stored row by row and counted per player,
+    and that clearing or loading the board replaces all of them
+    """
+    board = Board(2, 3)
+    assert board.add_piece(1, (0, 2))
+    assert not board.add_piece(2, (0, 2))
+    board.set_piece((1, 0), 2)
+    assert bytes(board.cells) == bytes([0, 0, 1, 2, 0, 0])
+    assert board.num_player_pieces(1) == 1
+    assert not board.is_full
+
+    board.load_cells(bytes([1, 2, 1, 2, 1, 2]))
+    assert board.is_full and board.num_player_pieces(2) == 3
+    with pytest.raises(ValueError):
+        board.load_cells(bytes(5))
+
+    piece = board.get_piece((0, 0))
+    board.clear_board()
+    assert bytes(board.cells) == bytes(6)
+    piece.set_player(2)
+    assert board.player_at((0, 0)) == 2
+
+def test_board_views_follow_changes():
+    """
+    Test that locations and board are reused while the squares are
+    unchanged, and built again once they change
+    """
+    board = Board(3, 3)
+    board.add_piece(1, (0, 0))
+    board.add_piece(2, (2, 1))
+    locations = board.locations
+    assert locations == {1: [(0, 0)], 2: [(2, 1)]}
+    assert board.locations is locations
+    grid = board.board
+    assert board.board is grid
+    assert grid[1][1] is None
+
+    board.set_piece((1, 1), 1)
+    assert board.locations == {1: [(0, 0), (1, 1)], 2: [(2, 1)]}
+    assert board.board[1][1].get_player() == 1
+
+    board.load_cells(bytes(9))
+    assert board.locations == {}
+    assert all(piece is None for row in board.board for piece in row)
+
+@pytest.mark.parametrize("side,players,othello", [(8, 2, True), (7, 3, False)])
+def test_captures(side, players, othello):
+    """
+    Test that captures counts, and flipped lists, the pieces that applying
+    each move flips, through a whole game
+    """
+    reversi = Reversi(side, players, othello)
+    rng = random.Random(side)
+    while not reversi.done:
+        player = reversi.turn
+        for move in reversi.available_moves:
+            after = reversi.simulate_moves([move])
+            assert reversi.captures(move) == \
+                after.num_pieces(player) - reversi.num_pieces(player) - 1
+            assert sorted(reversi.flipped(move)) == sorted(
+                (row, col) for row in range(side) for col in range(side)
+                if (row, col) != move and reversi.piece_at((row, col)) !=
+                after.piece_at((row, col)))
+        reversi.apply_move(rng.choice(reversi.available_moves))
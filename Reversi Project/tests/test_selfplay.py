@@ -0,0 +1,61 @@
+"""
+Tests for self-play position generation
+"""
+import numpy as np
+
+from selfplay import generate, play_game, ShardWriter, load_shards
+
+
+def test_play_game_result_labels():
+    """
+    Test that every sampled position of a game is recorded, and that result
+    labels of the two players are opposite
+    """
+    boards, turns, labels = play_game(6, 2, True, "random", 3, 1.0, "result")
+
+    assert boards.shape == (len(turns), 6, 6)
+    assert boards.dtype == np.int8
+    assert set(np.unique(boards)) <= {0, 1, 2}
+    assert np.all(labels[turns == 1] == -labels[turns == 2][0])
+
+
+def test_shards_round_trip(tmp_path):
+    """
+    Test that positions are split into full shards plus a final smaller one
+    """
+    writer = ShardWriter(str(tmp_path), shard_size=4)
+    for game in range(3):
+        boards = np.full((3, 4, 4), game, dtype=np.int8)
+        turns = np.ones(3, dtype=np.int8)
+        labels = np.arange(3, dtype=np.float32)
+        writer.add((boards, turns, labels))
+    writer.close()
+
+    shards = list(load_shards(str(tmp_path)))
+    assert [len(turns) for _, turns, _ in shards] == [4, 4, 1]
+    assert writer.num_positions == 9
+    boards = np.concatenate([boards for boards, _, _ in shards])
+    assert list(boards[:, 0, 0]) == [0, 0, 0, 1, 1, 1, 2, 2, 2]
+
+
+def test_generate_is_reproducible(tmp_path):
+    """
+    Test that the same seed gives the same shards, in the order of the games,
+    whichever worker finishes first
+    """
+    runs = []
+    for run in range(2):
+        directory = str(tmp_path / str(run))
+        generate(directory, 12, side=6, sample_rate=0.5, shard_size=16,
+                 workers=3, seed=7)
+        runs.append(list(load_shards(directory)))
+
+    expected = [play_game(6, 2, True, "random", 7 + game_num, 0.5, "result")
+                for game_num in range(12)]
+    assert np.array_equal(
+        np.concatenate([boards for boards, _, _ in runs[0]]),
+        np.concatenate([boards for boards, _, _ in expected]))
+    assert len(runs[0]) == len(runs[1])
+    for first, second in zip(*runs):
+        for first_array, second_array in zip(first, second):
+            assert np.array_equal(first_array, second_array)
@@ -0,0 +1,110 @@
+"""
+Tests for symmetry-canonical position keys
+"""
+import random
+import pytest
+from reversi import Reversi
+from posdb import PositionDB, make_entry, merge
+from symmetry import (INVERSE, KEY_HEADER, TRANSFORMS, canonical_key,
+                      transform_cells, transform_move, untransform_move)
+
+
+def transformed_game(game, transform):
+    """
+    Returns a copy of a game with its board transformed
+    """
+    copy = Reversi(game.size, game.num_players, game.othello)
+    copy.load_game(game.turn, transform_cells(game.cells, game.size,
+                                              transform))
+    return copy
+
+
+def random_positions(side, players, othello, seed):
+    """
+    Yields the positions of a random game
+    """
+    rng = random.Random(seed)
+    game = Reversi(side, players, othello)
+    while not game.done:
+        yield game
+        game.apply_move(rng.choice(game.available_moves))
+
+
+@pytest.mark.parametrize("side", [4, 5, 8])
+def test_transforms_invert(side):
+    """
+    Test that every transform is undone by its inverse, for squares and
+    whole boards
+    """
+    cells = bytes(range(side * side))
+    for transform in range(len(TRANSFORMS)):
+        moved = transform_cells(cells, side, transform)
+        assert sorted(moved) == sorted(cells)
+        assert transform_cells(moved, side, INVERSE[transform]) == cells
+        for row in range(side):
+            for col in range(side):
+                new_row, new_col = transform_move((row, col), side, transform)
+                assert moved[new_row * side + new_col] == cells[row * side
+                                                                + col]
+                assert untransform_move((new_row, new_col), side,
+                                        transform) == (row, col)
+
+
+@pytest.mark.parametrize("side, players, othello",
+                         [(8, 2, True), (6, 2, False), (7, 3, False)])
+def test_transforms_keep_rules(side, players, othello):
+    """
+    Test that the legal moves of a transformed position are the transformed
+    legal moves of the position, including the opening zone and the Othello
+    start
+    """
+    for game in random_positions(side, players, othello, seed=side):
+        for transform in range(len(TRANSFORMS)):
+            copy = transformed_game(game, transform)
+            assert copy.turn == game.turn
+            assert sorted(copy.available_moves) == sorted(
+                transform_move(move, side, transform)
+                for move in game.available_moves)
+
+
+@pytest.mark.parametrize("side, players, othello",
+                         [(8, 2, True), (6, 2, False), (7, 3, False)])
+def test_canonical_key(side, players, othello):
+    """
+    Test that symmetric positions have the same key, and that the returned
+    transform maps each board to the board of the key
+    """
+    for game in random_positions(side, players, othello, seed=1):
+        key, _ = canonical_key(game)
+        for transform in range(len(TRANSFORMS)):
+            copy = transformed_game(game, transform)
+            copy_key, copy_transform = canonical_key(copy)
+            assert copy_key == key
+            assert transform_cells(copy.cells, side, copy_transform) == \
+                key[KEY_HEADER.size:]
+
+    assert canonical_key(Reversi(6, 2, True))[0] != \
+        canonical_key(Reversi(6, 2, False))[0]
+
+
+def test_canonical_position_db(tmp_path):
+    """
+    Test that a position database with canonical entries finds symmetric
+    positions and translates their moves back
+    """
+    path = str(tmp_path / "positions.db")
+    game = Reversi(8, 2, True)
+    game.apply_move((2, 3))
+    merge(path, [make_entry(game, 2.0, (2, 2), canonical=True)])
+
+    with PositionDB(path) as db:
+        for transform in range(len(TRANSFORMS)):
+            copy = transformed_game(game, transform)
+            entry = db.lookup(copy, canonical=True)
+            assert entry.score == 2.0
+            assert divmod(entry.move, 8) == transform_move((2, 2), 8,
+                                                           transform)
+            # Exact keys only match the canonical key on the canonical board
+            if transform_cells(copy.cells, 8, canonical_key(copy)[1]) != \
+                    copy.cells:
+                assert db.lookup(copy) is None
@@ -0,0 +1,295 @@
+"""
+Tests for the text user interface: the bots' pondering, scripts,
+incremental redraws and replays
+"""
+import random
+from concurrent.futures import Future
+import pytest
+from click.testing import CliRunner
+import tui
+from reversi import Reversi
+from records import GameRecord
+from tui import (CSI, PIECES, PLAYER_GLYPHS, cursor_to, get_bot_move, main,
+                 make_grid, ponder, read_script, redraw_squares, replay_game,
+                 replay_records, run_script, seek, update_grid_with_pieces)
+
+
+class FakeExecutor:
+    """
+    Executor that records the games it is given instead of running them,
+    answering every job with its first available move
+    """
+
+    def __init__(self, workers=None):
+        self.submitted = []
+        self.shutdowns = []
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdowns.append((wait, cancel_futures))
+
+    def submit(self, function, game, bot_name, time_budget):
+        self.submitted.append((game, bot_name))
+        future = Future()
+        future.set_result(game.available_moves[0])
+        return future
+
+
+def test_ponder_most_capturing_moves(monkeypatch):
+    """
+    Test that ponder submits the moves that capture the most pieces, one per
+    free worker, and copies the game of no other move
+    """
+    game = Reversi(8, 2, True)
+    for move in [(2, 3), (2, 2), (2, 1)]:
+        game.apply_move(move)
+    simulated = []
+    simulate_moves = Reversi.simulate_moves
+    monkeypatch.setattr(Reversi, "simulate_moves", lambda self, moves:
+                        simulated.append(moves) or simulate_moves(self, moves))
+
+    executor = FakeExecutor()
+    pondering = ponder(executor, game, {1: "smart"}, 2)
+
+    best = sorted(game.available_moves, key=game.captures, reverse=True)[:2]
+    assert sorted(pondering) == sorted(best)
+    assert sorted(moves[0] for moves in simulated) == sorted(best)
+    assert all(after.turn == 1 and bot_name == "smart"
+               for after, bot_name in executor.submitted)
+
+
+def test_ponder_without_free_workers():
+    """
+    Test that nothing is pondered when no worker is free, or without bots
+    """
+    game = Reversi(8, 2, True)
+    executor = FakeExecutor()
+    assert ponder(executor, game, {2: "smart"}, 0) == {}
+    assert executor.submitted == []
+    assert ponder(None, game, {2: "smart"}, 3) == {}
+
+
+def test_get_bot_move_reuses_pondered_reply():
+    """
+    Test that the pondered reply to the last move is used without asking
+    the worker again, and that other moves are sent to the worker
+    """
+    game = Reversi(8, 2, True)
+    game.apply_move((2, 3))
+    reply = Future()
+    reply.set_result((2, 2))
+    executor = FakeExecutor()
+
+    assert get_bot_move(executor, game, "smart", {(2, 3): reply}) == (2, 2)
+    assert executor.submitted == []
+
+    assert get_bot_move(executor, game, "smart", {(5, 4): reply}) == \
+        game.available_moves[0]
+    assert len(executor.submitted) == 1
+
+
+def test_get_bot_move_skips_cancelled_reply():
+    """
+    Test that a cancelled pondered reply is worked out again
+    """
+    game = Reversi(8, 2, True)
+    game.apply_move((2, 3))
+    reply = Future()
+    reply.cancel()
+    executor = FakeExecutor()
+
+    assert get_bot_move(executor, game, "smart", {(2, 3): reply}) == \
+        game.available_moves[0]
+    assert executor.submitted[0][0].cells == game.cells
+
+
+def test_read_script():
+    """
+    Test that scripts are split into games at blank lines, with comments
+    left out
+    """
+    lines = ["# opening\n", "2,3 2,2  # two moves\n", "2,1\n", "\n", "\n",
+             "  # a comment is not a blank line\n", "5,4\n", "\n"]
+    assert list(read_script(lines)) == [[(2, 3), (2, 2), (2, 1)], [(5, 4)]]
+    assert list(read_script([])) == []
+
+
+@pytest.mark.parametrize("token", ["2;3", "a,1", "2,", "2,3,4"])
+def test_read_script_bad_token(token):
+    """
+    Test that moves that are not ROW,COL are rejected
+    """
+    with pytest.raises(ValueError, match="Invalid move"):
+        list(read_script([f"2,3 {token}\n"]))
+
+
+@pytest.mark.parametrize("move", ["0,0", "9,9"])
+def test_run_script_illegal_move(move, capsys):
+    """
+    Test that a script stops with an error at an illegal move, or one off
+    the board
+    """
+    with pytest.raises(SystemExit) as exit_info:
+        run_script(["2,3 2,2\n", "\n", f"2,3 {move}\n"], 2, 8, True)
+    assert exit_info.value.code == 1
+    output = capsys.readouterr().out
+    assert f"Illegal move {move} (move 2 of game 2)" in output
+
+
+def test_run_script_plays_games(capsys):
+    """
+    Test that a script's games are played and their final boards shown
+    """
+    run_script(["2,3 2,2\n", "\n", "2,3\n"], 2, 8, True)
+    output = capsys.readouterr().out
+    assert output.count("Player 1 to move") == 1
+    assert output.count("Player 2 to move") == 1
+    assert "Played 2 games (3 moves)" in output
+
+
+def test_update_only_changed_squares():
+    """
+    Test that after a move, only the placed and flipped squares are
+    rewritten in the grid and repainted on the screen
+    """
+    game = Reversi(8, 2, True)
+    changed = set()
+    game.add_listener(lambda pos, old, new: changed.add(pos))
+    grid = make_grid(8)
+    update_grid_with_pieces(grid, game)
+    before = [row[:] for row in grid]
+
+    game.apply_move((2, 3)) # places (2, 3) and flips (3, 3)
+    assert changed == {(2, 3), (3, 3)}
+    update_grid_with_pieces(grid, game, changed)
+    assert [(row, col) for row in range(17) for col in range(17)
+            if grid[row][col] != before[row][col]] == [(5, 7), (7, 7)]
+    full = make_grid(8)
+    update_grid_with_pieces(full, game)
+    assert grid == full
+
+    # Squares that are not given are left alone
+    empty = make_grid(8)
+    update_grid_with_pieces(empty, game, changed)
+    assert empty[9][7] == PIECES["EMPTY"] # (4, 3) holds a piece
+
+    assert redraw_squares(grid, sorted(changed)) == (
+        cursor_to(6, 8) + PLAYER_GLYPHS[1] + cursor_to(8, 8) +
+        PLAYER_GLYPHS[1])
+    assert cursor_to(6, 8) == "\x1b[6;8H"
+    assert redraw_squares(grid, []) == ""
+
+
+def random_record(seed):
+    """
+    Returns the record of a random game on an 8x8 board
+    """
+    rng = random.Random(seed)
+    game = Reversi(8, 2, True)
+    while not game.done:
+        game.apply_move(rng.choice(game.available_moves))
+    return {"side": 8, "players": 2, "othello": True,
+            "moves": [list(move) for move in game.moves]}
+
+
+def test_replay_seek():
+    """
+    Test that seeking a replay forwards and backwards, past keyframes and
+    within them, gives the board of the game replayed from the start, and
+    that repainting the changed squares keeps the grid up to date
+    """
+    record = random_record(3)
+    game_record = GameRecord.from_record(record)
+    assert game_record.keyframe_interval == 8
+    moves = game_record.moves
+
+    stub = game_record.seek(0)
+    changed = set()
+    stub.add_listener(lambda pos, old, new: changed.add(pos))
+    grid = make_grid(8)
+    update_grid_with_pieces(grid, stub)
+    current = 0
+    for ply in [1, 5, 21, 22, 13, 12, 0, len(moves), 9, 7]:
+        stub = seek(stub, current, game_record, ply, changed)
+        update_grid_with_pieces(grid, stub, changed)
+        changed.clear()
+        current = ply
+
+        expected = Reversi(8, 2, True)
+        for move in moves[:ply]:
+            expected.apply_move(move)
+        assert stub.grid == expected.grid
+        assert stub.turn == expected.turn
+        full = make_grid(8)
+        update_grid_with_pieces(full, expected)
+        assert grid == full
+
+
+def test_replay_game_keys(capsys):
+    """
+    Test that a replay steps and jumps through a game on the arrow keys and
+    stops on q
+    """
+    record = random_record(4)
+    keys = iter([CSI + "B", CSI + "B", CSI + "D", CSI + "A", CSI + "C", "q"])
+    action, speed = replay_game(record, "Game 1", 4.0,
+                                lambda timeout: next(keys))
+    assert (action, speed) == ("quit", 4.0)
+    output = capsys.readouterr().out
+    plies = [int(part.split()[1].split("/")[0])
+             for part in output.split("Game 1  ")[1:]]
+    assert plies == [0, 10, 20, 19, 9, 10]
+
+
+def test_workers_stopped_when_input_ends(monkeypatch):
+    """
+    Test that the bots' workers are shut down, and their pondered replies
+    cancelled, when the game stops part way (here, at the end of input)
+    """
+    executors = []
+
+    class PendingExecutor(FakeExecutor):
+        def submit(self, function, game, bot_name, time_budget):
+            self.submitted.append(Future())
+            return self.submitted[-1]
+
+    def make_executor(workers):
+        executors.append(PendingExecutor(workers))
+        return executors[-1]
+
+    monkeypatch.setattr(tui, "ProcessPoolExecutor", make_executor)
+    result = CliRunner().invoke(main, ["--bot", "smart"], input="")
+    assert result.exit_code == 1 and "Aborted!" in result.output
+
+    executor, = executors
+    assert executor.submitted
+    assert all(reply.cancelled() for reply in executor.submitted)
+    assert executor.shutdowns == [(True, True)]
+
+
+def test_replay_skips_malformed_records(monkeypatch, capsys):
+    """
+    Test that records without a playable game are skipped with a message,
+    and the other games are still shown
+    """
+    good = random_record(5)
+    bad = [{"side": 8, "players": 2, "othello": True},
+           dict(good, moves=[[0, 0]]),
+           dict(good, moves=[[2]])]
+    monkeypatch.setattr(tui, "read_key", lambda timeout: "n")
+    replay_records(iter([bad[0], good, bad[1], bad[2], good]), 2.0)
+
+    output = capsys.readouterr().out
+    assert output.count("Skipping a malformed game record") == 3
+    assert "Game 1  move 0/" in output and "Game 2  move 0/" in output
+    assert "Game 3" not in output
+
+
+@pytest.mark.parametrize("speed", ["0", "-1"])
+def test_replay_speed_must_be_positive(speed, tmp_path):
+    """
+    Test that a replay speed of zero or less is rejected
+    """
+    result = CliRunner().invoke(main, ["--replay", str(tmp_path / "games"),
+                                       "--speed", speed])
+    assert result.exit_code == 2
+    assert "--speed" in result.output
@@ -0,0 +1,64 @@
+"""
+Tests for the vectorised reversi engine
+"""
+import numpy as np
+import pytest
+
+from reversi import Reversi
+from vector_reversi import VectorReversi, random_playouts, shift
+
+
+@pytest.mark.parametrize("side,players,othello", [(6, 2, True), (8, 2, False),
+                                                  (7, 3, False)])
+def test_matches_reversi(side, players, othello):
+    """
+    Test that random games played in lockstep go exactly as they would in
+    Reversi: same turns, legal moves, final boards and winners
+    """
+    vector = VectorReversi(8, side, players, othello)
+    games = [Reversi(side, players, othello) for _ in range(8)]
+    rng = np.random.default_rng(side)
+
+    while not vector.done.all():
+        masks = vector.legal_masks()
+        for i, game in enumerate(games):
+            if not vector.done[i]:
+                assert game.turn == vector.turns[i]
+                assert set(game.available_moves) == \
+                    set(zip(*np.nonzero(masks[i])))
+        moves = vector.step(rng)
+        for i, game in enumerate(games):
+            if moves[i, 0] >= 0:
+                game.apply_move((int(moves[i, 0]), int(moves[i, 1])))
+
+    winners = vector.outcomes()
+    for i, game in enumerate(games):
+        assert game.done
+        assert [[cell or 0 for cell in row] for row in game.grid] == \
+            vector.boards[i].tolist()
+        assert game.outcome == list(np.flatnonzero(winners[i]))
+
+
+def test_random_playouts():
+    """
+    Test that every playout finishes with a full count of pieces
+    """
+    games, rate = random_playouts(50, 4, 2, True, seed=1)
+
+    assert games.done.all()
+    assert rate > 0
+    assert np.all(games.scores().sum(axis=1) == 16)
+
+
+def test_shift_into_buffer():
+    """
+    Test that shifting into a reused buffer gives the same result as into a
+    new array, whatever the buffer held before
+    """
+    masks = np.random.default_rng(0).random((3, 5, 5)) < 0.5
+    out = np.ones_like(masks)
+    for drow, dcol in [(1, 0), (-2, 3), (0, -4), (5, 0)]:
+        expected = shift(masks, drow, dcol)
+        assert shift(masks, drow, dcol, out=out) is out
+        assert np.array_equal(out, expected)
+    assert np.array_equal(shift(masks, 1, 1)[:, :4, :4], masks[:, 1:, 1:])